@@ -0,0 +1,6 @@
+"""
+Benchmarks for the hot paths in this project.
+Run from the repo root, ex. `python -m benchmarks.run` for the whole
+suite (see benchmarks.suite) or `python -m benchmarks.scoring` for a
+before/after comparison against the old code.
+"""
@@ -0,0 +1,221 @@
+"""
+Saved HTML pages for benchmarking the parsers offline.
+
+The live ESPN and FantasyPros pages are long gone, so fixtures are
+rendered from the scraped CSVs in data/ using the same table layouts the
+scrapers expect, including ESPN's BYE rows with the shifted colspan=2
+layout.
+
+    python -m benchmarks.fixtures    # (re)write benchmarks/fixtures/*.html
+"""
+import pandas as pd
+import os
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+PAGE = '''<html><head><title>{title}</title></head><body>
+<div class="games-fullcol">
+<table class="playerTableTable tableBody" cellspacing="1" cellpadding="0">
+<tr class="playerTableBgRowSubhead tableSubHead"><td>PLAYER, TEAM POS</td></tr>
+{rows}
+</table>
+</div>
+</body></html>
+'''
+
+ROW = '<tr id="plyr{player_id}" class="pncPlayerRow playerTableBgRow{parity}">{cells}</tr>'
+
+
+def _td(value, cls=''):
+    return '<td class="playertableStat {}">{}</td>'.format(cls, value)
+
+
+def _player_cell(row, team_position=True):
+    link = ('<a href="" class="flexpop" content="tabs#ppc" instance="_ppc" '
+            'playerid="{player_id}" tab="null" cache="true">{name}</a>')
+    text = link.format(**row)
+    if team_position and 'D/ST' not in row['name']:
+        text += ', {team} {position}'.format(**row)
+    return '<td class="playertablePlayerName">{}</td>'.format(text)
+
+
+def projections_row(i, row):
+    cells = [
+        _player_cell(row, team_position=False),
+        _td(row['opponent']),
+        _td(row['game_result']),
+        _td('{pass_completions}/{pass_attempts}'.format(**row)),
+    ] + [_td(row[col]) for col in
+         ['pass_yards', 'pass_TD', 'interceptions', 'rush_attempts',
+          'rush_yards', 'rush_TD', 'receptions', 'receiving_yards',
+          'receiving_TD', 'projected_pts']]
+    return cells
+
+
+def leaders_row(i, row, bye_every=10):
+    # every nth player switched teams onto a BYE week, a la Ben Tate
+    bye = i % bye_every == bye_every - 1
+    if bye:
+        front = ['<td class="playertableStat" colspan="2">** BYE **</td>']
+    else:
+        front = [_td(row['opponent']), _td(row['game_result'])]
+    spacer = '<td class="sectionLeadingSpacer"></td>'
+    stat = lambda col: _td(row[col])
+    return ([_player_cell(row), _td('')] + front + [spacer] +
+            [_td('{pass_completions}/{pass_attempts}'.format(**row))] +
+            [stat(c) for c in ['pass_yards', 'pass_TD', 'interceptions']] +
+            [spacer] + [stat(c) for c in ['rush_attempts', 'rush_yards', 'rush_TD']] +
+            [spacer] + [stat(c) for c in ['receptions', 'receiving_yards', 'receiving_TD']] +
+            [_td('0'), spacer] +
+            [stat(c) for c in ['two_pt_conversions', 'fumbles_lost', 'misc_TD']] +
+            [spacer, stat('total_pts')])
+
+
+def render(rows, to_cells, title):
+    html = []
+    for i, row in enumerate(rows):
+        cells = to_cells(i, row)
+        html.append(ROW.format(player_id=row['player_id'], parity=i % 2,
+                               cells=''.join(cells)))
+    return PAGE.format(title=title, rows='\n'.join(html))
+
+
+def projections_page(week=1, start=0, size=40):
+    df = pd.read_csv('data/projections-espn.csv')
+    rows = df[df.week == week].iloc[start:start + size].to_dict('records')
+    return render(rows, projections_row, 'Projections')
+
+
+def leaders_page(week=1, start=0, size=50):
+    df = pd.read_csv('data/scoring-espn.csv')
+    rows = df[df.week == week].iloc[start:start + size].to_dict('records')
+    return render(rows, leaders_row, 'Leaders')
+
+
+GAMELOG_PAGE = '''<html><head><title>{name} Game Log</title></head><body>
+<div class="mod-container mod-no-header-footer mod-page-header">
+<div class="mod-content"><h1>{name}</h1></div>
+<ul class="general-info"><li class="first">#{number} {position}</li><li>{team}</li></ul>
+</div>
+<table class="tablehead" cellpadding="3" cellspacing="1">
+<tr class="stathead"><td colspan="{width}">2014 Regular Season Game Log</td></tr>
+<tr class="colhead">{header}</tr>
+{rows}
+<tr class="total"><td colspan="3">Regular Season Stats</td>{totals}</tr>
+</table>
+</body></html>
+'''
+
+# ESPN gamelog columns we can fill from a scoring row; see mappings.HEADER_MAPPING
+GAMELOG_COLUMNS = {
+    'QB': [
+        lambda row: '{pass_completions}'.format(**row),
+        lambda row: '{pass_attempts}'.format(**row),
+        lambda row: '{pass_yards}'.format(**row),
+        lambda row: '{:.1f}'.format(100. * row['pass_completions'] / max(row['pass_attempts'], 1)),
+        lambda row: '{:.1f}'.format(1. * row['pass_yards'] / max(row['pass_attempts'], 1)),
+        lambda row: '{}'.format(row['pass_yards'] // 4),
+        lambda row: '{pass_TD}'.format(**row),
+        lambda row: '{interceptions}'.format(**row),
+        lambda row: '0',
+        lambda row: '0.0',
+    ],
+    'RB': [
+        lambda row: '{rush_attempts}'.format(**row),
+        lambda row: '{rush_yards}'.format(**row),
+        lambda row: '{:.1f}'.format(1. * row['rush_yards'] / max(row['rush_attempts'], 1)),
+        lambda row: '{}'.format(row['rush_yards'] // 3),
+        lambda row: '{rush_TD}'.format(**row),
+        lambda row: '{receptions}'.format(**row),
+        lambda row: '{receiving_yards}'.format(**row),
+        lambda row: '{:.1f}'.format(1. * row['receiving_yards'] / max(row['receptions'], 1)),
+        lambda row: '{}'.format(row['receiving_yards'] // 2),
+        lambda row: '{receiving_TD}'.format(**row),
+        lambda row: '{fumbles_lost}'.format(**row),
+        lambda row: '{fumbles_lost}'.format(**row),
+    ],
+}
+
+
+def gamelog_page(player_id=1428):
+    """An ESPN gamelog page for a QB or RB, from their weeks in data/scoring-espn.csv"""
+    df = pd.read_csv('data/scoring-espn.csv')
+    rows = df[df.player_id == player_id].sort_values('week').to_dict('records')
+    player = rows[0]
+    columns = GAMELOG_COLUMNS[player['position']]
+    html = []
+    for i, row in enumerate(rows):
+        cells = [_td('Sun 9/{}'.format(row['week'])), _td(row['opponent']),
+                 _td(row['game_result'])] + [_td(cell(row)) for cell in columns]
+        html.append('<tr class="oddrow">{}</tr>'.format(''.join(cells)))
+    header = ''.join('<td>{}</td>'.format(i) for i in range(len(columns) + 3))
+    totals = ''.join(_td('') for _ in columns)
+    return GAMELOG_PAGE.format(name=player['name'], number=player_id % 100,
+                               position=player['position'], team=player['team'],
+                               width=len(columns) + 3, header=header,
+                               rows='\n'.join(html), totals=totals)
+
+
+FANTASYPROS_PAGE = '''<html><head><title>Fantasy Football Projections</title></head><body>
+<div class="mobile-table">
+<table id="data" class="table table-bordered">
+<thead><tr>{header}</tr></thead>
+<tbody>
+{rows}
+</tbody>
+</table>
+</div>
+</body></html>
+'''
+
+# table headers in page order; read_html dedupes repeats as ATT.1 etc.,
+# which is what mappings.COLUMN_MAPPINGS expects
+FANTASYPROS_HEADERS = {
+    'QB': ['Player', 'ATT', 'CMP', 'YDS', 'TDS', 'INTS', 'ATT', 'YDS', 'TDS', 'FL', 'FPTS'],
+    'RB': ['Player', 'ATT', 'YDS', 'TDS', 'REC', 'YDS', 'TDS', 'FL', 'FPTS'],
+    'WR': ['Player', 'ATT', 'YDS', 'TDS', 'REC', 'YDS', 'TDS', 'FL', 'FPTS'],
+    'TE': ['Player', 'REC', 'YDS', 'TDS', 'FL', 'FPTS'],
+    'K': ['Player', 'FG', 'FGA', 'XPT', 'FPTS'],
+}
+
+
+def fantasypros_page(position='QB', week=1, expert_code=73):
+    from mappings import COLUMN_MAPPINGS
+    df = pd.read_csv('data/fantasypros-projections-{}.csv'.format(expert_code))
+    df = df[(df.POSITION == position) & (df.WEEK == week)]
+    headers = FANTASYPROS_HEADERS[position]
+    # header as read_html names it -> our column
+    seen, columns = {}, []
+    for header in headers:
+        key = header if header not in seen else '{}.{}'.format(header, seen[header])
+        seen[header] = seen.get(header, 0) + 1
+        columns.append(COLUMN_MAPPINGS[position][key])
+    rows = []
+    for row in df[columns].itertuples(index=False):
+        cells = ['<td class="player-label">{}</td>'.format(row[0])]
+        cells += ['<td class="center">{}</td>'.format(value) for value in row[1:]]
+        rows.append('<tr class="mpb-player">{}</tr>'.format(''.join(cells)))
+    header = ''.join('<th>{}</th>'.format(h) for h in headers)
+    return FANTASYPROS_PAGE.format(header=header, rows='\n'.join(rows))
+
+
+def load(name):
+    with open(os.path.join(FIXTURE_DIR, name)) as f:
+        return f.read()
+
+
+def main():
+    pages = {
+        'espn-projections.html': projections_page(),
+        'espn-leaders.html': leaders_page(),
+        'espn-gamelog.html': gamelog_page(),
+        'fantasypros-qb.html': fantasypros_page('QB'),
+        'fantasypros-rb.html': fantasypros_page('RB'),
+    }
+    for name, html in pages.items():
+        with open(os.path.join(FIXTURE_DIR, name), 'w') as f:
+            f.write(html)
+        print('wrote {}'.format(name))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""
+Benchmark the lxml single-pass parsers against the old BeautifulSoup
+parsers on the saved fixture pages.
+
+    python -m benchmarks.parsers [repeat]
+"""
+from benchmarks.fixtures import load
+from bs4 import BeautifulSoup
+from timeit import default_timer
+import parsers
+import sys
+
+
+def legacy_projections(html, week, season):
+    """The old scrape-espn.get_projections row loop."""
+    projections = []
+    # lxml is what BeautifulSoup picks with requirements.txt installed
+    soup = BeautifulSoup(html, 'lxml')
+    table = soup.find('table', class_='playerTableTable')
+    for row in table.find_all('tr', 'pncPlayerRow'):
+        try:
+            projections.append({
+                'season': int(season),
+                'week': int(week),
+                'player_id': int(row.find_all('td')[0].a.get('playerid')),
+                'name': row.find_all('td')[0].a.text.strip(),
+                'opponent': row.find_all('td')[1].text.strip(),
+                'game_result': row.find_all('td')[2].text.strip(),
+                'pass_completions': int(row.find_all('td')[3].text.split('/')[0]),
+                'pass_attempts': int(row.find_all('td')[3].text.split('/')[1]),
+                'pass_yards': int(row.find_all('td')[4].text),
+                'pass_TD': int(row.find_all('td')[5].text),
+                'interceptions': int(row.find_all('td')[6].text),
+                'rush_attempts': int(row.find_all('td')[7].text),
+                'rush_yards': int(row.find_all('td')[8].text),
+                'rush_TD': int(row.find_all('td')[9].text),
+                'receptions': int(row.find_all('td')[10].text),
+                'receiving_yards': int(row.find_all('td')[11].text),
+                'receiving_TD': int(row.find_all('td')[12].text),
+                'projected_pts': int(row.find_all('td')[13].text),
+            })
+        except IndexError:
+            continue
+    return projections
+
+
+def legacy_scoring(html, week, season):
+    """The old scrape-espn.get_scoring row loop."""
+    scoring = []
+    # lxml is what BeautifulSoup picks with requirements.txt installed
+    soup = BeautifulSoup(html, 'lxml')
+    table = soup.find('table', class_='playerTableTable')
+    for row in table.find_all('tr', 'pncPlayerRow'):
+        # Dealing with special case of D/ST. Oof
+        name = row.find_all('td')[0].a.text.strip()
+        if 'D/ST' in name:
+            team = 'D/ST'
+            position = 'D/ST'
+        else:
+            tp = row.find('td').text.split(',')[1].strip()
+            team = tp.split()[0]
+            position = tp.split()[1]
+
+        # I'm sorry for what I'm about to do ...
+        try:
+            scoring.append({
+                'season': int(season),
+                'week': int(week),
+                'player_id': int(row.find_all('td')[0].a.get('playerid')),
+                'name': name,
+                'team': team,
+                'position': position,
+                'opponent': row.find_all('td')[2].text.strip(),
+                'game_result': row.find_all('td')[3].text.strip(),
+                'pass_completions': int(row.find_all('td')[5].text.split('/')[0]),
+                'pass_attempts': int(row.find_all('td')[5].text.split('/')[1]),
+                'pass_yards': int(row.find_all('td')[6].text),
+                'pass_TD': int(row.find_all('td')[7].text),
+                'interceptions': int(row.find_all('td')[8].text),
+                'rush_attempts': int(row.find_all('td')[10].text),
+                'rush_yards': int(row.find_all('td')[11].text),
+                'rush_TD': int(row.find_all('td')[12].text),
+                'receptions': int(row.find_all('td')[14].text),
+                'receiving_yards': int(row.find_all('td')[15].text),
+                'receiving_TD': int(row.find_all('td')[16].text),
+                'two_pt_conversions': int(row.find_all('td')[19].text),
+                'fumbles_lost': int(row.find_all('td')[20].text),
+                'misc_TD': int(row.find_all('td')[21].text),
+                'total_pts': int(row.find_all('td')[23].text)
+            })
+        except ValueError:
+            # players on Bye
+            pass
+        except IndexError:
+            # stupid players winding up on new teams midseason
+            # i.e. Ben Tate played and scored points for the Browns during Week 10
+            # but his new team (Minnesota) had a buy that week ...
+            # so he now gets a BYE w/ his point totals
+            # BYE weeks give a column colspan=2 and everything else shifts a column
+            scoring.append({
+                'season': int(season),
+                'week': int(week),
+                'player_id': int(row.find_all('td')[0].a.get('playerid')),
+                'name': name,
+                'team': team,
+                'position': position,
+                'opponent': row.find_all('td')[2].text.strip(),
+                'game_result': None,
+                'pass_completions': int(row.find_all('td')[4].text.split('/')[0]),
+                'pass_attempts': int(row.find_all('td')[4].text.split('/')[1]),
+                'pass_yards': int(row.find_all('td')[5].text),
+                'pass_TD': int(row.find_all('td')[6].text),
+                'interceptions': int(row.find_all('td')[7].text),
+                'rush_attempts': int(row.find_all('td')[9].text),
+                'rush_yards': int(row.find_all('td')[10].text),
+                'rush_TD': int(row.find_all('td')[11].text),
+                'receptions': int(row.find_all('td')[13].text),
+                'receiving_yards': int(row.find_all('td')[14].text),
+                'receiving_TD': int(row.find_all('td')[15].text),
+                'two_pt_conversions': int(row.find_all('td')[18].text),
+                'fumbles_lost': int(row.find_all('td')[19].text),
+                'misc_TD': int(row.find_all('td')[20].text),
+                'total_pts': int(row.find_all('td')[22].text)
+            })
+    return scoring
+
+
+def per_page(func, html, repeat):
+    start = default_timer()
+    for _ in range(repeat):
+        result = func(html, 1, 2014)
+    return result, (default_timer() - start) / repeat
+
+
+def main(repeat=20):
+    cases = [
+        ('projections', 'espn-projections.html', legacy_projections, parsers.parse_projections),
+        ('leaders', 'espn-leaders.html', legacy_scoring, parsers.parse_scoring),
+    ]
+    for label, fixture, old_func, new_func in cases:
+        html = load(fixture)
+        old, old_time = per_page(old_func, html, repeat)
+        new, new_time = per_page(new_func, html, repeat)
+        assert old == new, 'parsers disagree on {}'.format(fixture)
+        msg = '{}: {} rows, BeautifulSoup {:.2f}ms/page, lxml {:.2f}ms/page ({:.0f}x)'
+        print(msg.format(label, len(new), old_time * 1000, new_time * 1000,
+                         old_time / new_time))
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
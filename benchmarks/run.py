@@ -0,0 +1,146 @@
+"""
+Run the benchmark suite and keep the results per commit.
+
+Timings are saved to benchmarks/results/<commit>.json (<commit>-dirty.json
+with uncommitted changes), so a later run can be compared with any
+earlier commit that was benchmarked on the same machine.
+
+    python -m benchmarks.run                       # everything at 1x and 10x
+    python -m benchmarks.run -k bootstrap --scale 1 10 100
+    python -m benchmarks.run --compare HEAD~1      # flag regressions
+"""
+from benchmarks.suite import BENCHMARKS
+from timeit import default_timer
+import subprocess
+import argparse
+import platform
+import fnmatch
+import json
+import time
+import sys
+import os
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+REPEAT = 3
+REGRESSION = 1.2 # flag anything 20% slower than the baseline
+
+
+def git(*args):
+    return subprocess.check_output(('git',) + args).decode('utf-8').strip()
+
+
+def commit():
+    """(sha of HEAD, whether tracked files have uncommitted changes)"""
+    return git('rev-parse', 'HEAD'), bool(git('status', '--porcelain',
+                                              '--untracked-files=no'))
+
+
+def machine():
+    import numpy
+    import pandas
+    return {
+        'node': platform.node(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'pandas': pandas.__version__,
+    }
+
+
+def measure(func, repeat=REPEAT):
+    """One untimed warm up call, then repeat timed ones."""
+    func()
+    times = []
+    for _ in range(repeat):
+        start = default_timer()
+        func()
+        times.append(default_timer() - start)
+    times.sort()
+    return {'min': times[0], 'median': times[len(times) // 2], 'repeat': repeat}
+
+
+def run(pattern='*', scales=(1, 10), repeat=REPEAT):
+    """
+    Returns
+    -------
+    dict of 'name@scale' -> {min, median, repeat} in seconds
+    """
+    results = {}
+    for name, setup, supported in BENCHMARKS:
+        if not fnmatch.fnmatch(name, pattern) and pattern not in name:
+            continue
+        for scale in scales:
+            if scale not in supported:
+                continue
+            key = '{}@{}'.format(name, scale)
+            results[key] = measure(setup(scale), repeat)
+            print('{:<40} {:>10.4f}s'.format(key, results[key]['min']))
+    return results
+
+
+def result_path(sha, dirty=False):
+    return os.path.join(RESULTS_DIR, '{}{}.json'.format(sha, '-dirty' if dirty else ''))
+
+
+def save(results, sha, dirty):
+    if not os.path.exists(RESULTS_DIR):
+        os.makedirs(RESULTS_DIR)
+    path = result_path(sha, dirty)
+    saved = {}
+    if os.path.exists(path):
+        # keep benchmarks from earlier, narrower runs of the same commit
+        with open(path) as f:
+            saved = json.load(f)['results']
+    saved.update(results)
+    with open(path, 'w') as f:
+        json.dump({'commit': sha, 'dirty': dirty, 'date': time.time(),
+                   'machine': machine(), 'results': saved},
+                  f, indent=2, sort_keys=True)
+    return path
+
+
+def compare(results, revision, threshold=REGRESSION):
+    """Print current vs. baseline timings; returns the keys that regressed."""
+    path = result_path(git('rev-parse', revision))
+    if not os.path.exists(path):
+        print('no results saved for {}; run the benchmarks there first'.format(revision))
+        return []
+    with open(path) as f:
+        baseline = json.load(f)['results']
+    regressions = []
+    print('\n{:<40} {:>10} {:>10} {:>7}'.format('', revision, 'now', 'ratio'))
+    for key in sorted(results):
+        if key not in baseline:
+            continue
+        before, after = baseline[key]['min'], results[key]['min']
+        ratio = after / before if before else float('inf')
+        flag = ''
+        if ratio > threshold:
+            regressions.append(key)
+            flag = '  REGRESSION'
+        print('{:<40} {:>9.4f}s {:>9.4f}s {:>6.2f}x{}'.format(key, before, after, ratio, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the hot paths.')
+    parser.add_argument('-k', dest='pattern', default='*',
+                        help='only benchmarks whose name matches this glob or substring')
+    parser.add_argument('--scale', type=int, nargs='+', default=[1, 10],
+                        help='multiples of a season of data to run at')
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--compare', metavar='REVISION',
+                        help='compare with the saved results of a commit')
+    parser.add_argument('--no-save', action='store_true')
+    args = parser.parse_args()
+
+    results = run(args.pattern, args.scale, args.repeat)
+    if not args.no_save:
+        sha, dirty = commit()
+        print('saved {}'.format(save(results, sha, dirty)))
+    if args.compare and compare(results, args.compare):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
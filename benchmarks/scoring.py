@@ -0,0 +1,47 @@
+"""
+Benchmark the vectorized scoring engine against the old iterrows loop.
+
+    python -m benchmarks.scoring [rows]
+"""
+from mappings import ESPN_SCORING
+from scoring import score
+from timeit import default_timer
+import pandas as pd
+import numpy as np
+import sys
+
+
+def legacy_score(scoring):
+    """The old compare-sites.read_scoring loop, one scalar write per rule."""
+    scoring = scoring.copy()
+    scoring['PTS_SCORED'] = 0.
+    for idx, col in scoring.iterrows():
+        if scoring.loc[idx, 'position'] == 'K':
+            scoring.loc[idx, 'PTS_SCORED'] = scoring.loc[idx, 'total_pts']
+        for k, v in ESPN_SCORING.items():
+            scoring.loc[idx, 'PTS_SCORED'] += scoring.loc[idx, k] * v
+    return scoring['PTS_SCORED']
+
+
+def timed(func, *args):
+    start = default_timer()
+    result = func(*args)
+    return result, default_timer() - start
+
+
+def main(rows=None):
+    scoring = pd.read_csv('data/scoring-espn.csv')
+    if rows:
+        scoring = scoring.head(rows)
+
+    old, old_time = timed(legacy_score, scoring)
+    new, new_time = timed(score, scoring, ESPN_SCORING)
+    assert np.allclose(old.values, new.values)
+
+    print('rows: {}'.format(len(scoring)))
+    print('iterrows loop: {:.4f}s'.format(old_time))
+    print('matrix product: {:.4f}s'.format(new_time))
+    print('speedup: {:.0f}x'.format(old_time / new_time))
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else None)
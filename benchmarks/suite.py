@@ -0,0 +1,188 @@
+"""
+The benchmarks benchmarks.run times.
+
+Each benchmark does its setup (loading data, building inputs) and returns
+a callable; only the callable is timed. The scales it's registered with
+are the multiples of a season's data it makes sense at; see
+benchmarks.synthetic.
+"""
+from benchmarks import synthetic
+from benchmarks.fixtures import load
+from bootstrap import bootstrap, bootstrap_groups, bootstrap_segments, summarize_segments
+from mappings import FANTASYPROS_STATS
+from players import PlayerIndex
+from scoring import Scorer
+import confidence
+import cube
+import join_projections
+import importlib
+import tempfile
+import parsers
+import numpy as np
+import os
+
+compare_sites = importlib.import_module('compare-sites')
+scrape_fantasy_pros = importlib.import_module('scrape-fantasy-pros')
+
+# replicates for the bootstrap benchmarks; run time is linear in this
+N_SAMPLES = 1000
+
+BENCHMARKS = []
+
+
+def benchmark(*scales):
+    """Register a benchmark at the given scales (default: one season)."""
+    def register(func):
+        BENCHMARKS.append((func.__name__, func, scales or (1,)))
+        return func
+    return register
+
+
+def _espn(scale):
+    """ESPN projections joined to scoring, as in plots.py"""
+    import plots
+    data = synthetic.data(scale)
+    return plots.espn(data['projections'].set_index(plots.INDEX),
+                      data['scoring'].set_index(plots.INDEX))
+
+
+def _fantasypros(scale):
+    df = synthetic.data(scale)['fantasypros']
+    numeric = df.select_dtypes(include=[np.number]).columns
+    return df.fillna(dict((col, 0) for col in numeric))
+
+
+# reading
+# -------
+@benchmark()
+def read_scoring(scale):
+    return compare_sites.read_scoring
+
+@benchmark()
+def read_projections(scale):
+    return compare_sites.read_projections
+
+
+# scoring and ranking
+# -------------------
+@benchmark(1, 10, 100)
+def score_espn(scale):
+    scoring = synthetic.data(scale)['scoring']
+    return lambda: Scorer(scoring).score()
+
+@benchmark(1, 10, 100)
+def score_fantasypros(scale):
+    projections = _fantasypros(scale)
+    return lambda: Scorer(projections, FANTASYPROS_STATS, 'POSITION', 'FPTS').score()
+
+@benchmark(1, 10, 100)
+def fantasy_relevant(scale):
+    projections = _fantasypros(scale)
+    return lambda: compare_sites.get_fantasy_relevant(projections)
+
+
+# bootstraps
+# ----------
+@benchmark(1, 10)
+def bootstrap_mean(scale):
+    diffs = _espn(scale).point_diff
+    return lambda: bootstrap(diffs, np.mean, n_samples=N_SAMPLES)
+
+@benchmark(1, 10)
+def bootstrap_median(scale):
+    diffs = _espn(scale).point_diff
+    return lambda: bootstrap(diffs, np.median, n_samples=N_SAMPLES)
+
+@benchmark(1, 10)
+def bootstrap_experts(scale):
+    projections = _fantasypros(scale)
+    return lambda: bootstrap_groups(projections.FPTS, projections.EXPERT,
+                                    n_samples=N_SAMPLES)
+
+@benchmark(1, 10)
+def bootstrap_experts_positions(scale):
+    projections = _fantasypros(scale)
+    return lambda: bootstrap_groups(projections.FPTS,
+                                    [projections.EXPERT, projections.POSITION],
+                                    n_samples=N_SAMPLES)
+
+@benchmark(1, 10)
+def adaptive_experts_positions(scale):
+    projections = _fantasypros(scale)
+    # up to confidence.adaptive's 10,000 replicates per cell, not N_SAMPLES
+    return lambda: compare_sites.bootstrap_experts_positions(projections, 'FPTS')
+
+@benchmark()
+def adaptive_bca(scale):
+    projections = _fantasypros(scale)
+    # batches of replicates until the interval settles, plus BCa's
+    # acceleration (a closed form jackknife for the mean)
+    return lambda: confidence.adaptive(projections.FPTS, method='bca',
+                                       max_samples=N_SAMPLES)
+
+@benchmark(1, 10)
+def bootstrap_players(scale):
+    espn = _espn(scale)
+    return lambda: bootstrap_segments(espn.point_diff, espn.name, n_samples=N_SAMPLES)
+
+@benchmark(1, 10)
+def summarize_players(scale):
+    espn = _espn(scale)
+    return lambda: summarize_segments(espn.point_diff, espn.name, n_samples=N_SAMPLES)
+
+
+@benchmark()
+def query_cube(scale):
+    accuracy_cube = cube.build(compare_sites.load_joined())
+    return lambda: accuracy_cube.query(by='expert', position='WR', week=range(5, 10))
+
+
+# matching names
+# --------------
+@benchmark(1, 10)
+def resolve_players(scale):
+    scoring = synthetic.data(scale)['scoring']
+    projections = _fantasypros(scale)
+    # a fresh index every time, as on a run with nothing cached
+    return lambda: PlayerIndex(scoring).resolve_many(projections.Player,
+                                                      projections.POSITION)
+
+@benchmark()
+def join_actuals(scale):
+    fantasy_relevant = compare_sites.get_fantasy_relevant(compare_sites.read_projections())
+    scoring = compare_sites.read_scoring()
+    return lambda: compare_sites.join_actuals(fantasy_relevant.copy(), scoring)
+
+@benchmark()
+def join_projection_files(scale):
+    from glob import glob
+    filenames = sorted(glob('data/fantasypros-projections-*.csv'))
+    directory = tempfile.mkdtemp()
+    matches = os.path.join(directory, 'matches.csv')
+    misses = os.path.join(directory, 'misses.csv')
+    # every run overwrites the same two files
+    return lambda: join_projections.join('data/scoring-espn.csv', filenames,
+                                         matches, misses)
+
+
+# parsing saved pages
+# -------------------
+@benchmark()
+def parse_espn_projections(scale):
+    html = load('espn-projections.html')
+    return lambda: parsers.parse_projections(html, 1, 2014)
+
+@benchmark()
+def parse_espn_leaders(scale):
+    html = load('espn-leaders.html')
+    return lambda: parsers.parse_scoring(html, 1, 2014)
+
+@benchmark()
+def parse_espn_gamelog(scale):
+    html = load('espn-gamelog.html')
+    return lambda: parsers.parse_gamelog(html, 1428)
+
+@benchmark()
+def parse_fantasypros(scale):
+    html = load('fantasypros-qb.html')
+    return lambda: scrape_fantasy_pros.parse_projections(html, 1, 'qb')
@@ -0,0 +1,87 @@
+"""
+Synthetic data at a multiple of one season's volume.
+
+Each extra season is a copy of the 2014 data in data/ with the counting
+stats jittered, so group sizes and value spreads look like the real
+thing. Weeks are offset by WEEK_OFFSET per copy and seasons are numbered
+on from 2014. That way code that groups by week without the season, like
+the ranking step, still sees factor times as many groups.
+
+    python -m benchmarks.synthetic 10    # row counts at 10x
+"""
+import numpy as np
+import pandas as pd
+import sys
+
+SEED = 42
+WEEK_OFFSET = 100
+
+_cache = {}
+
+
+def _jitter(df, rs, skip):
+    """Nudge numeric stats: ints by -1/0/+1 (never below 0), floats by 5%."""
+    df = df.copy()
+    for col in df.columns:
+        if col in skip or not pd.api.types.is_numeric_dtype(df[col]):
+            continue
+        values = df[col].values
+        if values.dtype.kind == 'i':
+            noise = rs.randint(-1, 2, size=len(df))
+            df[col] = np.where(values > 0, np.maximum(values + noise, 0), values)
+        elif values.dtype.kind == 'f':
+            df[col] = np.round(values * rs.uniform(.95, 1.05, size=len(df)), 1)
+    return df
+
+
+def scale(df, factor, week_col='week', season_col='season', seed=SEED,
+          skip=('player_id', 'total_pts')):
+    """
+    Stack factor copies of a season.
+
+    Parameters
+    ----------
+    df: pandas.DataFrame of one season
+    factor: int, number of seasons to end up with
+    week_col: string, week column to offset for every copy
+    season_col: string, season column to number on; added if missing
+    skip: numeric columns to leave alone
+    """
+    rs = np.random.RandomState(seed)
+    skip = set(skip) | set([week_col, season_col])
+    copies = []
+    for k in range(factor):
+        copy = df if k == 0 else _jitter(df, rs, skip)
+        copy = copy.assign(**{week_col: df[week_col].values + k * WEEK_OFFSET,
+                              season_col: 2014 + k})
+        copies.append(copy)
+    return pd.concat(copies, ignore_index=True)
+
+
+def data(factor=1):
+    """
+    Every dataset the benchmarks use, at factor x one season. Memoized.
+
+    Returns
+    -------
+    dict with 'scoring', 'projections' (ESPN) and 'fantasypros' frames
+    """
+    if factor not in _cache:
+        from glob import glob
+        scoring = pd.read_csv('data/scoring-espn.csv')
+        projections = pd.read_csv('data/projections-espn.csv')
+        fantasypros = pd.concat([pd.read_csv(filename) for filename in
+                                 sorted(glob('data/fantasypros-projections-*.csv'))],
+                                ignore_index=True)
+        _cache[factor] = {
+            'scoring': scale(scoring, factor),
+            'projections': scale(projections, factor),
+            'fantasypros': scale(fantasypros, factor, 'WEEK', 'SEASON'),
+        }
+    return _cache[factor]
+
+
+if __name__ == '__main__':
+    factor = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    for name, df in sorted(data(factor).items()):
+        print('{}: {} rows'.format(name, len(df)))
@@ -0,0 +1,444 @@
+"""
+Vectorized bootstrap.
+
+Resample indices are drawn a block of replicates at a time and the
+statistic is computed with an axis-wise NumPy reduction, so no replicate
+goes through a Python call. Blocks are sized to stay under a fixed memory
+budget no matter how many observations are being resampled.
+
+Draws come from a RandomState seeded the same way the old
+np.random.seed(42) + np.random.choice code was, so results match it.
+
+When only a summary of the replicates is wanted (mean, spread, a few
+percentiles), the summarize functions feed each block into an
+Accumulator instead of keeping every replicate around.
+
+map_cells spreads independent cells, ex. every expert x position, over
+a process pool. Each cell draws from its own stream, seeded from its
+key, so its result doesn't depend on which other cells ran, in what
+order, or on how many workers.
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from collections import OrderedDict
+import hashlib
+import numpy as np
+import pandas as pd
+
+N_SAMPLES = 10000
+SEED = 42
+MEMORY_BUDGET = 2 ** 27 # bytes of resampling work held at once (128MB)
+PERCENTILES = (2.5, 50, 97.5)
+SKETCH_BINS = 2048
+
+
+def percentile(q):
+    """Statfunction for the q-th percentile, ex. percentile(97.5)"""
+    def func(values, axis=None):
+        return np.percentile(values, q, axis=axis)
+    func.__name__ = 'percentile_{}'.format(q)
+    return func
+
+
+def _apply(statfunction, sims):
+    """Reduce each row (replicate) of sims to a single value."""
+    try:
+        return statfunction(sims, axis=1)
+    except TypeError:
+        # statfunction doesn't take an axis; fall back to a row at a time
+        return np.apply_along_axis(statfunction, 1, sims)
+
+
+def get_random_state(random_state):
+    """RandomState from a seed, a numpy.random.SeedSequence or None (SEED)"""
+    if isinstance(random_state, np.random.RandomState):
+        return random_state
+    if isinstance(random_state, np.random.SeedSequence):
+        return np.random.RandomState(np.random.MT19937(random_state))
+    return np.random.RandomState(SEED if random_state is None else random_state)
+
+
+def cell_seed(key, seed=SEED):
+    """
+    SeedSequence for one cell, from the root seed and the cell's key alone.
+    Keys are hashed by repr, so use strings, numbers or tuples of them.
+    """
+    digest = hashlib.sha1(repr(key).encode('utf-8')).digest()
+    words = np.frombuffer(digest[:16], dtype='<u4')
+    return np.random.SeedSequence(seed, spawn_key=tuple(int(word) for word in words))
+
+
+class Accumulator(object):
+    """
+    Running summary of bootstrap replicates, fed a block at a time.
+
+    The mean and standard deviation are exact, merged block by block with
+    Chan's parallel update. Percentiles are exact with exact=True, which
+    keeps every replicate (n_samples values per group, however many
+    observations were resampled). Otherwise they come from a histogram
+    sketch of a fixed number of bins per group. The bins start out
+    spanning twice the range of the first block, and a group's range
+    doubles (merging pairs of bins) whenever a replicate falls outside it,
+    so the error is at most one bin width.
+
+    Parameters
+    ----------
+    percentiles: percentiles to report, 0-100
+    exact: bool, keep the replicates for exact percentiles
+    bins: int, histogram bins per group for the sketch; a power of 2
+    """
+    def __init__(self, percentiles=PERCENTILES, exact=True, bins=SKETCH_BINS):
+        self.percentiles = np.asarray(percentiles, dtype=float)
+        self.exact = exact
+        self.bins = bins
+        self.count = 0
+        self._mean = self._m2 = self.min = self.max = None
+        self._blocks = []
+        self._counts = self._lo = self._width = None
+
+    def update(self, block):
+        """block: (n_replicates,) or (n_replicates, n_groups) array"""
+        block = np.asarray(block, dtype=float)
+        if block.ndim == 1:
+            block = block[:, np.newaxis]
+        n = len(block)
+        if n == 0:
+            return
+        mean = block.mean(axis=0)
+        m2 = ((block - mean) ** 2).sum(axis=0)
+        if self._mean is None:
+            self._mean, self._m2 = mean, m2
+            self.min, self.max = block.min(axis=0), block.max(axis=0)
+        else:
+            total = self.count + n
+            delta = mean - self._mean
+            self._mean = self._mean + delta * n / total
+            self._m2 = self._m2 + m2 + delta ** 2 * self.count * n / total
+            self.min = np.minimum(self.min, block.min(axis=0))
+            self.max = np.maximum(self.max, block.max(axis=0))
+        self.count += n
+
+        if self.exact:
+            self._blocks.append(block)
+        else:
+            self._sketch(block)
+
+    def _sketch(self, block):
+        n_groups = block.shape[1]
+        if self._counts is None:
+            lo, hi = np.fmin.reduce(block, axis=0), np.fmax.reduce(block, axis=0)
+            span = np.where(hi > lo, hi - lo, np.maximum(np.abs(lo), 1.))
+            span = np.where(np.isnan(span), 1., span)
+            self._lo = np.where(np.isnan(lo), 0., lo) - span / 2.
+            self._width = 2. * span / self.bins
+            self._counts = np.zeros((n_groups, self.bins), dtype=np.int64)
+        self._grow(block)
+        found = (block - self._lo) / self._width
+        found = np.clip(np.nan_to_num(found), 0, self.bins - 1).astype(np.intp)
+        found += np.arange(n_groups) * self.bins
+        self._counts += np.bincount(found.ravel(), minlength=n_groups * self.bins
+                                    ).reshape(n_groups, self.bins)
+
+    def _grow(self, block):
+        """Double the range of any group the block falls outside of."""
+        half = self.bins // 2
+        while True:
+            span = self._width * self.bins
+            below = (block < self._lo).any(axis=0)
+            above = (block >= self._lo + span).any(axis=0)
+            grow = below | above
+            if not grow.any():
+                return
+            # merge pairs of bins into one half; extend down first, then up
+            merged = self._counts[grow].reshape(-1, half, 2).sum(axis=2)
+            counts = np.zeros((len(merged), self.bins), dtype=np.int64)
+            down = below[grow]
+            counts[down, half:] = merged[down]
+            counts[~down, :half] = merged[~down]
+            self._counts[grow] = counts
+            self._lo = np.where(below, self._lo - span, self._lo)
+            self._width = np.where(grow, self._width * 2, self._width)
+
+    @property
+    def mean(self):
+        return self._mean
+
+    @property
+    def std(self):
+        return np.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else \
+            np.full_like(self._mean, np.nan)
+
+    def _order_statistic(self, k):
+        """Sketched value of the k-th smallest replicate of every group."""
+        cumulative = self._counts.cumsum(axis=1)
+        rows = np.arange(len(cumulative))
+        found = np.minimum((cumulative <= k).sum(axis=1), self.bins - 1)
+        before = np.where(found > 0, cumulative[rows, found - 1], 0)
+        # spread the replicates in a bin evenly across it
+        inside = (k - before + .5) / np.maximum(self._counts[rows, found], 1)
+        return self._lo + self._width * (found + inside)
+
+    def quantiles(self):
+        """(len(percentiles), n_groups) array of the requested percentiles"""
+        if self.exact:
+            return np.percentile(np.concatenate(self._blocks), self.percentiles, axis=0)
+        result = np.empty((len(self.percentiles), self._counts.shape[0]))
+        for i, q in enumerate(self.percentiles):
+            # interpolate between order statistics, like np.percentile
+            rank = q / 100. * (self.count - 1)
+            k = np.floor(rank)
+            below = self._order_statistic(k)
+            above = self._order_statistic(min(k + 1, self.count - 1))
+            result[i] = below + (rank - k) * (above - below)
+        result = np.clip(result, self.min, self.max)
+        # groups with no observations only ever saw NaN
+        return np.where(np.isnan(self._mean), np.nan, result)
+
+    def result(self):
+        """
+        Returns
+        -------
+        dict of 'mean', 'std' -> (n_groups,) arrays and 'percentiles' ->
+            (len(percentiles), n_groups) array
+        """
+        return {'mean': self.mean, 'std': self.std, 'percentiles': self.quantiles()}
+
+
+def resample(data, statfunction=np.mean, n_samples=N_SAMPLES,
+             random_state=None, memory_budget=MEMORY_BUDGET):
+    """
+    Bootstrap a statistic of one sample.
+
+    Parameters
+    ----------
+    data: array-like of observations
+    statfunction: function taking an axis argument, ex. np.mean, np.median
+    n_samples: int, number of bootstrap replicates
+    random_state: int seed or numpy.random.RandomState; defaults to SEED
+    memory_budget: int, max bytes of indices and resampled values to hold at once
+
+    Returns
+    -------
+    numpy array of n_samples bootstrapped values
+    """
+    result = np.empty(n_samples)
+    for start, stop, values in resample_blocks(data, statfunction, n_samples,
+                                               random_state, memory_budget):
+        result[start:stop] = values
+    return result
+
+
+def resample_blocks(data, statfunction=np.mean, n_samples=N_SAMPLES,
+                    random_state=None, memory_budget=MEMORY_BUDGET):
+    """
+    Same as resample, but yields (start, stop, values) for one block of
+    replicates at a time instead of returning them all.
+    """
+    data = np.asarray(data, dtype=float)
+    rs = get_random_state(random_state)
+    n = len(data)
+    if n == 0:
+        yield 0, n_samples, np.full(n_samples, np.nan)
+        return
+
+    # indices and resampled values are both held per block
+    block = max(1, memory_budget // (2 * n * data.itemsize))
+    for start in range(0, n_samples, block):
+        stop = min(start + block, n_samples)
+        idx = rs.randint(0, n, size=(stop - start, n))
+        yield start, stop, _apply(statfunction, data[idx])
+
+
+def bootstrap(data, statfunction=np.mean, n_samples=N_SAMPLES):
+    """Returns a Series of 10,000 boostrapped values with the given statfunction applied"""
+    return pd.Series(resample(data, statfunction, n_samples))
+
+
+def bootstrap_groups(data, keys, statfunction=np.mean, order=None,
+                     n_samples=N_SAMPLES, random_state=None,
+                     memory_budget=MEMORY_BUDGET):
+    """
+    Bootstrap a statistic for every group of data in one call.
+
+    Groups are drawn one after another from a single random stream, in
+    the given order, so the result matches looping over the groups and
+    resampling each after one np.random.seed call.
+
+    Parameters
+    ----------
+    data: pandas.Series or array of observations
+    keys: array-like or list of array-likes to group by, ex. df.EXPERT
+    statfunction: function taking an axis argument
+    order: list of group keys; defaults to order of first appearance.
+        Keys with no observations get NaN replicates.
+    n_samples, random_state, memory_budget: see resample
+
+    Returns
+    -------
+    OrderedDict of group key -> numpy array of n_samples values
+    """
+    values = np.asarray(data, dtype=float)
+    # group on plain arrays so pandas doesn't try to align on the index
+    if isinstance(keys, list):
+        keys = [np.asarray(k) for k in keys]
+    else:
+        keys = np.asarray(keys)
+    indices = pd.Series(values).groupby(keys, sort=False).indices
+    if order is None:
+        order = list(indices.keys())
+
+    rs = get_random_state(random_state)
+    empty = np.array([], dtype=int)
+    results = OrderedDict()
+    for key in order:
+        results[key] = resample(values[indices.get(key, empty)],
+                                statfunction, n_samples, rs, memory_budget)
+    return results
+
+
+def bootstrap_segments(data, keys, stats=('mean', 'median'),
+                       n_samples=N_SAMPLES, random_state=None,
+                       memory_budget=MEMORY_BUDGET):
+    """
+    Bootstrap the mean and/or median of every group at once.
+
+    Observations are sorted once by (group, value) so each group is a
+    contiguous segment, CSR style. A replicate resamples within every
+    segment at the same time, so one pass over the rows covers all of the
+    groups. Because each segment is sorted by value, sorting the resampled
+    indices also sorts the resampled values, and a segment's median sits
+    at a fixed offset.
+
+    Parameters
+    ----------
+    data: array-like of observations
+    keys: array-like of group labels, ex. df.name; NaN labels are dropped
+    stats: any of 'mean', 'median'
+    n_samples, random_state, memory_budget: see resample
+
+    Returns
+    -------
+    (groups, results): array of group labels in order of first
+        appearance, dict of stat -> (n_samples, n_groups) array
+    """
+    groups, blocks = segment_blocks(data, keys, stats, n_samples,
+                                    random_state, memory_budget)
+    results = dict((stat, np.empty((n_samples, len(groups)))) for stat in stats)
+    for start, stop, block in blocks:
+        for stat, values in block.items():
+            results[stat][start:stop] = values
+    return groups, results
+
+
+def segment_blocks(data, keys, stats=('mean', 'median'), n_samples=N_SAMPLES,
+                   random_state=None, memory_budget=MEMORY_BUDGET):
+    """
+    Same as bootstrap_segments, but returns (groups, blocks), where blocks
+    yields (start, stop, dict of stat -> (stop - start, n_groups) array)
+    for one block of replicates at a time.
+    """
+    values = np.asarray(data, dtype=float)
+    codes, groups = pd.factorize(np.asarray(keys), sort=False)
+    values, codes = values[codes >= 0], codes[codes >= 0]
+    return groups, _segment_blocks(values, codes, len(groups), stats, n_samples,
+                                   get_random_state(random_state), memory_budget)
+
+
+def _segment_blocks(values, codes, n_groups, stats, n_samples, rs, memory_budget):
+    order = np.lexsort((values, codes))
+    values, codes = values[order], codes[order]
+    sizes = np.bincount(codes, minlength=n_groups)
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    row_offsets, row_sizes = offsets[codes], sizes[codes]
+    lower = offsets + (sizes - 1) // 2
+    upper = offsets + sizes // 2
+
+    n = len(values)
+    # random floats, indices and resampled values are all held per block
+    block = max(1, memory_budget // (3 * max(1, n) * values.itemsize))
+    for start in range(0, n_samples, block):
+        stop = min(start + block, n_samples)
+        draws = rs.random_sample((stop - start, n))
+        idx = row_offsets + (draws * row_sizes).astype(np.intp)
+        results = {}
+        if 'mean' in stats:
+            sums = np.add.reduceat(values[idx], offsets, axis=1)
+            results['mean'] = sums / sizes
+        if 'median' in stats:
+            idx.sort(axis=1)
+            results['median'] = (values[idx[:, lower]] + values[idx[:, upper]]) / 2.
+        yield start, stop, results
+
+
+def summarize(data, statfunction=np.mean, n_samples=N_SAMPLES, random_state=None,
+              memory_budget=MEMORY_BUDGET, percentiles=PERCENTILES, exact=True):
+    """
+    Summary of a bootstrap of one sample without keeping the replicates
+    unless exact percentiles need them. Same draws as resample.
+
+    Returns
+    -------
+    Accumulator with one group
+    """
+    accumulator = Accumulator(percentiles, exact)
+    for _, _, values in resample_blocks(data, statfunction, n_samples,
+                                        random_state, memory_budget):
+        accumulator.update(values)
+    return accumulator
+
+
+def summarize_segments(data, keys, stats=('mean', 'median'), n_samples=N_SAMPLES,
+                       random_state=None, memory_budget=MEMORY_BUDGET,
+                       percentiles=PERCENTILES, exact=False):
+    """
+    Summary of bootstrap_segments, a block of replicates at a time. With
+    the default histogram sketch, memory doesn't grow with n_samples
+    either, only with the number of groups.
+
+    Returns
+    -------
+    (groups, results): array of group labels, dict of stat -> Accumulator
+    """
+    groups, blocks = segment_blocks(data, keys, stats, n_samples,
+                                    random_state, memory_budget)
+    results = dict((stat, Accumulator(percentiles, exact)) for stat in stats)
+    for _, _, block in blocks:
+        for stat, values in block.items():
+            results[stat].update(values)
+    return groups, results
+
+
+def _run_cell(func, values, seed):
+    return func(values, random_state=get_random_state(seed))
+
+
+def map_cells(func, cells, processes=None, seed=SEED):
+    """
+    Run a bootstrap over many independent cells in worker processes.
+
+    Parameters
+    ----------
+    func: picklable function (values, random_state=...) -> result, ex.
+        resample or functools.partial(confidence.adaptive, statfunction=np.median)
+    cells: dict of cell key -> array of observations
+    processes: int, worker processes; None for one per CPU, 1 to run in
+        this process
+    seed: root seed the cells' streams are derived from
+
+    Returns
+    -------
+    OrderedDict of cell key -> result, in the order of cells
+    """
+    seeds = dict((key, cell_seed(key, seed)) for key in cells)
+    results = {}
+    if processes == 1 or len(cells) <= 1:
+        for key, values in cells.items():
+            results[key] = _run_cell(func, values, seeds[key])
+    else:
+        # biggest cells first, so the last worker isn't stuck with one
+        todo = sorted(cells, key=lambda key: len(cells[key]), reverse=True)
+        with ProcessPoolExecutor(processes) as pool:
+            futures = dict((pool.submit(_run_cell, func, cells[key], seeds[key]), key)
+                           for key in todo)
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+    return OrderedDict((key, results[key]) for key in cells)
@@ -1,80 +1,75 @@
 """
 Compares prognosticators making fantasy football projections.
 """
-from mappings import ESPN_SCORING, FANTASY_RELEVANT, NAME_CORRECTIONS
-import utils
+from mappings import (ESPN_SCORING, FANTASY_RELEVANT, FANTASYPROS_STATS,
+                      SCORING_SYSTEMS)
+from players import PlayerIndex, split_names
+from scoring import Scorer, score
+from bootstrap import bootstrap_groups, map_cells
+from collections import OrderedDict
+from functools import partial
+from ranking import rank, top_n
+from render import Chart, render_all
+import argparse
+import confidence
+import cube
+import profiler
+import schema
+import storage
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.ticker import MaxNLocator
-from glob import glob
-import re
-
-def clean_name(player_name):
-    """
-    FantasyPros names have team names and other junk in them.
-    This cleans them up.
-    """
-    name = player_name.split('(')[0].strip()
-    if name in NAME_CORRECTIONS.keys():
-        return NAME_CORRECTIONS[name].strip().lower()
-
-    name = ''.join(char for char in name if char not in '.,')
-    return name.strip().lower()
-
-def get_team_name(player_name):
-    team = re.findall('\((.*)\)', player_name)
-    if team:
-        if team == 'WAS':
-            return 'Wsh'
-        return team[0].capitalize()
 
+@profiler.timed('read projections')
 def read_projections():
     """
-    get paths for expert projections; read into list of dataframes
+    Read every expert's projections from the store (or the FantasyPros CSVs)
     Returns unified dataframe with all projections
     """
-    file_list = glob('data/fantasypros-*.csv')
-    frames = []
-    for item in file_list:
-        # don't want the projections-espn file
-        # we have the same data from Fantasy Pros
-        if 'espn' not in item:
-            frames.append(pd.read_csv(item))
-    return pd.concat([df.fillna(0) for df in frames])
+    # don't need the projections-espn file; we have the same data from Fantasy Pros
+    projections = schema.typed(storage.load('fantasypros'))
+    numeric = projections.select_dtypes(include=[np.number]).columns
+    projections = projections.fillna(dict((col, 0) for col in numeric))
+    # projected points under every league's rules; kickers keep FPTS
+    with profiler.stage('score projections', rows=len(projections)):
+        scorer = Scorer(projections, FANTASYPROS_STATS, 'POSITION', 'FPTS')
+        scores = schema.downcast(scorer.score(prefix='FPTS_'))
+        return pd.concat([projections, scores], axis=1)
 
+@profiler.timed('read scoring')
 def read_scoring():
     """
     calculate actual points scored; use fractional to be more precise
-    ESPN only uses whole points; takes a bit bc of the looping
+    ESPN only uses whole points; see scoring.score
+    PTS_<system> columns hold points under each of mappings.SCORING_SYSTEMS
     """
-    scoring = pd.read_csv('data/scoring-espn.csv')
-    scoring['PTS_SCORED'] = 0
-    for idx, col in scoring.iterrows():
-        if scoring.ix[idx, 'position'] == 'K':
-            scoring.ix[idx, 'PTS_SCORED'] = scoring.ix[idx, 'total_pts']
-        for k, v in ESPN_SCORING.iteritems():
-            scoring.ix[idx, 'PTS_SCORED'] += scoring.ix[idx, k] * ESPN_SCORING[k]
-    return scoring
+    stats = set().union(*[set(rules) for rules in SCORING_SYSTEMS.values()])
+    columns = ['player_id', 'name', 'team', 'position', 'week', 'total_pts'] + \
+                sorted(stats)
+    scoring = schema.typed(storage.load('espn-scoring', columns=columns))
+    with profiler.stage('score actuals', rows=len(scoring)):
+        scoring['PTS_SCORED'] = score(scoring, ESPN_SCORING)
+        scores = Scorer(scoring).score(prefix='PTS_')
+        return schema.downcast(pd.concat([scoring, scores], axis=1))
 
+def errors_by_system(df):
+    """Mean projection error of every expert under every scoring system."""
+    errors = pd.DataFrame(dict(
+        (name, df['FPTS_' + name] - df['PTS_' + name]) for name in SCORING_SYSTEMS))
+    errors['EXPERT'] = df.EXPERT.values
+    return errors.groupby('EXPERT', observed=True).mean().round(2)
+
+@profiler.timed('rank')
 def get_fantasy_relevant(projections_df):
     """
-    get only fantasy relevant players; top N at each position
-    see mappings.FANTASY_RELEVANT; uses utils.ranker function
+    get only fantasy relevant players; top N at each position for every
+    expert and week. see mappings.FANTASY_RELEVANT and ranking.rank
     """
-    cols_to_groupby = ['EXPERT', 'POSITION', 'WEEK']
-    ranked = projections_df.groupby(cols_to_groupby).apply(utils.ranker)
-    # ranked.reset_index(inplace=True)
-
-    cols = ['PLAYER_NAME', 'POSITION', 'WEEK', 'EXPERT', 'POSITION_RANK'
-            'FPTS', 'PTS_SCORED', 'PTS_DIFF', 'REL_DIFF']
-    relevant = []    
-    for pos, n in FANTASY_RELEVANT.iteritems():
-        cond = (ranked.POSITION == pos) & \
-                (ranked.POSITION_RANK <= n)
-        relevant.append(ranked[cond])
-    return pd.concat(relevant)
+    ranked = rank(projections_df, ['EXPERT', 'POSITION', 'WEEK'], 'FPTS',
+                  rank_col='POSITION_RANK')
+    return top_n(ranked, FANTASY_RELEVANT, position_col='POSITION',
+                 rank_col='POSITION_RANK')
 
+@profiler.timed('bootstrap experts')
 def bootstrap_experts(df, col_to_bootstrap, statfunction=np.mean):
     """
     Runs the bootrapping method for each expert on the given column_name.
@@ -90,46 +85,63 @@ def bootstrap_experts(df, col_to_bootstrap, statfunction=np.mean):
 
     Returns
     -------
+    dict of expert name -> numpy array of bootstrapped values
+    """
+    print('Bootstrapping {} for all experts'.format(col_to_bootstrap))
+    return dict(bootstrap_groups(df[col_to_bootstrap], df.EXPERT, statfunction))
+
+@profiler.timed('bootstrap experts x positions')
+def bootstrap_experts_positions(df, col_to_bootstrap, statfunction=np.mean,
+                                processes=None):
+    """
+    Same as bootstrap_experts, but for every expert and position. Each
+    cell only resamples until its 95% interval has settled, see
+    confidence.adaptive, so cells have different numbers of values.
+    Cells run in parallel, on their own random streams (see
+    bootstrap.map_cells), so the results don't depend on processes.
+
+    Returns
+    -------
+    dict of expert name -> { position -> numpy array of bootstrapped values }
     """
-    np.random.seed(42) # set random seed for consistent results
-    experts = {}
-    for expert_name in df.EXPERT.unique().tolist():
-        print('Bootstrapping {} for {}'.format(col_to_bootstrap, expert_name))
-        # filter to the relevant expert and column
-        data = df[ df.EXPERT == expert_name ][col_to_bootstrap]
-        # use the bootstrap to create 10000 x N matrix
-        sims = np.random.choice(data, size=(10000, len(data)), replace=True)
-        # apply statfunction to each row (simulation) of the matrix
-        booted_vals = pd.DataFrame(sims).apply(statfunction, axis=1).tolist()
-        experts[expert_name] = booted_vals
-    return experts
-
-def bootstrap_experts_positions(df, col_to_bootstrap, statfunction=np.mean):
-    np.random.seed(42) # set random seed for consistent results
-    results = {}
+    print('Bootstrapping {} for all experts and positions'.format(col_to_bootstrap))
     experts = df.EXPERT.unique().tolist()
     positions = df.POSITION.unique().tolist()
-    for ex_name in experts:
-        pos_results = {}
-
-        msg = 'Bootstrapping {} for {} ({})'
-        for pos in positions:
-            print(msg.format(col_to_bootstrap, ex_name, pos))
-            # filter to the relevant expert and position
-            condition = (df.EXPERT == ex_name) & (df.POSITION == pos)
-            data = df[condition][col_to_bootstrap]
-            # use the bootstrap to create 10000 x N matrix
-            sims = np.random.choice(data, size=(10000, len(data)), replace=True)
-            # apply statfunction to each row (simulation) of the matrix
-            booted_vals = pd.DataFrame(sims).apply(statfunction, axis=1).tolist() 
-            pos_results[pos] = booted_vals
-
-        results[ex_name] = pos_results
+    values = np.asarray(df[col_to_bootstrap], dtype=float)
+    indices = df.groupby([df.EXPERT.values, df.POSITION.values], sort=False).indices
+    empty = np.array([], dtype=int)
+    cells = OrderedDict(((ex_name, pos), values[indices.get((ex_name, pos), empty)])
+                        for ex_name in experts for pos in positions)
+    booted = map_cells(partial(confidence.adaptive, statfunction=statfunction),
+                       cells, processes)
+    results = {ex_name: {} for ex_name in experts}
+    for (ex_name, pos), (_, replicates) in booted.items():
+        results[ex_name][pos] = replicates
     return results
 
-def generate_bootstrap_histograms(data, title):
+@profiler.timed('expert intervals')
+def expert_intervals(df, column, method='t'):
     """
-    Generate histograms for the bootstrapped values.
+    95% interval of the mean of column for each expert, straight from the
+    data; see confidence.interval for the methods.
+
+    Returns
+    -------
+    dict of expert name -> confidence.Interval
+    """
+    return dict((expert, confidence.interval(values, method=method))
+                for expert, values in df.groupby('EXPERT', sort=False,
+                                                 observed=True)[column])
+
+def expert_filename(title, expert):
+    ex_name = ''.join(char for char in expert if char not in '.,')
+    filename = title + '-' + ex_name
+    filename = filename.strip().lower().replace(' ', '-')
+    return 'charts/fantasypros/{}.png'.format(filename)
+
+def generate_bootstrap_histograms(data, title, intervals=None):
+    """
+    Histograms for the bootstrapped values.
 
     Parameters
     ----------
@@ -138,106 +150,135 @@ def generate_bootstrap_histograms(data, title):
                         'expert2': [ 4, 5.5, 6, 4, 5 ]
                     }
     title: string, a title of what the distribution is. duh.
+    intervals: optional dict of expert -> confidence.Interval to print;
+        otherwise they're read off the bootstrapped values
+
+    Returns
+    -------
+    list of render.Chart
     """
-    for expert, values in data.iteritems():
-        ex_name = ''.join(char for char in expert if char not in '.,')
-        filename = title + '-' + ex_name
-        filename = filename.strip().lower().replace(' ', '-')
-        utils.histogram(
+    charts = []
+    for expert, values in data.items():
+        charts.append(Chart(
+            'histogram',
             data=values,
-            filename='charts/fantasypros/{}.png'.format(filename),
+            filename=expert_filename(title, expert),
             title='{} - {}'.format(title, expert),
             figsize=(10,5),
             titlesize=26,
             xsize=26,
             xlim=(-3, 3),
             small=True
-        )
-        confidence = np.percentile(values, q=[2.5, 50, 97.5])
-        lower, mid, upper = [round(i, 2) for i in sorted(confidence)]
+        ))
+        if intervals is None:
+            ci = confidence.percentile_interval(values)
+        else:
+            ci = intervals[expert]
+        lower, mid, upper = [round(i, 2) for i in (ci.lower, ci.estimate, ci.upper)]
         msg = '95% {}: {} +/- {} (Lower: {} Mid: {} Upper: {})'
         print(msg.format(expert, mid, (mid-lower), lower, mid, upper))
+    return charts
 
 def generate_error_histograms(df, column, title):
     """
-    Generate actual error distributions for each expert.
+    Actual error distributions for each expert.
     Plots the distribution of the given column.
+
+    Returns
+    -------
+    list of render.Chart
     """
-    for expert in df.EXPERT.unique().tolist():
-        ex_name = ''.join(char for char in expert if char not in '.,')
-        filename = title + '-' + ex_name
-        filename = filename.strip().lower().replace(' ', '-')
-        utils.histogram(
-            data=df[ df.EXPERT == expert ][column],
-            filename='charts/fantasypros/{}.png'.format(filename),
+    charts = []
+    for expert, values in df.groupby('EXPERT', sort=False, observed=True)[column]:
+        charts.append(Chart(
+            'histogram',
+            data=values,
+            filename=expert_filename(title, expert),
             title='{} - {}'.format(title, expert),
             figsize=(10,5),
             titlesize=26,
             xsize=26,
             xlim=(-40, 40),
             small=True
-        )
+        ))
+    return charts
 
 def generate_histogram_grid(data):
-    fig, axes = plt.subplots(7, 5, figsize=(20,20), sharex='row')
-    fig.tight_layout(pad=3.0, h_pad=5.0)
-    cmap = plt.get_cmap('Paired') # colormap to use
-    positions = ['QB', 'RB', 'WR', 'TE', 'K'] # want to draw in specifc order
-    for x, source in enumerate(data.keys()):
-        for y, position in enumerate(positions):
-            # resize xaxis tick marks
-            [item.set_fontsize(20) for item in axes[x][y].get_xticklabels()]
-            axes[x][y].hist(data[source][position], color=cmap(1.*y/len(positions)))
-            axes[x][y].set_title('{}\n{}'.format(source, position), 
-                                    fontdict={'fontsize': 20})
-            axes[x][y].set_yticklabels('')
-            # always center x-axis at 0
-            axes[x][y].set_xlim(-5., 5.)
-            axes[x][y].xaxis.set_major_locator(MaxNLocator(symmetric=True))
-            axes[x][y].locator_params(nbins=5)
-            axes[x][y].axvline(x=0, ls=':', color='k', linewidth=2.5)
-            axes[x][y].spines['top'].set_visible(False)
-            axes[x][y].spines['left'].set_visible(False)
-            axes[x][y].spines['right'].set_visible(False)
-    plt.savefig('charts/fantasypros/histogram-grid.png', bbox_inches='tight')
+    """Every expert x position distribution on one page; see render.draw_grid."""
+    return Chart('grid', 'charts/fantasypros/histogram-grid.png', data)
 
-if __name__ == '__main__':
-    projections = read_projections()
-    scoring = read_scoring()
-    fantasy_relevant = get_fantasy_relevant(projections)
-
-    # clean up names for joining projections with actual scoring
-    fantasy_relevant['PLAYER_NAME'] = fantasy_relevant.Player.apply(clean_name)
-    fantasy_relevant['TEAM'] = fantasy_relevant.Player.apply(get_team_name)
-    scoring['PLAYER_NAME'] = scoring.name.apply(clean_name)
-
-    joined = pd.merge(fantasy_relevant, scoring,
-                        left_on=['PLAYER_NAME', 'WEEK', 'POSITION'],
-                        right_on=['PLAYER_NAME', 'week', 'position'],
-                        how='left')
+def join_actuals(fantasy_relevant, scoring):
+    """
+    Projections joined to what the players actually scored, with the
+    point difference (PTS_DIFF) and relative difference (REL_DIFF).
+    """
+    # match FantasyPros names to ESPN player ids for joining with actual scoring
+    with profiler.stage('resolve players', rows=len(fantasy_relevant)):
+        players = PlayerIndex.load_or_build(scoring)
+        fantasy_relevant['player_id'] = players.resolve_many(fantasy_relevant.Player,
+                                                             fantasy_relevant.POSITION)
+        players.save()
+        names, teams = split_names(fantasy_relevant.Player)
+        fantasy_relevant['PLAYER_NAME'], fantasy_relevant['TEAM'] = names, teams
+        fantasy_relevant, scoring = schema.conform([fantasy_relevant, scoring])
+
+    actuals = ['PTS_SCORED'] + ['PTS_' + name for name in SCORING_SYSTEMS]
+    with profiler.stage('join') as stage:
+        # integer lookup on (player_id, week); ESPN has one row per pair
+        joined = schema.join(fantasy_relevant, scoring, ['player_id', 'WEEK'],
+                             ['player_id', 'week'], columns=actuals)
+        stage.rows = len(joined)
     
     # drop players that don't have teams - Brandon Jacobs, JP Wilson, etc.
     # also, some sites consider Dexter McCluster an RB, some WR, and some both
     # we're just going to consider him however they projected him
     cols = ['PLAYER_NAME', 'TEAM', 'POSITION', 'WEEK', 'EXPERT',
-            'POSITION_RANK','FPTS', 'PTS_SCORED']
+            'POSITION_RANK','FPTS', 'PTS_SCORED'] + \
+            ['FPTS_' + name for name in SCORING_SYSTEMS] + \
+            ['PTS_' + name for name in SCORING_SYSTEMS]
     joined = joined[cols]
     
     joined.dropna(how='any', subset=['TEAM', 'PTS_SCORED'], inplace=True)
     joined['PTS_DIFF'] = (joined.FPTS - joined.PTS_SCORED)
     joined['REL_DIFF'] = (joined.PTS_DIFF / joined.FPTS)
+    return joined
+
+def load_joined():
+    """Every fantasy relevant projection joined to actual scoring."""
+    fantasy_relevant = get_fantasy_relevant(read_projections())
+    return join_actuals(fantasy_relevant, read_scoring())
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--processes', type=int,
+                        help='worker processes for bootstrapping and drawing; '
+                             'default one per CPU')
+    profiler.add_arguments(parser)
+    args = parser.parse_args()
+    profiler.configure(args)
+
+    joined = load_joined()
+    accuracy_cube = cube.build(joined)
+    print('wrote {}'.format(accuracy_cube.save()))
+    print('Mean error by scoring system')
+    print(errors_by_system(joined))
     
     abs_err_by_expert = bootstrap_experts(joined, 'PTS_DIFF')
-    abs_err_by_expert_position = bootstrap_experts_positions(joined, 'PTS_DIFF')
+    abs_err_by_expert_position = bootstrap_experts_positions(joined, 'PTS_DIFF',
+                                                             processes=args.processes)
     # rel_err_by_expert = bootstrap_experts(joined, 'REL_DIFF')
     # rel_err_by_expert_position = bootstrap_experts_positions(joined, 'REL_DIFF')
 
-    generate_error_histograms(joined, column='PTS_DIFF',
-                                title='Point Difference')
-    # generate_error_histograms(joined, column='REL_DIFF',
-    #                             title='Relative Error')
-    generate_bootstrap_histograms(abs_err_by_expert,
-                                    title='Mean Error')
-    # generate_bootstrap_histograms(rel_err_by_expert,
-    #                                 title='Mean Rel. Error')
-    generate_histogram_grid(abs_err_by_expert_position)
\ No newline at end of file
+    charts = generate_error_histograms(joined, column='PTS_DIFF',
+                                        title='Point Difference')
+    # charts += generate_error_histograms(joined, column='REL_DIFF',
+    #                                     title='Relative Error')
+    charts += generate_bootstrap_histograms(abs_err_by_expert,
+                                            title='Mean Error',
+                                            intervals=expert_intervals(joined, 'PTS_DIFF'))
+    # charts += generate_bootstrap_histograms(rel_err_by_expert,
+    #                                         title='Mean Rel. Error')
+    charts.append(generate_histogram_grid(abs_err_by_expert_position))
+    with profiler.stage('render', rows=len(charts)):
+        render_all(charts, processes=args.processes)
+    profiler.finish(args)
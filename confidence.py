@@ -0,0 +1,196 @@
+"""
+Confidence intervals, from cheapest to most expensive.
+
+    t           closed form for the mean (Student's t), no resampling
+    normal      same with the normal quantile
+    percentile  percentiles of the bootstrap replicates
+    bca         bias-corrected and accelerated bootstrap; the acceleration
+                comes from a jackknife of the statistic
+
+The bootstrap methods can run adaptively: replicates are drawn a batch
+at a time and resampling stops once neither endpoint has moved by more
+than tolerance x the width of the interval since the last batch. For the
+mean of a few hundred observations that's usually a couple thousand
+replicates instead of 10,000.
+
+    ci = interval(df.PTS_DIFF, method='bca')
+    ci.lower, ci.estimate, ci.upper, ci.n_samples
+"""
+from bootstrap import resample, get_random_state, N_SAMPLES, MEMORY_BUDGET
+from collections import namedtuple
+from scipy import stats
+import numpy as np
+
+ALPHA = 0.05
+TOLERANCE = 0.01 # of the interval's width
+BATCH = 500
+MIN_SAMPLES = 1000
+
+Interval = namedtuple('Interval', ['lower', 'estimate', 'upper', 'n_samples'])
+
+
+def t_interval(data, alpha=ALPHA):
+    """Interval for the mean from Student's t distribution."""
+    data = np.asarray(data, dtype=float)
+    return _analytic(data, stats.t.ppf(1 - alpha / 2., max(len(data) - 1, 1)))
+
+
+def normal_interval(data, alpha=ALPHA):
+    """Interval for the mean from the normal distribution."""
+    data = np.asarray(data, dtype=float)
+    return _analytic(data, stats.norm.ppf(1 - alpha / 2.))
+
+
+def _analytic(data, quantile):
+    if len(data) < 2:
+        mean = data.mean() if len(data) else np.nan
+        return Interval(np.nan, mean, np.nan, 0)
+    mean = data.mean()
+    margin = quantile * data.std(ddof=1) / np.sqrt(len(data))
+    return Interval(mean - margin, mean, mean + margin, 0)
+
+
+def percentile_interval(replicates, alpha=ALPHA):
+    """Interval from the percentiles of bootstrap replicates."""
+    replicates = np.asarray(replicates, dtype=float)
+    lower, mid, upper = np.percentile(replicates, [100 * alpha / 2., 50,
+                                                   100 * (1 - alpha / 2.)])
+    return Interval(lower, mid, upper, len(replicates))
+
+
+def jackknife(data, statfunction=np.mean, memory_budget=MEMORY_BUDGET):
+    """
+    The statistic of data with each observation left out in turn.
+
+    Returns
+    -------
+    numpy array, one value per observation
+    """
+    data = np.asarray(data, dtype=float)
+    n = len(data)
+    if statfunction is np.mean:
+        return (data.sum() - data) / (n - 1)
+    # row i of a block is data without observation i
+    result = np.empty(n)
+    block = max(1, memory_budget // (2 * n * data.itemsize))
+    columns = np.arange(n - 1)
+    for start in range(0, n, block):
+        rows = np.arange(start, min(start + block, n))[:, np.newaxis]
+        idx = columns + (columns >= rows)
+        try:
+            result[rows[:, 0]] = statfunction(data[idx], axis=1)
+        except TypeError:
+            result[rows[:, 0]] = np.apply_along_axis(statfunction, 1, data[idx])
+    return result
+
+
+def acceleration(data, statfunction=np.mean):
+    """BCa's acceleration, from the skewness of the jackknife values."""
+    jack = jackknife(data, statfunction)
+    deviations = jack.mean() - jack
+    denominator = 6. * (deviations ** 2).sum() ** 1.5
+    return (deviations ** 3).sum() / denominator if denominator else 0.
+
+
+def bca_interval(data, replicates, statfunction=np.mean, alpha=ALPHA, accel=None):
+    """
+    Bias-corrected and accelerated interval.
+
+    Parameters
+    ----------
+    data: the observations the replicates were drawn from
+    replicates: bootstrap replicates of statfunction
+    accel: precomputed acceleration(data, statfunction), if any
+    """
+    data = np.asarray(data, dtype=float)
+    replicates = np.asarray(replicates, dtype=float)
+    estimate = statfunction(data)
+    if accel is None:
+        accel = acceleration(data, statfunction)
+    # share of replicates below the estimate, ties counted half
+    below = ((replicates < estimate).sum() + .5 * (replicates == estimate).sum())
+    bias = stats.norm.ppf(below / len(replicates))
+    if not np.isfinite(bias):
+        # every replicate on one side; no correction is possible
+        return percentile_interval(replicates, alpha)._replace(estimate=estimate)
+    z = stats.norm.ppf([alpha / 2., 1 - alpha / 2.])
+    adjusted = stats.norm.cdf(bias + (bias + z) / (1 - accel * (bias + z)))
+    lower, upper = np.percentile(replicates, 100 * adjusted)
+    return Interval(lower, estimate, upper, len(replicates))
+
+
+def adaptive(data, statfunction=np.mean, method='percentile', alpha=ALPHA,
+             tolerance=TOLERANCE, batch=BATCH, min_samples=MIN_SAMPLES,
+             max_samples=N_SAMPLES, random_state=None):
+    """
+    Bootstrap until the interval stops moving.
+
+    Parameters
+    ----------
+    data: array-like of observations
+    statfunction: function taking an axis argument, ex. np.mean
+    method: 'percentile' or 'bca'
+    tolerance: stop once both endpoints moved less than this fraction of
+        the interval's width over the last batch
+    batch: replicates drawn between checks
+    min_samples, max_samples: bounds on the number of replicates
+    random_state: int seed or numpy.random.RandomState; defaults to SEED
+
+    Returns
+    -------
+    (Interval, numpy array of the replicates drawn)
+    """
+    data = np.asarray(data, dtype=float)
+    rs = get_random_state(random_state)
+    accel = acceleration(data, statfunction) if method == 'bca' and len(data) > 1 else 0.
+
+    def estimate(replicates):
+        if method == 'bca':
+            return bca_interval(data, replicates, statfunction, alpha, accel)
+        return percentile_interval(replicates, alpha)
+
+    replicates = resample(data, statfunction, min(min_samples, max_samples), rs)
+    ci = estimate(replicates)
+    while len(replicates) < max_samples and len(data):
+        more = resample(data, statfunction, min(batch, max_samples - len(replicates)), rs)
+        replicates = np.concatenate([replicates, more])
+        previous, ci = ci, estimate(replicates)
+        moved = max(abs(ci.lower - previous.lower), abs(ci.upper - previous.upper))
+        if moved <= tolerance * (ci.upper - ci.lower):
+            break
+    return ci, replicates
+
+
+def interval(data, statfunction=np.mean, method='t', alpha=ALPHA,
+             n_samples=N_SAMPLES, random_state=None, adaptive_stop=True,
+             tolerance=TOLERANCE):
+    """
+    A confidence interval by any of the methods above.
+
+    Parameters
+    ----------
+    data: array-like of observations
+    statfunction: statistic to bound; 't' and 'normal' only do np.mean
+    method: 't', 'normal', 'percentile' or 'bca'
+    n_samples: replicates for the bootstrap methods; the most drawn when
+        adaptive_stop is on
+    adaptive_stop: bool, stop resampling once the endpoints converge
+
+    Returns
+    -------
+    Interval(lower, estimate, upper, n_samples); n_samples is 0 for the
+        closed forms
+    """
+    if method in ('t', 'normal'):
+        if statfunction is not np.mean:
+            raise ValueError('{} intervals are only for the mean'.format(method))
+        return (t_interval if method == 't' else normal_interval)(data, alpha)
+    if method not in ('percentile', 'bca'):
+        raise ValueError('unknown method {}'.format(method))
+    if adaptive_stop:
+        return adaptive(data, statfunction, method, alpha, tolerance,
+                        max_samples=n_samples, random_state=random_state)[0]
+    replicates = resample(data, statfunction, n_samples, random_state)
+    if method == 'bca':
+        return bca_interval(data, replicates, statfunction, alpha)
+    return percentile_interval(replicates, alpha)
@@ -0,0 +1,258 @@
+"""
+Crawl ESPN gamelogs for a list of players.
+
+Player ids go into a work queue in SQLite. A pool of workers fetches and
+parses pages, and each finished player's rows are committed along with
+its status in a single transaction. Player ids are the queue's primary
+key, so adding the same player twice does nothing, and a crawl that's
+interrupted or has failures picks up where it stopped on the next run.
+The rows are written out as one CSV per position, with the columns in
+mappings.HEADER_MAPPING.
+
+    python crawler.py                         # everyone in data/player-positions.csv
+    python crawler.py --ids 1428 12514        # just these players
+    python crawler.py --url 'http://localhost:8000/{}.html' --no-cache
+"""
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from mappings import HEADER_MAPPING
+from http_cache import HTTPCache
+from parsers import parse_gamelog
+from fetcher import Fetcher, RetryPolicy, CircuitOpen, RETRY_STATUSES, USER_AGENT
+from collections import deque
+import argparse
+import profiler
+import sqlite3
+import json
+import time
+import csv
+import os
+
+QUEUE_PATH = '.cache/gamelogs.sqlite'
+GAMELOG_URL = 'http://espn.go.com/nfl/player/gamelog/_/id/{}'
+GAMELOG_DIR = 'data/gamelogs'
+PLAYERS_FILE = 'data/player-positions.csv'
+WORKERS = 4
+MAX_ATTEMPTS = 3
+# positions without a gamelog page
+SKIP_POSITIONS = ('D/ST', 'DST')
+
+
+class CrawlQueue(object):
+    """
+    Persistent queue of player ids and the gamelog rows crawled for them.
+
+    Parameters
+    ----------
+    path: string, SQLite file to keep the queue in
+    """
+    def __init__(self, path=QUEUE_PATH):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.db = sqlite3.connect(path)
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS players (
+                player_id INTEGER PRIMARY KEY,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                updated REAL
+            );
+            CREATE TABLE IF NOT EXISTS gamelogs (
+                player_id INTEGER,
+                position TEXT,
+                game INTEGER,
+                stats TEXT,
+                PRIMARY KEY (player_id, game)
+            );''')
+        self.db.commit()
+
+    def add(self, player_ids):
+        """Queue players; ones already queued are left alone. Returns how many were new."""
+        before = self.db.total_changes
+        self.db.executemany('INSERT OR IGNORE INTO players (player_id) VALUES (?)',
+                            [(int(player_id),) for player_id in player_ids])
+        self.db.commit()
+        return self.db.total_changes - before
+
+    def pending(self, max_attempts=MAX_ATTEMPTS):
+        """Player ids still to crawl, including failures with attempts left."""
+        rows = self.db.execute(
+            "SELECT player_id FROM players WHERE status = 'pending' OR "
+            "(status = 'failed' AND attempts < ?) ORDER BY player_id", (max_attempts,))
+        return [player_id for player_id, in rows]
+
+    def finish(self, player_id, rows):
+        """Checkpoint one player: their rows and 'done' in one transaction."""
+        with self.db:
+            self.db.execute('DELETE FROM gamelogs WHERE player_id = ?', (player_id,))
+            self.db.executemany('INSERT INTO gamelogs VALUES (?, ?, ?, ?)', [
+                (player_id, row['position'], game, json.dumps(row))
+                for game, row in enumerate(rows)])
+            self.db.execute("UPDATE players SET status = 'done', error = NULL, "
+                            "attempts = attempts + 1, updated = ? WHERE player_id = ?",
+                            (time.time(), player_id))
+
+    def fail(self, player_id, error):
+        with self.db:
+            self.db.execute("UPDATE players SET status = 'failed', error = ?, "
+                            "attempts = attempts + 1, updated = ? WHERE player_id = ?",
+                            (str(error), time.time(), player_id))
+
+    def reset(self, player_ids=None):
+        """Crawl these players (default: everyone) again on the next run."""
+        with self.db:
+            if player_ids is None:
+                self.db.execute("UPDATE players SET status = 'pending', attempts = 0")
+            else:
+                self.db.executemany("UPDATE players SET status = 'pending', attempts = 0 "
+                                    "WHERE player_id = ?",
+                                    [(int(player_id),) for player_id in player_ids])
+
+    def counts(self):
+        """dict of status -> number of players"""
+        return dict(self.db.execute('SELECT status, COUNT(*) FROM players GROUP BY status'))
+
+    def rows(self, position):
+        """Every crawled gamelog row for a position, by player and game."""
+        cursor = self.db.execute('SELECT stats FROM gamelogs WHERE position = ? '
+                                 'ORDER BY player_id, game', (position,))
+        for stats, in cursor:
+            yield json.loads(stats)
+
+    def export(self, directory=GAMELOG_DIR):
+        """
+        Write gamelogs-<position>.csv for every position with rows.
+
+        Returns
+        -------
+        list of the files written
+        """
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        written = []
+        for position, columns in sorted(HEADER_MAPPING.items()):
+            rows = self.rows(position)
+            first = next(rows, None)
+            if first is None:
+                continue
+            filename = os.path.join(directory, 'gamelogs-{}.csv'.format(position.lower()))
+            with open(filename, 'w', newline='') as f:
+                writer = csv.DictWriter(f, ['player_id', 'name', 'position'] + columns,
+                                        extrasaction='ignore')
+                writer.writeheader()
+                writer.writerow(first)
+                writer.writerows(rows)
+            written.append(filename)
+        return written
+
+
+def crawl(queue, fetcher, workers=WORKERS, url=GAMELOG_URL,
+          max_attempts=MAX_ATTEMPTS):
+    """
+    Fetch and parse every pending player, at most workers at a time.
+
+    Each player is checkpointed as soon as it's done, so stopping the crawl
+    at any point only loses the pages in flight. A player turned away by
+    an open circuit breaker isn't counted as failing: they go back in line
+    and the crawl waits out the breaker before sending anything else.
+    After max_attempts such tries they're left pending for the next run.
+
+    Returns
+    -------
+    (number done, number failed) in this run
+    """
+    todo = deque(queue.pending(max_attempts))
+    print('Crawling gamelogs for {} players'.format(len(todo)))
+
+    def fetch(player_id):
+        with profiler.stage('fetch'):
+            response = fetcher.get(url.format(player_id))
+        with profiler.stage('parse') as record:
+            rows = parse_gamelog(response.text, player_id)
+            record.rows = len(rows)
+        return rows
+
+    done = failed = reported = 0
+    deferred = {}
+    resume = 0.
+    with ThreadPoolExecutor(workers) as pool:
+        running = {}
+        while True:
+            # keep a couple of pages per worker queued up, no more
+            while todo and len(running) < 2 * workers and time.time() >= resume:
+                player_id = todo.popleft()
+                running[pool.submit(fetch, player_id)] = player_id
+            if not running:
+                if not todo:
+                    break
+                time.sleep(max(0, resume - time.time()))
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED,
+                               timeout=max(0, resume - time.time()) or None)
+            for future in finished:
+                player_id = running.pop(future)
+                try:
+                    queue.finish(player_id, future.result())
+                    done += 1
+                except CircuitOpen as e:
+                    deferred[player_id] = deferred.get(player_id, 0) + 1
+                    if deferred[player_id] < max_attempts:
+                        todo.append(player_id)
+                        resume = max(resume, time.time() + fetcher.breaker_reset)
+                    else:
+                        print('Leaving player {} for the next run: {}'.format(player_id, e))
+                except Exception as e:
+                    print('Failed on player {}: {}'.format(player_id, e))
+                    queue.fail(player_id, e)
+                    failed += 1
+            if done + failed >= reported + 50:
+                reported = done + failed
+                print('{} done, {} failed'.format(done, failed))
+    return done, failed
+
+
+def read_players(filename=PLAYERS_FILE):
+    with open(filename) as f:
+        return [int(row['player_id']) for row in csv.DictReader(f)
+                if row['position'] not in SKIP_POSITIONS]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Crawl ESPN gamelogs.')
+    parser.add_argument('--players', default=PLAYERS_FILE,
+                        help='CSV of player_id, name, position to crawl')
+    parser.add_argument('--ids', type=int, nargs='+', help='crawl these players instead')
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--queue', default=QUEUE_PATH)
+    parser.add_argument('--output', default=GAMELOG_DIR)
+    parser.add_argument('--url', default=GAMELOG_URL,
+                        help='gamelog url template, ex. a local fixture server')
+    parser.add_argument('--offline', action='store_true',
+                        help='replay pages from the cache; no network access')
+    parser.add_argument('--no-cache', action='store_true')
+    parser.add_argument('--reset', action='store_true',
+                        help='crawl the players again even if they were done')
+    profiler.add_arguments(parser)
+    args = parser.parse_args()
+    profiler.configure(args)
+
+    queue = CrawlQueue(args.queue)
+    player_ids = args.ids or read_players(args.players)
+    print('{} new players queued'.format(queue.add(player_ids)))
+    if args.reset:
+        queue.reset(player_ids)
+
+    cache = None if args.no_cache else HTTPCache(offline=args.offline)
+    # gamelog pages throw the same random 404s as the rest of ESPN
+    fetcher = Fetcher(headers=USER_AGENT, max_per_host=args.workers, cache=cache,
+                      retry=RetryPolicy(statuses=RETRY_STATUSES + (404,)))
+    try:
+        crawl(queue, fetcher, args.workers, args.url)
+    finally:
+        # whatever finished is checkpointed; write it out either way
+        print(queue.counts())
+        fetcher.metrics.report()
+        for filename in queue.export(args.output):
+            print('wrote {}'.format(filename))
+        profiler.finish(args)
@@ -0,0 +1,247 @@
+"""
+A pre-aggregated cube of projection errors.
+
+The joined projections and scoring from compare-sites.py are reduced to
+one cell per expert x position x week x rank bucket. Each cell keeps
+sufficient statistics of the error: count, sum, sum of squares, min, max
+and a histogram over fixed bins. Any slice or roll-up of the cube is a
+sum of cells, so means and variances are exact and quantiles are read
+off the merged histogram, all without touching the raw rows.
+
+    python cube.py query --expert numberFire --expert "Pro Football Focus" \\
+        --position WR --weeks 5-9 --by expert
+"""
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import argparse
+import time
+import os
+
+CUBE_PATH = 'data/store/accuracy-cube.npz'
+DIMENSIONS = ['expert', 'position', 'week', 'rank']
+# joined column each dimension comes from
+COLUMNS = {'expert': 'EXPERT', 'position': 'POSITION', 'week': 'WEEK',
+           'rank': 'POSITION_RANK'}
+# rank buckets start at these ranks: 1-5, 6-12, 13-24, 25-40, 41+
+RANK_BUCKETS = [1, 6, 13, 25, 41]
+# error histogram bins, in points; the first and last are catch-alls
+HIST_EDGES = np.arange(-40., 40.5, .5)
+QUANTILES = (.25, .5, .75)
+
+
+def rank_bucket(ranks, starts=RANK_BUCKETS):
+    """'1-5', '6-12', ... '41+' label for each rank"""
+    labels = ['{}-{}'.format(start, end - 1) for start, end in zip(starts, starts[1:])]
+    labels.append('{}+'.format(starts[-1]))
+    found = np.searchsorted(starts, np.asarray(ranks), side='right') - 1
+    return np.asarray(labels, dtype=object)[np.maximum(found, 0)]
+
+
+class Cube(object):
+    """
+    Parameters
+    ----------
+    keys: pandas.DataFrame, one row per cell with a column per dimension
+    stats: dict of 'count', 'sum', 'sumsq', 'min', 'max' -> array per cell
+    hist: (n_cells, len(edges) + 1) array of counts; the first and last
+        columns are everything below / above the edges
+    edges: histogram bin edges
+    measure: name of the joined column the cube summarizes
+    """
+    def __init__(self, keys, stats, hist, edges=HIST_EDGES, measure='PTS_DIFF'):
+        self.keys = keys.reset_index(drop=True)
+        self.stats = stats
+        self.hist = hist
+        self.edges = np.asarray(edges, dtype=float)
+        self.measure = measure
+
+    def __len__(self):
+        return len(self.keys)
+
+    def save(self, path=CUBE_PATH):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        arrays = dict(('key_' + dim, np.asarray(self.keys[dim],
+                                                dtype=int if dim == 'week' else str))
+                      for dim in DIMENSIONS)
+        arrays.update(('stat_' + name, values) for name, values in self.stats.items())
+        np.savez(path, hist=self.hist, edges=self.edges,
+                 measure=np.array(self.measure), **arrays)
+        return path
+
+    @classmethod
+    def load(cls, path=CUBE_PATH):
+        with np.load(path) as arrays:
+            keys = pd.DataFrame(OrderedDict((dim, arrays['key_' + dim])
+                                            for dim in DIMENSIONS))
+            stats = dict((name[len('stat_'):], arrays[name])
+                         for name in arrays.files if name.startswith('stat_'))
+            return cls(keys, stats, arrays['hist'], arrays['edges'],
+                       str(arrays['measure']))
+
+    def mask(self, expert=None, position=None, week=None, rank=None):
+        """Cells in the slice; each filter is one value or a list of them."""
+        selected = np.ones(len(self), dtype=bool)
+        for dim, wanted in zip(DIMENSIONS, [expert, position, week, rank]):
+            if wanted is None:
+                continue
+            if isinstance(wanted, (str, int, np.integer)):
+                wanted = [wanted]
+            selected &= np.isin(self.keys[dim].values, list(wanted))
+        return selected
+
+    def query(self, by=(), quantiles=QUANTILES, **filters):
+        """
+        Error summary of a slice, rolled up to the by dimensions.
+
+        Parameters
+        ----------
+        by: list of dimensions to keep, ex. ['expert']; () rolls everything up
+        quantiles: approximate quantiles to add, from the histograms
+        filters: expert, position, week and/or rank (bucket label) to keep,
+            one value or a list each
+
+        Returns
+        -------
+        pandas.DataFrame indexed by the by dimensions with count, mean, std,
+            min, max and a column per quantile
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        selected = self.mask(**filters)
+        keys = self.keys[selected]
+        if by:
+            codes, groups = _codes(keys, by)
+        else:
+            codes, groups = np.zeros(len(keys), dtype=np.intp), None
+
+        # every group has at least one cell, so each is one run once sorted
+        order = np.argsort(codes, kind='stable')
+        starts = np.flatnonzero(np.diff(codes[order], prepend=-1))
+        def merge(values, ufunc=np.add):
+            return ufunc.reduceat(values[selected][order], starts, axis=0) \
+                if len(order) else np.zeros((0,) + values.shape[1:])
+
+        merged = dict((name, merge(self.stats[name])) for name in ('count', 'sum', 'sumsq'))
+        merged['min'] = merge(self.stats['min'], np.minimum)
+        merged['max'] = merge(self.stats['max'], np.maximum)
+        hist = merge(self.hist)
+
+        count = merged['count']
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = merged['sum'] / count
+            variance = (merged['sumsq'] - count * mean ** 2) / (count - 1)
+        result = pd.DataFrame(OrderedDict([
+            ('count', count.astype(int)),
+            ('mean', mean),
+            ('std', np.sqrt(np.maximum(variance, 0))),
+            ('min', np.where(count > 0, merged['min'], np.nan)),
+            ('max', np.where(count > 0, merged['max'], np.nan)),
+        ]), index=groups)
+        for q in quantiles:
+            result['q{:g}'.format(100 * q)] = _hist_quantile(
+                hist, self.edges, q, result['min'].values, result['max'].values)
+        return result
+
+
+def _codes(keys, by):
+    grouped = keys.groupby(by if len(by) > 1 else by[0], sort=True)
+    return grouped.ngroup().values, grouped.size().index
+
+
+def _hist_quantile(hist, edges, q, lows, highs):
+    """
+    q-th quantile of each row of hist, spreading the values in a bin
+    evenly across it. The catch-all bins are bounded by the exact min/max.
+    """
+    result = np.full(len(hist), np.nan)
+    for i, counts in enumerate(hist):
+        total = counts.sum()
+        if not total:
+            continue
+        lefts = np.concatenate([[lows[i]], edges])
+        rights = np.concatenate([edges, [highs[i]]])
+        cumulative = np.cumsum(counts)
+        target = q * total
+        found = min(np.searchsorted(cumulative, target), len(counts) - 1)
+        before = cumulative[found - 1] if found else 0
+        fraction = (target - before) / counts[found] if counts[found] else 0.
+        left, right = max(lefts[found], lows[i]), min(rights[found], highs[i])
+        result[i] = left + fraction * max(right - left, 0)
+    return result
+
+
+def build(joined, measure='PTS_DIFF', edges=HIST_EDGES, rank_buckets=RANK_BUCKETS):
+    """
+    Reduce the joined frame from compare-sites.py to a Cube.
+
+    Parameters
+    ----------
+    joined: pandas.DataFrame with EXPERT, POSITION, WEEK, POSITION_RANK
+        and the measure column
+    measure: column to summarize, ex. 'PTS_DIFF' or 'REL_DIFF'
+    """
+    values = np.asarray(joined[measure], dtype=float)
+    keep = np.isfinite(values)
+    values = values[keep]
+    frame = pd.DataFrame(OrderedDict(
+        (dim, np.asarray(joined[COLUMNS[dim]])[keep]) for dim in DIMENSIONS))
+    frame['week'] = frame['week'].astype(int)
+    frame['rank'] = rank_bucket(frame['rank'].values, rank_buckets)
+    frame['expert'] = frame['expert'].astype(str)
+    frame['position'] = frame['position'].astype(str)
+
+    grouped = frame.groupby(DIMENSIONS, sort=True)
+    codes = grouped.ngroup().values
+    keys = grouped.size().index.to_frame(index=False)
+    n_cells = len(keys)
+
+    stats = {
+        'count': np.bincount(codes, minlength=n_cells).astype(float),
+        'sum': np.bincount(codes, values, n_cells),
+        'sumsq': np.bincount(codes, values ** 2, n_cells),
+        'min': np.full(n_cells, np.inf),
+        'max': np.full(n_cells, -np.inf),
+    }
+    np.minimum.at(stats['min'], codes, values)
+    np.maximum.at(stats['max'], codes, values)
+    # bin 0 is below edges[0], bin len(edges) is at or above edges[-1]
+    bins = np.searchsorted(edges, values, side='right')
+    hist = np.bincount(codes * (len(edges) + 1) + bins,
+                       minlength=n_cells * (len(edges) + 1)).reshape(n_cells, -1)
+    return Cube(keys, stats, hist, edges, measure)
+
+
+def parse_weeks(text):
+    """'5-9' -> [5, 6, 7, 8, 9], '3' -> [3]"""
+    start, _, end = text.partition('-')
+    return list(range(int(start), int(end or start) + 1))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Query the accuracy cube.')
+    parser.add_argument('command', choices=['build', 'query'])
+    parser.add_argument('--expert', action='append')
+    parser.add_argument('--position', action='append', type=str.upper)
+    parser.add_argument('--weeks', type=parse_weeks, help='ex. 5-9 or 3')
+    parser.add_argument('--rank', action='append', help='rank bucket, ex. 1-5')
+    parser.add_argument('--by', action='append', default=[], choices=DIMENSIONS)
+    parser.add_argument('--measure', default='PTS_DIFF',
+                        help='with build, the joined column to summarize')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        import importlib
+        compare_sites = importlib.import_module('compare-sites')
+        accuracy_cube = build(compare_sites.load_joined(), args.measure)
+        print('{} cells; wrote {}'.format(len(accuracy_cube), accuracy_cube.save()))
+    else:
+        accuracy_cube = Cube.load()
+        start = time.time()
+        result = accuracy_cube.query(by=args.by, expert=args.expert,
+                                     position=args.position, week=args.weeks,
+                                     rank=args.rank)
+        print(result.to_string(float_format=lambda value: '{:.3f}'.format(value)))
+        print('{} in {:.1f}ms'.format(accuracy_cube.measure,
+                                      1000 * (time.time() - start)))
@@ -0,0 +1,340 @@
+"""
+Concurrent HTTP fetching for the scrapers.
+
+One pooled requests.Session is shared by a thread pool. A per-host limit
+caps how many requests are in flight to a site, and a token bucket keeps
+the overall request rate polite instead of sleeping between pages.
+Pages can be served from and saved to an http_cache.HTTPCache.
+
+Failed requests (connection errors, timeouts and the statuses in
+RETRY_STATUSES) are retried with jittered exponential backoff. A host
+that keeps failing trips its circuit breaker, and requests to it fail
+fast with CircuitOpen until it has had time to recover. Fetcher.metrics
+counts requests, retries and failures and keeps latencies per host.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from http_cache import CacheMiss
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlparse
+from time import sleep
+import numpy as np
+import threading
+import random
+import time
+import requests
+
+MAX_PER_HOST = 4
+REQUESTS_PER_SECOND = 5.
+# ESPN throws random 404s, so its scrapers add 404 to these (see
+# RetryPolicy); a 404 is never held against the host's breaker, though
+RETRY_STATUSES = (408, 429, 500, 502, 503, 504)
+MAX_ATTEMPTS = 4
+BACKOFF = 0.5 # seconds before the first retry, doubling after that
+MAX_BACKOFF = 30.
+BREAKER_THRESHOLD = 10 # failed requests in a row before a host's breaker opens
+BREAKER_RESET = 60. # seconds an open breaker waits before letting a request through
+# ESPN serves the desktop site to this
+USER_AGENT = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_9_4) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/38.0.2125.111 Safari/537.36'}
+
+
+class CircuitOpen(Exception):
+    """Raised instead of requesting from a host whose breaker is open."""
+
+
+class RetryPolicy(object):
+    """
+    Parameters
+    ----------
+    max_attempts: int, tries per request including the first
+    backoff: float, upper bound of the first retry's delay in seconds
+    max_backoff: float, cap on any one delay
+    statuses: HTTP statuses worth retrying
+    """
+    def __init__(self, max_attempts=MAX_ATTEMPTS, backoff=BACKOFF,
+                 max_backoff=MAX_BACKOFF, statuses=RETRY_STATUSES):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.statuses = frozenset(statuses)
+
+    def delay(self, attempt, response=None):
+        """
+        Seconds to wait before retry number attempt (1, 2, ...). "Full
+        jitter": uniform up to the exponential backoff, so many workers
+        retrying at once spread out. A Retry-After header wins.
+        """
+        retry_after = response is not None and response.headers.get('Retry-After')
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker(object):
+    """
+    Opens after threshold failures in a row; a failure is a request that
+    ran out of attempts, not each attempt. Once reset_after seconds have
+    passed, one trial request is let through (half open): success closes
+    the breaker again, failure keeps it open for another reset_after.
+    """
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset_after=BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half open' if self.trial else 'open'
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if not self.trial and time.time() - self.opened_at >= self.reset_after:
+                self.trial = True
+                return True
+            return False
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.threshold:
+                self.opened_at = time.time()
+                self.trial = False
+
+
+class Metrics(object):
+    """Thread-safe counts and latencies of the requests a Fetcher made."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.latencies = {}
+
+    def count(self, host, event):
+        with self.lock:
+            key = (host, event)
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def latency(self, host, seconds):
+        with self.lock:
+            self.latencies.setdefault(host, []).append(seconds)
+
+    def summary(self):
+        """
+        Returns
+        -------
+        dict of host -> {requests, retries, failures, ..., latency: {mean, p50, p95, max}}
+        """
+        with self.lock:
+            report = {}
+            for (host, event), n in self.counts.items():
+                report.setdefault(host, {})[event] = n
+            for host, seconds in self.latencies.items():
+                seconds = np.asarray(seconds)
+                report.setdefault(host, {})['latency'] = {
+                    'mean': seconds.mean(), 'max': seconds.max(),
+                    'p50': np.percentile(seconds, 50), 'p95': np.percentile(seconds, 95)}
+            return report
+
+    def report(self):
+        for host, stats in sorted(self.summary().items()):
+            latency = stats.get('latency')
+            counts = ', '.join('{} {}'.format(n, event) for event, n in sorted(stats.items())
+                               if event != 'latency')
+            if latency:
+                counts += '; latency mean {mean:.2f}s p50 {p50:.2f}s p95 {p95:.2f}s ' \
+                          'max {max:.2f}s'.format(**latency)
+            print('{}: {}'.format(host, counts))
+
+
+class TokenBucket(object):
+    """
+    Allows `rate` requests per second on average, with bursts of up to
+    `capacity` requests.
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1., rate))
+        self.tokens = self.capacity
+        self.updated = time.time()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        while True:
+            with self.lock:
+                now = time.time()
+                self.tokens = min(self.capacity,
+                                  self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            sleep(wait)
+
+
+class Fetcher(object):
+    """
+    Fetches pages concurrently over a pooled session.
+
+    Parameters
+    ----------
+    max_per_host: int, max requests in flight to any one host
+    rate: float, requests per second across all hosts; None for no limit
+    headers: dict, headers sent with every request
+    timeout: int, seconds to wait for a response
+    cache: http_cache.HTTPCache to serve and save pages; None to disable
+    retry: RetryPolicy; RetryPolicy(max_attempts=1) to never retry
+    breaker_threshold, breaker_reset: see CircuitBreaker
+    """
+    def __init__(self, max_per_host=MAX_PER_HOST, rate=REQUESTS_PER_SECOND,
+                 headers=None, timeout=30, cache=None, retry=None,
+                 breaker_threshold=BREAKER_THRESHOLD, breaker_reset=BREAKER_RESET):
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.cache = cache
+        self.retry = retry or RetryPolicy()
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self.breakers = {}
+        self.metrics = Metrics()
+        self.session = requests.Session()
+        if headers:
+            self.session.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=max_per_host)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.bucket = TokenBucket(rate) if rate else None
+        self.hosts = {}
+        self.lock = threading.Lock()
+
+    def _host_slot(self, host):
+        with self.lock:
+            if host not in self.hosts:
+                self.hosts[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self.hosts[host]
+
+    def breaker(self, host):
+        with self.lock:
+            if host not in self.breakers:
+                self.breakers[host] = CircuitBreaker(self.breaker_threshold,
+                                                     self.breaker_reset)
+            return self.breakers[host]
+
+    def _request(self, host, url, params=None, headers=None):
+        with self._host_slot(host):
+            if self.bucket is not None:
+                self.bucket.acquire()
+            start = time.time()
+            try:
+                return self.session.get(url, params=params, headers=headers,
+                                        timeout=self.timeout)
+            finally:
+                self.metrics.latency(host, time.time() - start)
+
+    def _fetch(self, url, params=None, headers=None):
+        """
+        Request url, retrying transient failures. Raises CircuitOpen if the
+        host's breaker is open, requests.HTTPError for a bad status, or the
+        last connection error once the attempts run out.
+        """
+        host = urlparse(url).netloc
+        breaker = self.breaker(host)
+        if not breaker.allow():
+            self.metrics.count(host, 'short circuited')
+            raise CircuitOpen('too many failures from {}; try again later'.format(host))
+        for attempt in range(1, self.retry.max_attempts + 1):
+            self.metrics.count(host, 'requests')
+            response = None
+            try:
+                response = self._request(host, url, params, headers)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.retry.max_attempts:
+                    # one failure per request, however many attempts it took
+                    breaker.failure()
+                    self.metrics.count(host, 'failures')
+                    raise
+                reason = type(e).__name__
+            else:
+                if response.status_code not in self.retry.statuses:
+                    # anything else means the host is up, even a 4xx
+                    breaker.success()
+                    response.raise_for_status()
+                    return response
+                if attempt == self.retry.max_attempts:
+                    if response.status_code == 404:
+                        # the host answered; the page just isn't there
+                        breaker.success()
+                    else:
+                        breaker.failure()
+                    self.metrics.count(host, 'failures')
+                    response.raise_for_status()
+                reason = 'HTTP {}'.format(response.status_code)
+            delay = self.retry.delay(attempt, response)
+            print('{}; retrying in {:.1f}s: {}'.format(reason, delay, url))
+            self.metrics.count(host, 'retries')
+            sleep(delay)
+
+    def get(self, url, params=None, ttl=None):
+        """
+        Fetch one page; raises requests.HTTPError on a bad status.
+        With a cache, a page younger than ttl seconds is served from disk;
+        ttl defaults to the cache's default_ttl.
+        """
+        if self.cache is None:
+            return self._fetch(url, params)
+
+        key = self.cache.key(url, params)
+        entry = self.cache.get(key)
+        if ttl is None:
+            ttl = self.cache.default_ttl
+        if entry is not None and (self.cache.offline or entry.is_fresh(ttl)):
+            return entry.response()
+        if self.cache.offline:
+            raise CacheMiss(url)
+
+        validators = entry.validators() if entry is not None else None
+        response = self._fetch(url, params, validators)
+        if response.status_code == 304:
+            self.cache.touch(key)
+            return entry.response()
+        self.cache.put(key, response)
+        return response
+
+    def get_all(self, urls, params=None, ttls=None):
+        """
+        Fetch many pages concurrently.
+
+        Parameters
+        ----------
+        urls: list of urls
+        params: optional list of query param dicts, one per url
+        ttls: optional list of cache ttls, one per url
+
+        Returns
+        -------
+        generator of responses, in the same order as urls
+        """
+        if params is None:
+            params = [None] * len(urls)
+        if ttls is None:
+            ttls = [None] * len(urls)
+        workers = max(1, self.max_per_host * max(1, len(set(
+            urlparse(url).netloc for url in urls))))
+        executor = ThreadPoolExecutor(max_workers=min(workers, len(urls) or 1))
+        try:
+            for response in executor.map(self.get, urls, params, ttls):
+                yield response
+        finally:
+            executor.shutdown(wait=True)
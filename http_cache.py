@@ -0,0 +1,158 @@
+"""
+Persistent on-disk cache for scraped pages.
+
+Responses are stored zlib-compressed in SQLite, keyed by a hash of the
+url and query params. Whether a cached page is still fresh is decided by
+the ttl the caller asks for, so completed weeks can be kept forever while
+the current week is refetched often. Stale pages with an ETag or
+Last-Modified header are revalidated with a conditional request, and the
+least recently used pages are evicted once the cache grows past its size
+limit. In offline mode every request is served from the cache.
+"""
+from requests.structures import CaseInsensitiveDict
+from urllib.parse import urlencode
+import threading
+import hashlib
+import sqlite3
+import json
+import time
+import zlib
+import os
+import requests
+
+CACHE_PATH = '.cache/http.sqlite'
+MAX_BYTES = 2 ** 29 # 512MB of compressed pages
+DEFAULT_TTL = 24 * 60 * 60 # one day
+CURRENT_WEEK_TTL = 60 * 60 # one hour
+FOREVER = float('inf')
+
+
+class CacheMiss(Exception):
+    """Raised in offline mode for a page that was never cached."""
+
+
+def week_ttl(week, current_week, ttl=CURRENT_WEEK_TTL):
+    """Completed weeks never change; the current week gets a short ttl."""
+    return FOREVER if week < current_week else ttl
+
+
+class CacheEntry(object):
+    def __init__(self, url, status, headers, encoding, body, fetched_at):
+        self.url = url
+        self.status = status
+        self.headers = CaseInsensitiveDict(headers)
+        self.encoding = encoding
+        self.body = body
+        self.fetched_at = fetched_at
+
+    def is_fresh(self, ttl):
+        return time.time() - self.fetched_at < ttl
+
+    def validators(self):
+        """Headers for a conditional request, if the site gave us any."""
+        headers = {}
+        if 'ETag' in self.headers:
+            headers['If-None-Match'] = self.headers['ETag']
+        if 'Last-Modified' in self.headers:
+            headers['If-Modified-Since'] = self.headers['Last-Modified']
+        return headers
+
+    def response(self):
+        """Rebuild a requests.Response from the cached page."""
+        response = requests.Response()
+        response.url = self.url
+        response.status_code = self.status
+        response.headers = CaseInsensitiveDict(self.headers)
+        response.encoding = self.encoding
+        response._content = self.body
+        return response
+
+
+class HTTPCache(object):
+    """
+    Parameters
+    ----------
+    path: string, SQLite file to store pages in
+    max_bytes: int, compressed size to keep the cache under
+    default_ttl: seconds a page stays fresh when the caller gives no ttl
+    offline: bool, serve everything from the cache; never hit the network
+    """
+    def __init__(self, path=CACHE_PATH, max_bytes=MAX_BYTES,
+                 default_ttl=DEFAULT_TTL, offline=False):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.offline = offline
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                url TEXT,
+                status INTEGER,
+                headers TEXT,
+                encoding TEXT,
+                body BLOB,
+                size INTEGER,
+                fetched_at REAL,
+                last_access REAL
+            )''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS lru ON responses (last_access)')
+        self.db.commit()
+
+    @staticmethod
+    def key(url, params=None):
+        if params:
+            url = '{}?{}'.format(url, urlencode(sorted(params.items())))
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Returns the CacheEntry for key, or None, and marks it as used."""
+        with self.lock:
+            row = self.db.execute(
+                'SELECT url, status, headers, encoding, body, fetched_at '
+                'FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            self.db.execute('UPDATE responses SET last_access = ? WHERE key = ?',
+                            (time.time(), key))
+            self.db.commit()
+        url, status, headers, encoding, body, fetched_at = row
+        return CacheEntry(url, status, json.loads(headers), encoding,
+                          zlib.decompress(body), fetched_at)
+
+    def touch(self, key):
+        """Mark a revalidated page as freshly fetched."""
+        with self.lock:
+            now = time.time()
+            self.db.execute('UPDATE responses SET fetched_at = ?, last_access = ? '
+                            'WHERE key = ?', (now, now, key))
+            self.db.commit()
+
+    def put(self, key, response):
+        """Store a successful response, then evict down to max_bytes."""
+        body = zlib.compress(response.content)
+        headers = json.dumps(dict(response.headers))
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, response.url, response.status_code, headers,
+                 response.encoding, sqlite3.Binary(body), len(body), now, now))
+            self._evict()
+            self.db.commit()
+
+    def _evict(self):
+        total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        stale = []
+        rows = self.db.execute('SELECT key, size FROM responses ORDER BY last_access')
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        self.db.executemany('DELETE FROM responses WHERE key = ?', stale)
@@ -1,122 +1,269 @@
 """Script to reconcile names between projections and scoring data. Not going to go crazy, but just try to fix any important stuff.
 
 """
+from mappings import NAME_CORRECTIONS
+from players import parse_player
+import argparse
+import pickle
+import heapq
 import sys
 import csv
 import os
 
-MANUAL_CORRECTIONS = {
-    'Benny Cunningham': 'Benjamin Cunningham',
-    'Cecil Shorts': 'Cecil Shorts III',
-    'Christopher Ivory': 'Chris Ivory',
-    'E.J. Manuel': 'EJ Manuel',
-    'Gator Hoskins': 'Harold Hoskins',
-    'Josh Cribbs': 'Joshua Cribbs',
-    'Matt Slater': 'Matthew Slater',
-    'Mickey Shuler': 'Mickey Charles Shuler',
-    'Robert Griffin III': 'Robert Griffin',
-    'Robert Housler': 'Rob Housler',
-    'Steve Johnson': 'Stevie Johnson',
-    'Taylor Yates': 'T.J. Yates',
-    'Timothy Wright': 'Tim Wright',
-    'Ty Hilton': 'T.Y. Hilton',
-    'Will Tukuafu': "Will Ta'ufo'ou",
-}
-
-
-def format_player(week, raw_projection_name, scoring, manual_corrections):
-    """This function manipulates names as necessary to match between
-    projection data and scoring data.
+MATCHES_FILE = 'data/projections-joined.csv'
+MISSES_FILE = 'data/projections-unmatched.csv'
+INDEX_DIR = '.cache'
+
 
+class ScoringIndex(object):
     """
-    # parse name and team from projection data
-    name = raw_projection_name.split(' (')[0].strip()
-    try:
-        team = raw_projection_name.split(' (')[1].strip(') ').lower()
-    except IndexError:  # sometimes there is no team name
-        team = None
-    else:
-        # replace different abbreviation for Washington
-        if team == 'was':
-            team = 'wsh'
+    The scoring file keyed for joining. Every (name, team) gets a player
+    number and every (player number, week) the offset of its row, packed
+    into one int, so a lookup is a single dict hit on an int. Built from
+    the CSV once and pickled; see load_or_build.
+
+    Parameters
+    ----------
+    fieldnames: the scoring file's columns
+    rows: list of tuples of values, in file order
+    fingerprint: anything identifying the file the index was built from
+    """
+    def __init__(self, fieldnames, rows, fingerprint=None):
+        self.fieldnames = fieldnames
+        self.rows = rows
+        self.fingerprint = fingerprint
+        self.players = {}
+        self.offsets = {}
+        week, name, team = [fieldnames.index(col) for col in ('week', 'name', 'team')]
+        for offset, row in enumerate(rows):
+            player = self.players.setdefault((row[name], row[team].lower()),
+                                             len(self.players))
+            key = self.key(int(row[week]), player)
+            # raise error if the key is not unique
+            if key in self.offsets:
+                raise ValueError('%s is not unique' %
+                                 str((int(row[week]), row[name], row[team].lower())))
+            self.offsets[key] = offset
+        self._reset()
+
+    def _reset(self):
+        # raw projection name -> player numbers to try; see candidates
+        self.parsed = {}
+        # each row as a dict, made the first time it's looked up
+        self.records = [None] * len(self.rows)
+
+    @staticmethod
+    def key(week, player):
+        return player << 8 | week
 
-    # if there is an exact match with scoring data, return that
-    match = scoring.get((week, name, team))
+    def candidates(self, raw_projection_name, manual_corrections=NAME_CORRECTIONS):
+        """
+        Player numbers a raw projection name could be, best first: the
+        name as parsed, then after a manual correction. Each raw name is
+        only parsed once, with the corrections it was first asked with.
+        """
+        if raw_projection_name not in self.parsed:
+            # parse name and team from projection data; team is None if missing
+            name, team = parse_player(raw_projection_name)
+            found = [self.players.get((name, team))]
+            if name in manual_corrections:
+                found.append(self.players.get((manual_corrections[name], team)))
+            self.parsed[raw_projection_name] = tuple(
+                player for player in found if player is not None)
+        return self.parsed[raw_projection_name]
 
-    # if there isn't an exact match with scoring data, but there is
-    # after a manual replacement of the player name, return that
-    if match is None and name in manual_corrections:
-        name = manual_corrections[name]
-        match = scoring.get((week, name, team))
+    def lookup(self, week, player):
+        """The scoring row of a player number in a week, or None. Don't modify it."""
+        offset = self.offsets.get(self.key(week, player))
+        return None if offset is None else self.record(offset)
 
-    return match
+    def record(self, offset):
+        record = self.records[offset]
+        if record is None:
+            record = self.records[offset] = dict(zip(self.fieldnames, self.rows[offset]))
+        return record
+
+    def match(self, week, raw_projection_name, manual_corrections=NAME_CORRECTIONS):
+        """The first candidate's scoring row in a week, or None; see candidates."""
+        players = self.parsed.get(raw_projection_name)
+        if players is None:
+            players = self.candidates(raw_projection_name, manual_corrections)
+        for player in players:
+            # key() and record() inlined; this runs once per projection row
+            offset = self.offsets.get(player << 8 | week)
+            if offset is not None:
+                return self.records[offset] or self.record(offset)
+        return None
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        # plain containers only, so the pickle loads whether this module
+        # is imported or run as a script
+        state = dict((name, getattr(self, name)) for name in
+                     ('fieldnames', 'rows', 'fingerprint', 'players', 'offsets'))
+        with open(path, 'wb') as f:
+            pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load_or_build(cls, scoring_filename, directory=INDEX_DIR):
+        """
+        Load the pickled index of the scoring file if the file hasn't
+        changed since it was built, otherwise build (and save) a new one.
+        """
+        stat = os.stat(scoring_filename)
+        fingerprint = (os.path.abspath(scoring_filename), stat.st_size, stat.st_mtime_ns)
+        path = os.path.join(directory, 'scoring-index-{}.pickle'.format(
+            os.path.splitext(os.path.basename(scoring_filename))[0]))
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                state = pickle.load(f)
+            if state['fingerprint'] == fingerprint:
+                index = cls.__new__(cls)
+                index.__dict__.update(state)
+                index._reset()
+                return index
+        index = read_scoring_data(scoring_filename, fingerprint)
+        index.save(path)
+        return index
+
+
+def format_player(week, raw_projection_name, scoring, manual_corrections=NAME_CORRECTIONS):
+    """This function manipulates names as necessary to match between
+    projection data and scoring data.
+
+    Returns the scoring row as a dict, or None. scoring is a ScoringIndex.
+    """
+    # if there is an exact match with scoring data, return that; if there
+    # isn't, but there is after a manual replacement of the player name,
+    # return that
+    return scoring.match(week, raw_projection_name, manual_corrections)
 
 
 def sorted_by_week(filename_list):
-    # sort filenames by week
+    # sort filenames by week; files holding many weeks have no week in
+    # their name and go last
     sorted_filenames = []
     for filename in filename_list:
-        basename, ext = os.path.splitext(filename)
-        label, position, week, expert = basename.split('-')
-        sorted_filenames.append((int(week), position, expert, filename))
-        sorted_filenames.sort()
+        sorted_filenames.append(parse_filename(filename) + (filename,))
+    sorted_filenames.sort(key=lambda item: (item[0] is None, item[0] or 0,
+                                            item[1] or '', item[2] or '', item[3]))
     return sorted_filenames
 
 
-def join(scoring_filename, projection_filename_list):
+def parse_filename(filename):
+    """
+    Per-partition files are named label-position-week-expert.csv. Returns
+    (week, position, expert), or Nones for files that hold many weeks,
+    like data/fantasypros-projections-44.csv, whose rows say themselves.
+    """
+    basename, ext = os.path.splitext(os.path.basename(filename))
+    try:
+        label, position, week, expert = basename.split('-')
+        return int(week), position, expert
+    except ValueError:
+        return None, None, None
 
-    # get scoring data in dictionary
-    scoring = read_scoring_data(scoring_filename)
 
-    match_list = []
-    miss_list = []
-    decorated = sorted_by_week(projection_filename_list)
-    for week, position, expert, filename in decorated:
+def read_projections(week, position, expert, filename):
+    """Yields (week, row) for every projection in a file, lazily."""
+    with open(filename) as stream:
+        for row in csv.DictReader(stream):
+            if week is None:
+                yield int(row['WEEK']), row
+                continue
+            row.setdefault('WEEK', week)
+            row.setdefault('POSITION', position.upper())
+            row.setdefault('EXPERT', expert)
+            yield week, row
+
+
+def fieldnames(filenames):
+    """Union of the headers of the given CSVs, in order of appearance."""
+    names = []
+    for filename in filenames:
         with open(filename) as stream:
-            reader = csv.DictReader(stream)
-            for row in reader:
+            header = next(csv.reader(stream), [])
+        names += [name for name in header if name not in names]
+    return names
 
-                # get formatted player name
-                player = format_player(
-                    week,
-                    row['Player'],
-                    scoring,
-                    MANUAL_CORRECTIONS,
-                )
 
-                if player is None:
-                    miss_list.append(row)
-                else:
-                    match_list.append(row)
+def join_rows(scoring, projection_filename_list):
+    """
+    Merge the projection files, each in week order, into one stream in
+    week order and look every row up in the scoring index. Only one row
+    per file is held in memory at a time. (The FantasyPros expert files
+    are sorted by position, then week, so mixing those in still joins
+    every row, just not in strict week order.)
 
-    print >> sys.stderr, '%i matches out of %i' % (len(match_list), len(match_list) + len(miss_list))
+    Yields
+    ------
+    (row, scoring_row) where scoring_row is None for misses
+    """
+    streams = [read_projections(*item) for item in sorted_by_week(projection_filename_list)]
+    for week, row in heapq.merge(*streams, key=lambda item: item[0]):
+        yield row, scoring.match(week, row['Player'])
 
 
-def read_scoring_data(scoring_filename):
-    """Get "natural keys" from scoring file."""
-    result = {}
-    with open(scoring_filename) as stream:
-        reader = csv.DictReader(stream)
-        for row in reader:
+def join(scoring_filename, projection_filename_list,
+         matches_filename=MATCHES_FILE, misses_filename=MISSES_FILE):
+    """
+    Join projections to scoring, writing matched rows (with the scoring
+    fields attached) and misses to separate CSVs as we go.
+    """
+    # get scoring data, indexed by week and player
+    scoring = ScoringIndex.load_or_build(scoring_filename)
 
-            # use combo of week, player name, team as key, and player
-            # name as value
-            key = (int(row['week']), row['name'], row['team'].lower())
-            value = row['name']
+    projection_fields = fieldnames(projection_filename_list)
+    projection_fields += [name for name in ['WEEK', 'POSITION', 'EXPERT']
+                          if name not in projection_fields]
+    scoring_fields = [name for name in fieldnames([scoring_filename])
+                      if name not in projection_fields]
 
-            # raise error if the key is not unique
-            if key in result:
-                raise ValueError('%s is not unique' % str(unique))
+    matches = misses = 0
+    with open(matches_filename, 'w') as match_stream, \
+            open(misses_filename, 'w') as miss_stream:
+        match_writer = csv.DictWriter(match_stream, projection_fields + scoring_fields,
+                                      extrasaction='ignore')
+        miss_writer = csv.DictWriter(miss_stream, projection_fields)
+        match_writer.writeheader()
+        miss_writer.writeheader()
+
+        for row, player in join_rows(scoring, projection_filename_list):
+            if player is None:
+                miss_writer.writerow(row)
+                misses += 1
             else:
-                result[key] = value
+                # projection fields win if a column name shows up in both
+                joined = dict(player)
+                joined.update(row)
+                match_writer.writerow(joined)
+                matches += 1
+
+    sys.stderr.write('%i matches out of %i\n' % (matches, matches + misses))
 
-    return result
+
+def read_scoring_data(scoring_filename, fingerprint=None):
+    """Get "natural keys" from scoring file, as a ScoringIndex."""
+    with open(scoring_filename) as stream:
+        reader = csv.reader(stream)
+        fieldnames = next(reader)
+        rows = [tuple(row) for row in reader]
+    return ScoringIndex(fieldnames, rows, fingerprint)
 
 if __name__ == '__main__':
 
     # get filenames from command line
-    scoring_filename = sys.argv[1]
-    projection_filename_list = sys.argv[2:]
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('scoring_filename')
+    parser.add_argument('projection_filename_list', nargs='+')
+    parser.add_argument('--matches', default=MATCHES_FILE,
+                        help='where to write matched rows')
+    parser.add_argument('--misses', default=MISSES_FILE,
+                        help='where to write rows with no scoring match')
+    args = parser.parse_args()
 
     # try to join scoring data and projection data
-    join(scoring_filename, projection_filename_list)
+    join(args.scoring_filename, args.projection_filename_list,
+         args.matches, args.misses)
@@ -18,6 +18,26 @@ ESPN_SCORING = {
     'fumbles_lost': -2.
 }
 
+# league rule sets we evaluate projections under; see scoring.register
+SCORING_SYSTEMS = {
+    'standard': ESPN_SCORING,
+    'half-ppr': dict(ESPN_SCORING, receptions=.5),
+    'ppr': dict(ESPN_SCORING, receptions=1.),
+}
+
+# FantasyPros stat column : ESPN stat column
+FANTASYPROS_STATS = {
+    'PASS_YDS': 'pass_yards',
+    'PASS_TD': 'pass_TD',
+    'INTS': 'interceptions',
+    'RUSH_YDS': 'rush_yards',
+    'RUSH_TD': 'rush_TD',
+    'REC': 'receptions',
+    'REC_YDS': 'receiving_yards',
+    'REC_TD': 'receiving_TD',
+    'FL': 'fumbles_lost'
+}
+
 # Top N players relevant to each position
 FANTASY_RELEVANT = {
     'QB': 20,
@@ -43,9 +63,15 @@ NAME_CORRECTIONS = {
     'Steve Johnson': 'Stevie Johnson',
     'Taylor Yates': 'T.J. Yates',
     'Timothy Wright': 'Tim Wright',
+    'Ty Hilton': 'T.Y. Hilton',
     'Will Tukuafu': "Will Ta'ufo'ou",
 }
 
+# FantasyPros team abbreviation : ESPN team abbreviation
+TEAM_CORRECTIONS = {
+    'WAS': 'Wsh',
+}
+
 COLUMN_MAPPINGS = {
     'QB': {
         'Player': 'PLAYER',
@@ -152,4 +178,32 @@ COLUMN_MAPPINGS = {
         'week': 'WEEK',
         'expert': 'EXPERT'
     }
-}
\ No newline at end of file
+}
+
+# stats on the gamelog page are position specific
+# create a mapping of player position to column headers
+HEADER_MAPPING = {
+    'QB': ['date', 'opponent', 'result', 'pass_completions', 'pass_attempts',
+            'pass_yards', 'completion_percentage', 'pass_yards_per_attempt',
+            'longest_pass', 'pass_TD', 'interceptions', 'qb_rating',
+            'passer_rating'],
+    'RB': ['date', 'opponent', 'result', 'rush_attempts', 'rush_yards',
+            'rush_yards_per_attempt', 'longest_run', 'rush_TD', 'receptions',
+            'receiving_yards', 'yards_per_reception', 'longest_reception',
+            'receiving_TDs', 'fumbles', 'fumbles_lost'],
+    'WR': ['date', 'opponent', 'result', 'receptions', 'targets',
+            'receiving_yards', 'yards_per_reception', 'longest_reception',
+            'receiving_TDs', 'rush_attempts', 'rush_yards',
+            'rush_yards_per_attempt', 'longest_run', 'rush_TD',
+            'fumbles', 'fumbles_lost'],
+    'TE': ['date', 'opponent', 'result', 'receptions', 'targets',
+            'receiving_yards', 'yards_per_reception', 'longest_reception',
+            'receiving_TDs', 'rush_attempts', 'rush_yards',
+            'rush_yards_per_attempt', 'longest_run', 'rush_TD',
+            'fumbles', 'fumbles_lost'],
+    'PK': ['date', 'opponent', 'result', '1-19', '20-29', '30-39', '40-49',
+            '50+', 'fg_totals', 'percentage', 'avg_distance',
+            'longest_made', 'extra_points_made', 'extra_point_attempts',
+            'points'],
+    'DST': [] # no such thing as "gamelogs" for DST - have to parse all stats
+}
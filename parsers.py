@@ -0,0 +1,234 @@
+"""
+Fast parsers for the scraped pages.
+
+Each ESPN player table row is read in a single pass: lxml finds the
+pncPlayerRow rows with one XPath query, every cell's text is pulled once,
+and a declarative column schema maps cell positions to output fields.
+"""
+from mappings import HEADER_MAPPING
+import pandas as pd
+import lxml.html
+
+# first player table on the page, then its player rows
+PLAYER_ROWS = ('(//table[contains(concat(" ", normalize-space(@class), " "),'
+               ' " playerTableTable ")])[1]'
+               '//tr[contains(concat(" ", normalize-space(@class), " "),'
+               ' " pncPlayerRow ")]')
+
+
+def _text(text):
+    return text.strip()
+
+def _int(text):
+    return int(text)
+
+def _completions(text):
+    return int(text.split('/')[0])
+
+def _attempts(text):
+    return int(text.split('/')[1])
+
+def _none(text):
+    return None
+
+
+# field, cell index, converter
+PROJECTION_COLUMNS = [
+    ('opponent', 1, _text),
+    ('game_result', 2, _text),
+    ('pass_completions', 3, _completions),
+    ('pass_attempts', 3, _attempts),
+    ('pass_yards', 4, _int),
+    ('pass_TD', 5, _int),
+    ('interceptions', 6, _int),
+    ('rush_attempts', 7, _int),
+    ('rush_yards', 8, _int),
+    ('rush_TD', 9, _int),
+    ('receptions', 10, _int),
+    ('receiving_yards', 11, _int),
+    ('receiving_TD', 12, _int),
+    ('projected_pts', 13, _int),
+]
+
+SCORING_COLUMNS = [
+    ('opponent', 2, _text),
+    ('game_result', 3, _text),
+    ('pass_completions', 5, _completions),
+    ('pass_attempts', 5, _attempts),
+    ('pass_yards', 6, _int),
+    ('pass_TD', 7, _int),
+    ('interceptions', 8, _int),
+    ('rush_attempts', 10, _int),
+    ('rush_yards', 11, _int),
+    ('rush_TD', 12, _int),
+    ('receptions', 14, _int),
+    ('receiving_yards', 15, _int),
+    ('receiving_TD', 16, _int),
+    ('two_pt_conversions', 19, _int),
+    ('fumbles_lost', 20, _int),
+    ('misc_TD', 21, _int),
+    ('total_pts', 23, _int),
+]
+
+# stupid players winding up on new teams midseason
+# i.e. Ben Tate played and scored points for the Browns during Week 10
+# but his new team (Minnesota) had a buy that week ...
+# so he now gets a BYE w/ his point totals
+# BYE weeks give a column colspan=2 and everything else shifts a column
+SCORING_BYE_COLUMNS = [
+    (field, index - 1 if index > 2 else index, _none if field == 'game_result' else convert)
+    for field, index, convert in SCORING_COLUMNS
+]
+
+
+def player_rows(html):
+    """Yields (player link, cell texts) for every player row on an ESPN page."""
+    doc = lxml.html.fromstring(html)
+    for row in doc.xpath(PLAYER_ROWS):
+        cells = row.findall('td')
+        link = cells[0].find('.//a') if cells else None
+        yield link, [cell.text_content() for cell in cells]
+
+
+def apply_schema(schema, texts):
+    """Map cell texts to a list of (field, value) pairs."""
+    return [(field, convert(texts[index])) for field, index, convert in schema]
+
+
+def _width(schema):
+    return max(index for _, index, _ in schema) + 1
+
+
+def parse_projections(html, week, season):
+    projections = []
+    width = _width(PROJECTION_COLUMNS)
+    for link, texts in player_rows(html):
+        if len(texts) < width: # handle players on BYE week
+            continue
+        row = [
+            ('season', int(season)),
+            ('week', int(week)),
+            ('player_id', int(link.get('playerid'))),
+            ('name', link.text_content().strip()),
+        ]
+        projections.append(dict(row + apply_schema(PROJECTION_COLUMNS, texts)))
+    return projections
+
+
+def parse_scoring(html, week, season):
+    scoring = []
+    width = _width(SCORING_COLUMNS)
+    for link, texts in player_rows(html):
+        # Dealing with special case of D/ST. Oof
+        name = link.text_content().strip()
+        if 'D/ST' in name:
+            team = 'D/ST'
+            position = 'D/ST'
+        else:
+            team, position = texts[0].split(',')[1].split()[:2]
+
+        schema = SCORING_COLUMNS if len(texts) >= width else SCORING_BYE_COLUMNS
+        row = [
+            ('season', int(season)),
+            ('week', int(week)),
+            ('player_id', int(link.get('playerid'))),
+            ('name', name),
+            ('team', team),
+            ('position', position),
+        ]
+        try:
+            scoring.append(dict(row + apply_schema(schema, texts)))
+        except ValueError:
+            # players on Bye
+            pass
+    return scoring
+
+
+def parse_dst_scoring(html, week, season):
+    dst = []
+    for link, texts in player_rows(html):
+        dst.append({
+            'season': int(season),
+            'week': int(week),
+            'player_id': int(link.get('playerid')),
+            'name': link.text_content().strip(),
+            'misc_TD': int(texts[-3].replace('--', '0')),
+            'total_pts': int(texts[-1].replace('--', '0'))
+        })
+    return dst
+
+
+def _has_class(name):
+    return 'contains(concat(" ", normalize-space(@class), " "), " {} ")'.format(name)
+
+GAMELOG_NAME = '//div[{}]/h1'.format(_has_class('mod-content'))
+GAMELOG_POSITION = '//ul[{}]/li[1]'.format(_has_class('general-info'))
+GAMELOG_ROWS = '(//table[{}])[1]/tr'.format(_has_class('tablehead'))
+
+
+def parse_gamelog(html, player_id):
+    """
+    Every game on a player's ESPN gamelog page, as dicts of the stats in
+    HEADER_MAPPING for their position. Values are left as page text.
+    """
+    tree = lxml.html.fromstring(html)
+    names, positions = tree.xpath(GAMELOG_NAME), tree.xpath(GAMELOG_POSITION)
+    if not names or not positions:
+        print('Unable to parse player {}'.format(player_id))
+        return []
+    name = names[0].text_content().strip()
+    # '#18 QB'
+    position = positions[0].text_content().split()[-1]
+    if position not in HEADER_MAPPING:
+        # ESPN is inconsistent with no-name, free agent players
+        # sorry, Michael Spurlock (10327)
+        return []
+
+    rows = tree.xpath(GAMELOG_ROWS)
+    if not rows:
+        print('No stats for player {}, {}, {}'.format(player_id, name, position))
+        return []
+    gamelogs = []
+    for row in rows[2:-1]: # don't want headers or totals
+        stats = dict(zip(HEADER_MAPPING[position],
+                         [cell.text_content().strip() for cell in row.findall('td')]))
+        stats['position'] = position
+        stats['player_id'] = player_id
+        stats['name'] = name
+        gamelogs.append(stats)
+    return gamelogs
+
+
+FANTASYPROS_HEADER = '//table[@id="data"]/thead/tr[last()]/th'
+FANTASYPROS_ROWS = '//table[@id="data"]/tbody/tr'
+
+
+def parse_fantasypros(html):
+    """
+    The #data table on a FantasyPros projections page, as read_html would
+    give it: repeated headers get .1, .2 suffixes and numeric columns are
+    converted. Only the table's own header and body rows are visited.
+    """
+    tree = lxml.html.fromstring(html)
+    headers, seen = [], {}
+    for cell in tree.xpath(FANTASYPROS_HEADER):
+        header = cell.text_content().strip()
+        headers.append(header if header not in seen else
+                       '{}.{}'.format(header, seen[header]))
+        seen[header] = seen.get(header, 0) + 1
+    rows = []
+    for row in tree.xpath(FANTASYPROS_ROWS):
+        cells = [cell.text_content().strip() for cell in row.findall('td')]
+        if len(cells) != len(headers):
+            print('Skipping FantasyPros row with {} cells for {} columns: {}'
+                  .format(len(cells), len(headers), cells))
+            continue
+        rows.append(cells)
+    df = pd.DataFrame(rows, columns=headers)
+    for col in df.columns:
+        # read_html drops thousands separators, ex. 1,024 yards
+        try:
+            df[col] = pd.to_numeric(df[col].str.replace(',', '', regex=False))
+        except (ValueError, TypeError):
+            pass
+    return df
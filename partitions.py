@@ -0,0 +1,97 @@
+"""
+Helpers for scraping incrementally.
+
+Scraped CSVs are treated as a set of partitions, ex. (season, week) for
+the ESPN files or (WEEK, POSITION) for a FantasyPros expert's file. We
+can look up which partitions a file already has, then merge freshly
+scraped partitions into it. Rows of existing partitions are copied over
+as-is, fetched partitions replace any old rows for the same key, and the
+result is written to a temp file and renamed over the original so a
+failed run never leaves a half-written CSV behind.
+"""
+from csv import DictReader, DictWriter
+import tempfile
+import os
+
+
+def _key(row, keys):
+    return tuple(str(row[k]) for k in keys)
+
+
+def _line_terminator(filename):
+    """Keep whatever line endings the file was written with."""
+    with open(filename, 'rb') as f:
+        return '\r\n' if f.readline().endswith(b'\r\n') else '\n'
+
+
+def existing_partitions(filename, keys):
+    """Returns the set of key tuples (as strings) present in a CSV."""
+    if not os.path.exists(filename):
+        return set()
+    with open(filename, newline='') as f:
+        return set(_key(row, keys) for row in DictReader(f))
+
+
+def missing(wanted, filename, keys, force=()):
+    """
+    Filter wanted partitions down to those the file doesn't have yet,
+    plus any that are forced to refresh.
+
+    Parameters
+    ----------
+    wanted: list of key tuples, ex. [(2014, 1), (2014, 2)]
+    filename: string, CSV to check
+    keys: list of column names making up a partition key
+    force: partitions to fetch again even if they exist
+    """
+    as_str = lambda p: tuple(str(k) for k in p)
+    skip = existing_partitions(filename, keys) - set(as_str(p) for p in force)
+    return [p for p in wanted if as_str(p) not in skip]
+
+
+def append_partitions(filename, rows, keys):
+    """
+    Atomically merge rows into a CSV, replacing any existing rows that
+    belong to the same partitions as the new ones.
+
+    Parameters
+    ----------
+    filename: string, CSV to update; created if it doesn't exist
+    rows: list of dicts; None values are written as empty fields
+    keys: list of column names making up a partition key
+    """
+    if not rows:
+        return
+    replaced = set(_key(row, keys) for row in rows)
+    directory = os.path.dirname(filename) or '.'
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.csv.tmp')
+    try:
+        with os.fdopen(fd, 'w', newline='') as out:
+            exists = os.path.exists(filename)
+            terminator = _line_terminator(filename) if exists else '\r\n'
+            old = open(filename, newline='') if exists else None
+            try:
+                reader = DictReader(old) if old else None
+                fieldnames = list(reader.fieldnames) if reader else []
+                for row in rows:
+                    fieldnames += [col for col in row if col not in fieldnames]
+                writer = DictWriter(out, fieldnames=fieldnames, restval='',
+                                    lineterminator=terminator)
+                writer.writeheader()
+                if reader:
+                    writer.writerows(row for row in reader
+                                     if _key(row, keys) not in replaced)
+            finally:
+                if old:
+                    old.close()
+            writer.writerows(rows)
+        os.chmod(tmp, 0o644) # mkstemp files are private by default
+        os.replace(tmp, filename)
+    except:
+        os.remove(tmp)
+        raise
+
+
+def parse_partition(spec):
+    """'3' -> ('3',), '3:73:wr' -> ('3', '73', 'wr'), for --force options."""
+    return tuple(spec.split(':'))
@@ -0,0 +1,163 @@
+"""
+A small, lazily evaluated pipeline of named stages.
+
+Each stage is a function of the stages it depends on. Asking for a stage
+runs only what it needs: results are memoized on disk under a fingerprint
+of the stage's code, its parameters, the files it reads and the
+fingerprints of its dependencies, so anything upstream that hasn't
+changed is loaded instead of recomputed. Only a stage's own source is
+part of its fingerprint, not the helpers it calls, so run with force
+after changing one of those.
+
+    pipeline = Pipeline()
+
+    @pipeline.stage(inputs=['data/scoring-espn.csv'])
+    def scoring():
+        return pd.read_csv('data/scoring-espn.csv')
+
+    @pipeline.stage(deps=['scoring'])
+    def points(scoring):
+        return scoring.total_pts.sum()
+
+    pipeline.run('points')
+"""
+from glob import glob, escape
+from profiler import count_rows
+import inspect
+import hashlib
+import pickle
+import json
+import time
+import re
+import os
+
+CACHE_DIR = '.cache/pipeline'
+
+
+class Stage(object):
+    """
+    Parameters
+    ----------
+    name: string
+    func: called with the results of deps, in order, plus params as keywords
+    deps: list of stage names
+    inputs: list of file globs the stage reads; their sizes and mtimes are
+        part of its fingerprint
+    params: dict of JSON-able keyword arguments for func
+    cache: bool, memoize the result on disk; False for stages that are
+        only run for their side effects, like writing charts
+    """
+    def __init__(self, name, func, deps=(), inputs=(), params=None, cache=True):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.inputs = list(inputs)
+        self.params = params or {}
+        self.cache = cache
+
+
+def _files_fingerprint(patterns):
+    files = []
+    for pattern in patterns:
+        for filename in sorted(glob(pattern, recursive=True)):
+            stat = os.stat(filename)
+            files.append((filename, stat.st_size, stat.st_mtime_ns))
+    return files
+
+
+class Pipeline(object):
+    def __init__(self, cache_dir=CACHE_DIR, profiler=None):
+        self.cache_dir = cache_dir
+        self.profiler = profiler
+        self.stages = {}
+        self.results = {}
+        self.fingerprints = {}
+
+    def add(self, name, func, deps=(), inputs=(), params=None, cache=True):
+        for dep in deps:
+            if dep not in self.stages:
+                raise KeyError('{} depends on unknown stage {}'.format(name, dep))
+        self.stages[name] = Stage(name, func, deps, inputs, params, cache)
+        return func
+
+    def stage(self, deps=(), inputs=(), name=None, cache=True):
+        """Decorator version of add; the stage is named after the function."""
+        def register(func):
+            return self.add(name or func.__name__, func, deps, inputs, cache=cache)
+        return register
+
+    def fingerprint(self, name):
+        """Hash of everything a stage's result depends on. Runs nothing."""
+        if name not in self.fingerprints:
+            stage = self.stages[name]
+            digest = hashlib.sha1()
+            spec = [name, inspect.getsource(stage.func), stage.params,
+                    _files_fingerprint(stage.inputs),
+                    [self.fingerprint(dep) for dep in stage.deps]]
+            digest.update(json.dumps(spec, sort_keys=True, default=str).encode('utf-8'))
+            self.fingerprints[name] = digest.hexdigest()
+        return self.fingerprints[name]
+
+    def _path(self, name):
+        safe = re.sub(r'[^\w.-]+', '-', name)
+        return os.path.join(self.cache_dir, '{}-{}.pickle'.format(
+            safe, self.fingerprint(name)[:16])), safe
+
+    def _load(self, name):
+        path, _ = self._path(name)
+        if not os.path.exists(path):
+            raise KeyError(name)
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def _save(self, name, value):
+        path, safe = self._path(name)
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        # a stage only ever needs its latest result
+        for old in glob(os.path.join(self.cache_dir, escape(safe) + '-*.pickle')):
+            if old != path and re.match(re.escape(safe) + r'-[0-9a-f]{16}\.pickle$',
+                                        os.path.basename(old)):
+                os.remove(old)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    def run(self, name, force=False):
+        """
+        Returns the result of a stage, computing it and whatever it needs
+        only if there's no result for the current fingerprint yet.
+
+        Parameters
+        ----------
+        name: string, stage to run
+        force: bool, recompute the stage and everything upstream of it
+        """
+        if name in self.results:
+            return self.results[name]
+        stage = self.stages[name]
+        if stage.cache and not force:
+            try:
+                self.results[name] = self._load(name)
+                print('{}: cached'.format(name))
+                return self.results[name]
+            except KeyError:
+                pass
+        args = [self.run(dep, force) for dep in stage.deps]
+        start = time.time()
+        if self.profiler is None:
+            value = stage.func(*args, **stage.params)
+        else:
+            with self.profiler.stage(name) as record:
+                value = stage.func(*args, **stage.params)
+                record.rows = count_rows(value)
+        print('{}: ran in {:.2f}s'.format(name, time.time() - start))
+        if stage.cache:
+            self._save(name, value)
+        self.results[name] = value
+        return value
+
+    def run_all(self, names, force=False):
+        return [self.run(name, force) for name in names]
+
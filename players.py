@@ -0,0 +1,151 @@
+"""
+Player identity resolution.
+
+FantasyPros gives us raw strings like "Robert Griffin III (WAS)" while
+ESPN's scoring data has a player_id, name and team. PlayerIndex maps raw
+strings to ESPN player_ids:
+
+    1. exact hit on (normalized name, team)
+    2. the normalized name alone, if only one ESPN player has it
+    3. a fuzzy match among ESPN players on the same team and position
+
+Every distinct raw string is parsed and resolved once, so the work scales
+with the number of unique players, not rows. The index and everything it
+has resolved are pickled between runs.
+"""
+from mappings import NAME_CORRECTIONS, TEAM_CORRECTIONS
+from collections import defaultdict
+from difflib import get_close_matches
+import pandas as pd
+import pickle
+import os
+
+INDEX_PATH = '.cache/player-index.pickle'
+FUZZY_CUTOFF = 0.85
+
+_names = {}
+_players = {}
+
+
+def normalize_name(name):
+    """'E.J. Manuel' -> 'ej manuel', applying NAME_CORRECTIONS first."""
+    if name not in _names:
+        clean = NAME_CORRECTIONS.get(name.strip(), name).strip()
+        _names[name] = ''.join(char for char in clean if char not in '.,').strip().lower()
+    return _names[name]
+
+
+def normalize_team(team):
+    """'WAS' -> 'wsh', 'Den' -> 'den'"""
+    if not team:
+        return None
+    team = team.strip()
+    return TEAM_CORRECTIONS.get(team.upper(), team).lower()
+
+
+def parse_player(raw):
+    """
+    FantasyPros names have team names and other junk in them.
+    'Robert Griffin III (WAS)' -> ('Robert Griffin III', 'wsh')
+    """
+    if raw not in _players:
+        parts = raw.split(' (')
+        team = parts[1].strip(') ') if len(parts) > 1 else None
+        _players[raw] = (parts[0].strip(), normalize_team(team))
+    return _players[raw]
+
+
+class PlayerIndex(object):
+    """
+    Hash indexes from normalized names to ESPN player_ids.
+
+    Parameters
+    ----------
+    scoring: pandas.DataFrame with player_id, name, team, position columns
+    fingerprint: anything identifying the data the index was built from
+    """
+    def __init__(self, scoring, fingerprint=None):
+        self.fingerprint = fingerprint
+        self.exact = {}
+        by_name = defaultdict(set)
+        self.blocks = defaultdict(dict)
+        players = scoring[['player_id', 'name', 'team', 'position']].drop_duplicates()
+        for player_id, name, team, position in players.itertuples(index=False):
+            name, team = normalize_name(name), normalize_team(team)
+            self.exact[(name, team)] = player_id
+            by_name[name].add(player_id)
+            self.blocks[(team, position)][name] = player_id
+        self.by_name = dict((name, ids.pop()) for name, ids in by_name.items()
+                            if len(ids) == 1)
+        self.resolved = {}
+
+    def resolve(self, raw, position=None):
+        """Returns the ESPN player_id for a raw FantasyPros name, or None."""
+        key = (raw, position)
+        if key not in self.resolved:
+            name, team = parse_player(raw)
+            name = normalize_name(name)
+            player_id = self.exact.get((name, team))
+            if player_id is None:
+                player_id = self.by_name.get(name)
+            if player_id is None:
+                block = self.blocks.get((team, position), {})
+                match = get_close_matches(name, list(block), n=1, cutoff=FUZZY_CUTOFF)
+                player_id = block[match[0]] if match else None
+            self.resolved[key] = player_id
+        return self.resolved[key]
+
+    def resolve_many(self, raw_names, positions):
+        """
+        Resolve a column of raw names; each distinct (name, position) pair
+        is only resolved once.
+
+        Returns
+        -------
+        pandas.Series of player_ids (NaN where unresolved), aligned with raw_names
+        """
+        pairs = pd.DataFrame({'raw': pd.Series(raw_names).astype(object).values,
+                              'position': pd.Series(positions).astype(object).values})
+        unique = pairs.drop_duplicates()
+        ids = [self.resolve(raw, position) if isinstance(raw, str) else None
+               for raw, position in unique.itertuples(index=False)]
+        unique = unique.assign(player_id=pd.array(ids, dtype='Int64'))
+        merged = pairs.merge(unique, on=['raw', 'position'], how='left')
+        return pd.Series(merged.player_id.values, index=getattr(raw_names, 'index', None))
+
+    def save(self, path=INDEX_PATH):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(path, 'wb') as f:
+            pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load_or_build(cls, scoring, path=INDEX_PATH):
+        """
+        Load the pickled index if it was built from the same players,
+        corrections and fuzzy cutoff, otherwise build (and save) a new one.
+        """
+        players = scoring[['player_id', 'name', 'team', 'position']].astype(object)
+        # resolved matches also depend on the corrections and the cutoff, so
+        # editing a correction has to invalidate them
+        fingerprint = (int(pd.util.hash_pandas_object(players, index=False).sum()),
+                       sorted(NAME_CORRECTIONS.items()), sorted(TEAM_CORRECTIONS.items()),
+                       FUZZY_CUTOFF)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                index = pickle.load(f)
+            if index.fingerprint == fingerprint:
+                return index
+        index = cls(scoring, fingerprint)
+        index.save(path)
+        return index
+
+
+def split_names(raw_names):
+    """Parse a column of raw names into (normalized names, teams) Series."""
+    raw = pd.Series(raw_names).astype(object)
+    unique = raw.dropna().unique()
+    names = dict((r, normalize_name(parse_player(r)[0])) for r in unique)
+    teams = dict((r, parse_player(r)[1]) for r in unique)
+    return raw.map(names), raw.map(teams)
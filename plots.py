@@ -1,22 +1,14 @@
-import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.ticker import MaxNLocator
-import seaborn as sns
+import argparse
+import confidence
 import json
-sns.set(style='white', palette='muted')
-
-def ranker(df):
-    """Used for getting the top N players at a given position and week"""
-    df.sort('projected_pts', inplace=True, ascending=False)
-    df['position_rank'] = np.arange(len(df)) + 1
-    return df
-
-def bootstrap(data, statfunction=np.mean):
-    """Returns a Series of 10,000 boostrapped values with the given statfunction applied"""
-    np.random.seed(42)
-    samples = pd.DataFrame(np.random.choice(data, size=(10000, len(data)), replace=True))
-    return samples.apply(statfunction, axis=1)
+import os
+import profiler
+import storage
+from bootstrap import bootstrap, bootstrap_segments, summarize_segments
+from pipeline import Pipeline
+from ranking import rank, top_n
+from render import Chart, render_all
 
 def run_player_bootstraps(df):
     """
@@ -25,29 +17,24 @@ def run_player_bootstraps(df):
     -------
     {
         Peyton Manning: {
-            points: { mean: [], median: [] },
-            relative: { mean: [], median: [] }
-        }, 
+            points: { mean: array, median: array },
+            relative: { mean: array, median: array }
+        },
         Matt Forte: {
-            points: { mean: [], median: [] },
-            relative: { mean: [], median: [] }
+            points: { mean: array, median: array },
+            relative: { mean: array, median: array }
         } ...
     }
     """
     players = {}
-    for player in df.name.unique().tolist():
-        print('Bootstrapping for {}'.format(player))
-        cond = df.name == player
-        players[player] = {
-            'points': {
-                'mean': bootstrap(df[cond].point_diff).tolist(),
-                'median': bootstrap(df[cond].point_diff, np.median).tolist()
-            },
-            'relative': {
-                'mean': bootstrap(df[cond].relative_diff).tolist(),
-                'median': bootstrap(df[cond].relative_diff, np.median).tolist()
+    for column, label in [('point_diff', 'points'), ('relative_diff', 'relative')]:
+        print('Bootstrapping {} for all players'.format(column))
+        names, booted = bootstrap_segments(df[column], df.name)
+        for i, player in enumerate(names):
+            players.setdefault(player, {})[label] = {
+                'mean': booted['mean'][:, i],
+                'median': booted['median'][:, i]
             }
-        }
     return players
 
 def run_weekly_bootstraps(df):
@@ -57,12 +44,12 @@ def run_weekly_bootstraps(df):
     -------
     {
         1: {
-            points: { mean: [], median: [] },
-            relative: { mean: [], median: [] }
-        }, 
+            points: { mean: array, median: array },
+            relative: { mean: array, median: array }
+        },
         2: {
-            points: { mean: [], median: [] },
-            relative: { mean: [], median: [] }
+            points: { mean: array, median: array },
+            relative: { mean: array, median: array }
         } ...
     }
     """
@@ -71,85 +58,57 @@ def run_weekly_bootstraps(df):
         cond = df.week == i
         weeks[i] = {
             'points': {
-                'mean': bootstrap(df[cond].point_diff).tolist(),
-                'median': bootstrap(df[cond].point_diff, np.median).tolist()
+                'mean': bootstrap(df[cond].point_diff).values,
+                'median': bootstrap(df[cond].point_diff, np.median).values
             },
             'relative': {
-                'mean': bootstrap(df[cond].relative_diff).tolist(),
-                'median': bootstrap(df[cond].relative_diff, np.median).tolist()
+                'mean': bootstrap(df[cond].relative_diff).values,
+                'median': bootstrap(df[cond].relative_diff, np.median).values
             }
         }
     return weeks
 
 def get_ci(data, alpha=0.05):
-    """Return confidence intervals"""
-    alpha = alpha * 100 # np.percentile wants ints between 0, 100; not floats
-    lower, upper = (alpha/2), 100 - (alpha/2)
-    return np.percentile(data, [lower, upper])
-
-def histogram(data, filename, small=False, title='', titlesize=22, bins=25, figsize=(13,5), xlim=None, xlabel='', xsize=22, ylabel=''):
-    fig = plt.figure(figsize=figsize)
-    axes = fig.add_subplot(111)
-    [item.set_fontsize(xsize) for item in axes.get_xticklabels()]
-    axes.xaxis.set_major_locator(MaxNLocator(symmetric=True))
-    axes.locator_params(nbins=7)
-    if small:
-        axes.locator_params(nbins=5)
-    plt.title(title, fontdict={'fontsize': titlesize})
-    r = sns.distplot(data, color='#ff6000', bins=bins, kde=False)
-    r.set_xlabel(xlabel)
-    r.set_ylabel(ylabel)
-    r.set_xlim(xlim)
-    r.set_yticklabels('')
-    r.axvline(x=0, ls=':', color='k', linewidth=1.5)
-    r.spines['top'].set_visible(False)
-    r.spines['left'].set_visible(False)
-    r.spines['right'].set_visible(False)
-    plt.savefig(filename, bbox_inches='tight')
-
-def boxplots(data, filename, title='', xlabel='', ylabel='', xlim=(-5,5), order=None):
-    boxes = 1
-    if not isinstance(data, list):
-        boxes = len(data.keys())
-
-    plt.figure(figsize=(13, 6))
-    plt.title(title, fontdict={'fontsize': 13})
-    b = sns.boxplot(data, vert=False, linewidth=1, fliersize=0,
-                    order=order, widths=[.3] * boxes)
-    b.set_xlabel(xlabel)
-    b.set_ylabel(ylabel)
-    b.set_xlim(xlim)
-    # b.set_xticks(xticks)
-    b.vlines(0, 0, boxes + 1, linestyles=':', color='r', linewidth=.7)
-    b.spines['top'].set_visible(False)
-    b.spines['left'].set_visible(False)
-    b.spines['right'].set_visible(False)
-    plt.savefig(filename)
+    """Return confidence intervals from bootstrapped values"""
+    ci = confidence.percentile_interval(data, alpha)
+    return np.array([ci.lower, ci.upper])
 
 def get_datatables_input(df):
     """Prepping data so we can write to a file and use in datatables.js."""
-    # This is horrible. I deserve it. It's my own fault.
+    # sort by week so the last row for each player has their most recent team
+    df = df.sort_values('week', kind='mergesort')
+    print('Bootstrapping mean errors for all players')
+    # only the mean and CI of each player are kept. These numbers are
+    # published, so the percentiles are exact rather than from the sketch
+    players, abs_sims = summarize_segments(df.point_diff, df.name, stats=('mean',),
+                                           percentiles=[2.5, 97.5], exact=True)
+    _, rel_sims = summarize_segments(df.relative_diff, df.name, stats=('mean',),
+                                     percentiles=[2.5, 97.5], exact=True)
+    abs_lower, abs_upper = abs_sims['mean'].quantiles()
+    rel_lower, rel_upper = rel_sims['mean'].quantiles()
+    abs_mean = abs_sims['mean'].mean
+    rel_mean = rel_sims['mean'].mean
+
+    grouped = df.groupby('name', sort=False)
+    positions = grouped.position.first()
+    teams = grouped.team.last()
+    avg_points = grouped.total_pts.mean()
+    total_points = grouped.total_pts.sum()
+
     data = []
-    players = df.name.unique().tolist()
     for i, player in enumerate(players):
-        print('Running for {} ({} of {})'.format(player, i + 1, len(players)))
-        cond = df.name == player
-        pos = df[cond].position[0]
-        team = df[cond].team[ len(df[cond]) - 1 ] # most recent team
-        abs_sims = bootstrap(df[cond].point_diff)
-        rel_sims = bootstrap(df[cond].relative_diff)        
         data.append({
             'name': player,
-            'position': pos,
-            'team': team,
-            'avg_points': round(df[cond].total_pts.mean(), 3),
-            'total_points': df[cond].total_pts.sum(),
-            'abs_lower_95': round(np.percentile(abs_sims, 2.5), 3),
-            'abs_mean_error': round(np.mean(abs_sims), 3),
-            'abs_upper_95': round(np.percentile(abs_sims, 97.5), 3),
-            'rel_lower_95': round(np.percentile(rel_sims, 2.5), 3),
-            'rel_mean_error': round(np.mean(rel_sims), 3),
-            'rel_upper_95': round(np.percentile(rel_sims, 97.5), 3)
+            'position': positions[player],
+            'team': teams[player],
+            'avg_points': round(avg_points[player], 3),
+            'total_points': total_points[player],
+            'abs_lower_95': round(abs_lower[i], 3),
+            'abs_mean_error': round(abs_mean[i], 3),
+            'abs_upper_95': round(abs_upper[i], 3),
+            'rel_lower_95': round(rel_lower[i], 3),
+            'rel_mean_error': round(rel_mean[i], 3),
+            'rel_upper_95': round(rel_upper[i], 3)
         })
     return data
 
@@ -157,155 +116,155 @@ def write_datatables_input(data):
     with open('visualization/data.json', 'w') as f:
         json.dump({'data': data}, f, indent=2, separators=(',', ': '))
 
-projections = pd.read_csv('data/projections-espn.csv', index_col=['player_id', 'name', 'season', 'week'])
-scoring = pd.read_csv('data/scoring-espn.csv', index_col=['player_id', 'name', 'season', 'week'])
+# the analysis, as a pipeline of stages
+# ======================================
+INDEX = ['player_id', 'name', 'season', 'week']
+STATISTICS = {'mean': np.mean, 'median': np.median}
+
+pipeline = Pipeline(profiler=profiler.PROFILER)
+
+@pipeline.stage(inputs=storage.patterns('espn-projections'))
+def projections():
+    return storage.load('espn-projections').set_index(INDEX)
+
+@pipeline.stage(inputs=storage.patterns('espn-scoring'))
+def scoring():
+    return storage.load('espn-scoring').set_index(INDEX)
+
+@pipeline.stage(deps=['projections', 'scoring'])
+def espn(projections, scoring):
+    espn = scoring.join(projections.query('projected_pts > 0').projected_pts, how='right')
+    espn['point_diff'] = (espn.projected_pts - espn.total_pts)
+    espn['relative_diff'] = espn.point_diff / espn.projected_pts
+    return espn.reset_index()
+
+@pipeline.stage(deps=['espn'])
+def ranked(espn):
+    return rank(espn, ['position', 'week'], 'projected_pts')
+
+@pipeline.stage(deps=['ranked'])
+def fantasy_relevant(ranked):
+    """only fantasy relevant players; top N at each position"""
+    return top_n(ranked)
 
-espn = scoring.join(projections.query('projected_pts > 0').projected_pts, how='right')
-espn['point_diff'] = (espn.projected_pts - espn.total_pts)
-espn['relative_diff'] = espn.point_diff / espn.projected_pts
-espn.reset_index(inplace=True)
-ranked = espn.groupby(['position', 'week']).apply(ranker)
+@pipeline.stage(deps=['fantasy_relevant'])
+def position_bootstraps(fantasy_relevant):
+    booted_positions = {
+        'points': {'mean': {}, 'median': {}},
+        'relative': {'mean': {}, 'median': {}}
+    }
+    for pos, players in fantasy_relevant.groupby('position', observed=True):
+        for column, label in [('point_diff', 'points'), ('relative_diff', 'relative')]:
+            for statistic, statfunction in STATISTICS.items():
+                booted_positions[label][statistic][pos] = bootstrap(
+                    players[column], statfunction=statfunction)
+    return booted_positions
+
+def bootstrap_column(df, column, statistic):
+    return bootstrap(df[column], statfunction=STATISTICS[statistic])
+
+# stage name, data stage, column, statistic
+BOOTSTRAPS = [
+    ('bootstrap-all-point-diff-mean', 'espn', 'point_diff', 'mean'),
+    ('bootstrap-ffb-point-diff-mean', 'fantasy_relevant', 'point_diff', 'mean'),
+    ('bootstrap-ffb-relative-diff-mean', 'fantasy_relevant', 'relative_diff', 'mean'),
+    ('bootstrap-ffb-relative-diff-median', 'fantasy_relevant', 'relative_diff', 'median'),
+]
+for name, data, column, statistic in BOOTSTRAPS:
+    pipeline.add(name, bootstrap_column, [data],
+                 params={'column': column, 'statistic': statistic})
 
-# # only fantasy relevant players
-frames = []
-relevant = {'QB': 20, 'RB': 60, 'WR': 60, 'TE': 20, 'K': 15, 'D/ST': 15}
-booted_positions = {
-    'points': {'mean': {}, 'median': {}},
-    'relative': {'mean': {}, 'median': {}}
-}
-for pos, n in relevant.iteritems():
-    condition = (ranked.position == pos) & (ranked.position_rank <= n)
-    frames.append(ranked[condition])
-    booted_positions['points']['mean'][pos] = bootstrap(ranked[condition]['point_diff'], statfunction=np.mean)
-    booted_positions['points']['median'][pos] = bootstrap(ranked[condition]['point_diff'], statfunction=np.median)
-    booted_positions['relative']['mean'][pos] = bootstrap(ranked[condition]['relative_diff'], statfunction=np.mean)
-    booted_positions['relative']['median'][pos] = bootstrap(ranked[condition]['relative_diff'], statfunction=np.median)
-fantasy_relevant = pd.concat(frames)
+@pipeline.stage(deps=['espn', 'fantasy_relevant'], cache=False)
+def summary(espn, fantasy_relevant):
+    print('Total FFB Relevant Obs: {}'.format(len(fantasy_relevant)))
+    print('FFB Obs > 0: {}'.format(len(fantasy_relevant.query('relative_diff > 0'))))
+    print('FFB Obs >= 25%: {}'.format(len(fantasy_relevant.query('relative_diff >= .25'))))
+    # closed form t intervals; the bootstraps are only needed for the charts
+    for label, df in [('All', espn), ('FFB', fantasy_relevant)]:
+        ci = confidence.t_interval(df.point_diff)
+        print('{} - Mean Absolute Error CI:'.format(label),
+              np.round([ci.lower, ci.estimate, ci.upper], 4))
 
 
 # plots, plots, plots, plots plots plots
 # ======================================
+SMALL = {'figsize': (10, 5), 'titlesize': 26, 'xsize': 26, 'small': True}
+SMALLER = {'figsize': (10, 5), 'titlesize': 30, 'xsize': 30, 'small': True}
+
+# data stage, column (None for bootstraps), chart options
+CHARTS = [
+    # absolute error histograms
+    ('espn', 'point_diff', dict(
+        filename='charts/histogram-absolute-error-all-players.png',
+        title='Absolute Error - All Players')),
+    ('fantasy_relevant', 'point_diff', dict(SMALL,
+        filename='charts/histogram-absolute-error-ffb-relevant-small.png',
+        title='Absolute Error - FFB Relevant')),
+    # relative error histograms
+    ('fantasy_relevant', 'relative_diff', dict(SMALL,
+        filename='charts/histogram-relative-error-ffb-relevant-small.png',
+        title='Relative Error - FFB Relevant', bins=50, xlim=(-10, 10))),
+    ('fantasy_relevant', 'relative_diff', dict(SMALLER,
+        filename='charts/histogram-relative-error-ffb-relevant-smaller.png',
+        title='Relative Error - FFB Relevant', bins=50, xlim=(-10, 10))),
+    # bootstrapped mean absolute error histograms
+    ('bootstrap-all-point-diff-mean', None, dict(
+        filename='charts/histogram-mean-absolute-error-all-players.png',
+        title='Mean Absolute Error - All Players', bins=50)),
+    ('bootstrap-ffb-point-diff-mean', None, dict(SMALL,
+        filename='charts/histogram-mean-absolute-error-ffb-relevant-small.png',
+        title='Mean Absolute Error - FFB Relevant', bins=25)),
+    # bootstrapped mean relative error histograms
+    ('bootstrap-ffb-relative-diff-mean', None, dict(SMALL,
+        filename='charts/histogram-mean-relative-error-ffb-relevant-small.png',
+        title='Mean Relative Error - FFB Relevant')),
+    ('bootstrap-ffb-relative-diff-mean', None, dict(SMALLER,
+        filename='charts/histogram-mean-relative-error-ffb-relevant-smaller.png',
+        title='Mean Relative Error - FFB Relevant')),
+    # bootstrapped median relative error histograms
+    ('bootstrap-ffb-relative-diff-median', None, dict(SMALL,
+        filename='charts/histogram-median-relative-error-ffb-relevant-small.png',
+        title='Median Relative Error - FFB Relevant', bins=10)),
+    ('bootstrap-ffb-relative-diff-median', None, dict(SMALLER,
+        filename='charts/histogram-median-relative-error-ffb-relevant-smaller.png',
+        title='Median Relative Error - FFB Relevant', bins=10)),
+]
+
+def histogram_chart(data, filename, column=None, **options):
+    if column is not None:
+        data = data[column]
+    return Chart('histogram', filename, data, **options)
+
+# every chart is a stage named after its file
+for data, column, options in CHARTS:
+    name = os.path.splitext(os.path.basename(options['filename']))[0]
+    pipeline.add(name, histogram_chart, [data], params=dict(options, column=column))
 
-# absolute error histograms
-# -------------------------------------------
-# all players
-histogram(
-    data=espn.point_diff,
-    filename='charts/histogram-absolute-error-all-players.png',
-    title='Absolute Error - All Players'
-)
-# FFB relevant players
-histogram(
-    data=fantasy_relevant.point_diff,
-    filename='charts/histogram-absolute-error-ffb-relevant-small.png',
-    title='Absolute Error - FFB Relevant',
-    figsize=(10,5),
-    titlesize=26,
-    xsize=26,
-    small=True
-)
-# -------------------------------------------
+CHART_STAGES = [name for name in pipeline.stages if name.startswith('histogram-')]
 
-# relative error histograms
-# -------------------------------------------
-# FFB relevant players
-print('Total FFB Relevant Obs: {}'.format(len(fantasy_relevant)))
-print('FFB Obs > 0: {}'.format(len(fantasy_relevant.query('relative_diff > 0'))))
-print('FFB Obs >= 25%: {}'.format(len(fantasy_relevant.query('relative_diff >= .25'))))
-histogram(
-    data=fantasy_relevant.relative_diff,
-    filename='charts/histogram-relative-error-ffb-relevant-small.png',
-    title='Relative Error - FFB Relevant',
-    bins=50,
-    xlim=(-10,10),
-    figsize=(10,5),
-    titlesize=26,
-    xsize=26,
-    small=True
-)
-histogram(
-    data=fantasy_relevant.relative_diff,
-    filename='charts/histogram-relative-error-ffb-relevant-smaller.png',
-    title='Relative Error - FFB Relevant',
-    bins=50,
-    xlim=(-10,10),
-    figsize=(10,5),
-    titlesize=30,
-    xsize=30,
-    small=True
-)
-# -------------------------------------------
+@pipeline.stage(deps=CHART_STAGES, cache=False)
+def charts(*charts):
+    render_all(list(charts))
 
-bs_all = bootstrap(espn.point_diff, statfunction=np.mean)
-bs_ffb = bootstrap(fantasy_relevant.point_diff, statfunction=np.mean)
-print('All - Mean Absolute Error CI:', np.percentile(bs_all, q=[2.5, 50, 97.5]))
-print('FFB - Mean Absolute Error CI:', np.percentile(bs_ffb, q=[2.5, 50, 97.5]))
-# bootstrapped mean absolute error histograms
-# -------------------------------------------
-# all players
-histogram(
-    data=bootstrap(espn.point_diff, statfunction=np.mean),
-    filename='charts/histogram-mean-absolute-error-all-players.png',
-    title='Mean Absolute Error - All Players',
-    bins=50
-)
-# FFB relevant
-histogram(
-    data=bootstrap(fantasy_relevant.point_diff, statfunction=np.mean),
-    filename='charts/histogram-mean-absolute-error-ffb-relevant-small.png',
-    title='Mean Absolute Error - FFB Relevant',
-    bins=25,
-    figsize=(10,5),
-    titlesize=26,
-    xsize=26,
-    small=True
-)
-# -------------------------------------------
 
-# bootstrapped mean relative error histograms
-# -------------------------------------------
-# FFB relevant
-histogram(
-    data=bootstrap(fantasy_relevant.relative_diff, statfunction=np.mean),
-    filename='charts/histogram-mean-relative-error-ffb-relevant-small.png',
-    title='Mean Relative Error - FFB Relevant',
-    figsize=(10,5),
-    titlesize=26,
-    xsize=26,
-    small=True
-)
-histogram(
-    data=bootstrap(fantasy_relevant.relative_diff, statfunction=np.mean),
-    filename='charts/histogram-mean-relative-error-ffb-relevant-smaller.png',
-    title='Mean Relative Error - FFB Relevant',
-    figsize=(10,5),
-    titlesize=30,
-    xsize=30,
-    small=True
-)
-# -------------------------------------------
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='How accurate are ESPN\'s projections?')
+    parser.add_argument('targets', nargs='*', default=['summary', 'charts'],
+                        help='stages to run, ex. histogram-absolute-error-all-players')
+    parser.add_argument('--list', action='store_true', help='list the stages')
+    parser.add_argument('--force', action='store_true',
+                        help='recompute everything the targets need')
+    profiler.add_arguments(parser)
+    args = parser.parse_args()
+    profiler.configure(args)
 
-# bootstrapped median relative error histograms
-# -------------------------------------------
-# FFB relevant
-histogram(
-    data=bootstrap(fantasy_relevant.relative_diff, statfunction=np.median),
-    filename='charts/histogram-median-relative-error-ffb-relevant-small.png',
-    title='Median Relative Error - FFB Relevant',
-    bins=10,
-    figsize=(10,5),
-    titlesize=26,
-    xsize=26,
-    small=True
-)
-histogram(
-    data=bootstrap(fantasy_relevant.relative_diff, statfunction=np.median),
-    filename='charts/histogram-median-relative-error-ffb-relevant-smaller.png',
-    title='Median Relative Error - FFB Relevant',
-    bins=10,
-    figsize=(10,5),
-    titlesize=30,
-    xsize=30,
-    small=True
-)
-# -------------------------------------------
\ No newline at end of file
+    if args.list:
+        print('\n'.join(sorted(pipeline.stages)))
+    else:
+        results = pipeline.run_all(args.targets, force=args.force)
+        # charts asked for by name
+        requested = [result for result in results if isinstance(result, Chart)]
+        if requested:
+            with profiler.stage('render', rows=len(requested)):
+                render_all(requested, force=args.force)
+        profiler.finish(args)
@@ -0,0 +1,240 @@
+"""
+Lightweight timing and memory instrumentation for the scripts.
+
+Wrap a stage in a context manager (or decorate a function) and its wall
+time, CPU time, peak RSS (its own, and its largest finished child
+process's, for stages that fan out to workers) and row count are
+recorded:
+
+    with profiler.stage('read scoring') as s:
+        scoring = read_scoring()
+        s.rows = len(scoring)
+
+Repeated stages, like parsing one page after another, are added up.
+Stages can nest; a stage's self time leaves out the stages run inside
+it, so the self times add up to the run's total without counting
+anything twice. At the end of a run, summary() prints a table and
+write() saves a JSON or CSV report. A stage can also be run under
+cProfile or tracemalloc by naming it with --cprofile / --tracemalloc
+(see add_arguments); the profile is saved under .cache/profiles/ and
+its top entries printed.
+"""
+from contextlib import contextmanager
+from functools import wraps
+from collections import OrderedDict
+import tracemalloc
+import threading
+import cProfile
+import pstats
+import time
+import json
+import csv
+import sys
+import os
+
+try:
+    import resource
+except ImportError: # windows
+    resource = None
+
+PROFILE_DIR = '.cache/profiles'
+FIELDS = ['stage', 'calls', 'wall_s', 'self_s', 'cpu_s', 'peak_rss_mb', 'rss_growth_mb',
+          'children_peak_rss_mb', 'rows']
+
+
+def peak_rss_mb(children=False):
+    """
+    Peak resident memory of this process so far, or None where unknown.
+    With children=True, the peak of the largest child process that has
+    finished, ex. a bootstrap worker; 0 if none has.
+    """
+    if resource is None:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    # kilobytes on linux, bytes on mac
+    return peak / (1024. * 1024) if sys.platform == 'darwin' else peak / 1024.
+
+
+def count_rows(value):
+    """len() of a frame, array, list or dict result; None for anything else."""
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+class StageRecord(object):
+    """What one run of a stage cost. Set rows inside the with block."""
+    def __init__(self, name):
+        self.name = name
+        self.rows = None
+        self.wall = self.cpu = 0.
+        # wall time of the stages run inside this one, in the same thread
+        self.nested = 0.
+        self.peak_rss = self.rss_growth = self.children_peak_rss = None
+
+
+class Profiler(object):
+    """
+    Parameters
+    ----------
+    cprofile: names of stages to run under cProfile
+    traced: names of stages to trace allocations in with tracemalloc
+    profile_dir: where cProfile stats are saved
+    """
+    def __init__(self, cprofile=(), traced=(), profile_dir=PROFILE_DIR):
+        self.cprofile = set(cprofile)
+        self.traced = set(traced)
+        self.profile_dir = profile_dir
+        self.records = []
+        # stages open in each thread, innermost last
+        self.local = threading.local()
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        record = StageRecord(name)
+        record.rows = rows
+        self.records.append(record)
+        stack = self.local.__dict__.setdefault('stack', [])
+        parent = stack[-1] if stack else None
+        stack.append(record)
+        profile = cProfile.Profile() if name in self.cprofile else None
+        trace = name in self.traced and not tracemalloc.is_tracing()
+        if trace:
+            tracemalloc.start()
+        rss = peak_rss_mb()
+        wall, cpu = time.perf_counter(), time.process_time()
+        if profile:
+            profile.enable()
+        try:
+            yield record
+        finally:
+            if profile:
+                profile.disable()
+            record.wall = time.perf_counter() - wall
+            record.cpu = time.process_time() - cpu
+            stack.pop()
+            if parent is not None:
+                parent.nested += record.wall
+            record.peak_rss = peak_rss_mb()
+            record.children_peak_rss = peak_rss_mb(children=True)
+            if rss is not None:
+                record.rss_growth = record.peak_rss - rss
+            if profile:
+                self._dump_profile(name, profile)
+            if trace:
+                self._dump_trace(name)
+
+    def timed(self, name=None):
+        """Decorator version of stage; rows are counted from the result."""
+        def decorate(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name or func.__name__) as record:
+                    result = func(*args, **kwargs)
+                    record.rows = count_rows(result)
+                return result
+            return wrapper
+        return decorate
+
+    def _path(self, name, ext):
+        if not os.path.exists(self.profile_dir):
+            os.makedirs(self.profile_dir)
+        safe = ''.join(char if char.isalnum() else '-' for char in name)
+        return os.path.join(self.profile_dir, '{}.{}'.format(safe, ext))
+
+    def _dump_profile(self, name, profile, top=15):
+        path = self._path(name, 'prof')
+        profile.dump_stats(path)
+        print('cProfile of {} saved to {}'.format(name, path))
+        pstats.Stats(profile).sort_stats('cumulative').print_stats(top)
+
+    def _dump_trace(self, name, top=10):
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print('tracemalloc of {}: peak {:.1f}MB traced'.format(name, peak / 2. ** 20))
+        for stat in snapshot.statistics('lineno')[:top]:
+            print('  {}'.format(stat))
+
+    def report(self):
+        """One row per stage name, in the order stages first ran."""
+        stages = OrderedDict()
+        for record in self.records:
+            row = stages.setdefault(record.name, dict(
+                stage=record.name, calls=0, wall_s=0., self_s=0., cpu_s=0.,
+                peak_rss_mb=None, rss_growth_mb=None, children_peak_rss_mb=None,
+                rows=None))
+            row['calls'] += 1
+            row['wall_s'] += record.wall
+            row['self_s'] += record.wall - record.nested
+            row['cpu_s'] += record.cpu
+            if record.peak_rss is not None:
+                row['peak_rss_mb'] = max(row['peak_rss_mb'] or 0, record.peak_rss)
+                row['rss_growth_mb'] = (row['rss_growth_mb'] or 0) + record.rss_growth
+                row['children_peak_rss_mb'] = max(row['children_peak_rss_mb'] or 0,
+                                                  record.children_peak_rss)
+            if record.rows is not None:
+                row['rows'] = (row['rows'] or 0) + record.rows
+        return list(stages.values())
+
+    def summary(self):
+        header = '{:<44} {:>5} {:>9} {:>9} {:>9} {:>9} {:>9} {:>9} {:>9}'
+        print('\n' + header.format('stage', 'calls', 'wall s', 'self s', 'cpu s',
+                                   'peak MB', '+MB', 'child MB', 'rows'))
+        fmt = lambda value, spec: '-' if value is None else format(value, spec)
+        report = self.report()
+        for row in report:
+            print(header.format(
+                row['stage'][:44], row['calls'], fmt(row['wall_s'], '.3f'),
+                fmt(row['self_s'], '.3f'), fmt(row['cpu_s'], '.3f'),
+                fmt(row['peak_rss_mb'], '.0f'), fmt(row['rss_growth_mb'], '.0f'),
+                fmt(row['children_peak_rss_mb'], '.0f'), fmt(row['rows'], 'd')))
+        # self times don't overlap within a thread, so nothing is counted twice
+        print(header.format('total', '', '', fmt(sum(row['self_s'] for row in report), '.3f'),
+                            '', '', '', '', ''))
+
+    def write(self, path):
+        """Save the report as JSON, or CSV if path ends in .csv"""
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        report = self.report()
+        with open(path, 'w', newline='') as f:
+            if path.endswith('.csv'):
+                writer = csv.DictWriter(f, FIELDS)
+                writer.writeheader()
+                writer.writerows(report)
+            else:
+                json.dump({'argv': sys.argv, 'finished': time.time(),
+                           'stages': report}, f, indent=2)
+
+
+# the profiler the scripts share
+PROFILER = Profiler()
+stage = PROFILER.stage
+timed = PROFILER.timed
+
+
+def add_arguments(parser):
+    """--report, --cprofile and --tracemalloc options for a script's parser."""
+    parser.add_argument('--report', metavar='PATH',
+                        help='write a JSON (or .csv) report of stage timings')
+    parser.add_argument('--cprofile', metavar='STAGE', action='append', default=[],
+                        help='run this stage under cProfile')
+    parser.add_argument('--tracemalloc', metavar='STAGE', action='append', default=[],
+                        help='trace memory allocations in this stage')
+
+
+def configure(args):
+    PROFILER.cprofile.update(args.cprofile)
+    PROFILER.traced.update(args.tracemalloc)
+
+
+def finish(args):
+    """Print the summary and write the report, if one was asked for."""
+    PROFILER.summary()
+    if args.report:
+        PROFILER.write(args.report)
+        print('wrote {}'.format(args.report))
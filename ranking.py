@@ -0,0 +1,58 @@
+"""
+Ranking players within groups, ex. every expert's top QBs each week.
+
+Ranks for all groups come from a single stable sort on (group, -score)
+and a cumulative count within each run of the sorted groups, so the cost
+doesn't depend on how many groups there are. Ties keep the order the rows
+came in, same as sorting every group with a stable sort.
+"""
+from mappings import FANTASY_RELEVANT
+import numpy as np
+import pandas as pd
+
+
+def group_codes(df, by):
+    """Integer code per row for its combination of the by columns."""
+    return df.groupby(by, sort=False, observed=True, dropna=False).ngroup().values
+
+
+def rank(df, by, score, rank_col='position_rank'):
+    """
+    Rank rows within their groups, highest score first. Rows without a
+    score rank last in their group.
+
+    Parameters
+    ----------
+    df: pandas.DataFrame
+    by: list of columns to group by, ex. ['position', 'week']
+    score: column to rank by, ex. 'projected_pts'
+    rank_col: name of the new column of ranks, starting at 1
+
+    Returns
+    -------
+    a copy of df, in the same order, with rank_col added
+    """
+    groups = group_codes(df, by)
+    scores = -np.asarray(df[score], dtype=float)
+    order = np.lexsort((scores, groups)) # last key sorts first; lexsort is stable
+    sorted_groups = groups[order]
+    index = np.arange(len(df))
+    starts = np.ones(len(df), dtype=bool)
+    starts[1:] = sorted_groups[1:] != sorted_groups[:-1]
+    first = np.maximum.accumulate(np.where(starts, index, 0)) if len(df) else index
+    ranks = np.empty(len(df), dtype=np.int64)
+    ranks[order] = index - first + 1
+    return df.assign(**{rank_col: ranks})
+
+
+def top_n(df, limits=FANTASY_RELEVANT, position_col='position',
+          rank_col='position_rank'):
+    """
+    Only the fantasy relevant players: the top N at each position, with N
+    looked up in limits. Positions missing from limits are dropped.
+    """
+    codes, positions = pd.factorize(df[position_col])
+    per_position = np.array([limits.get(position, 0) for position in positions])
+    cutoff = np.where(codes >= 0, per_position[np.maximum(codes, 0)], 0) \
+        if len(positions) else np.zeros(len(df))
+    return df[np.asarray(df[rank_col]) <= cutoff]
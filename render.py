@@ -0,0 +1,230 @@
+"""
+Chart rendering.
+
+Scripts describe the charts they want as Chart specs and hand the whole
+batch to render_all, which draws them in a pool of worker processes on
+the Agg backend. Workers keep one figure per size and clear it between
+charts instead of opening a new figure every time, and any figures left
+over are closed when a batch is done. The hash of every chart's data and
+options is kept in a manifest under .cache/, so charts that haven't
+changed since they were last drawn are skipped.
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import hashlib
+import json
+import os
+
+MANIFEST_PATH = '.cache/charts.json'
+RENDER_VERSION = 1 # bump to redraw everything after changing a draw function
+FIGSIZES = {'histogram': (13, 5), 'boxplots': (13, 6), 'grid': (20, 20)}
+
+
+def _arrays(data):
+    """Plain float arrays (or dicts of them) that pickle and hash cheaply."""
+    if isinstance(data, dict):
+        return dict((key, _arrays(value)) for key, value in data.items())
+    return np.asarray(data, dtype=float)
+
+
+def _update(digest, data):
+    if isinstance(data, dict):
+        for key, value in data.items():
+            digest.update(repr(key).encode('utf-8'))
+            _update(digest, value)
+    else:
+        digest.update(repr(data.shape).encode('utf-8'))
+        digest.update(np.ascontiguousarray(data).tobytes())
+
+
+class Chart(object):
+    """
+    One chart to draw.
+
+    Parameters
+    ----------
+    kind: string, one of DRAW, ex. 'histogram'
+    filename: string, where to save the png
+    data: array-like, or a dict of them for boxplots and grids
+    options: keyword arguments for the draw function, plus figsize
+    """
+    def __init__(self, kind, filename, data, **options):
+        self.kind = kind
+        self.filename = filename
+        self.data = _arrays(data)
+        self.options = options
+
+    def digest(self):
+        digest = hashlib.sha1()
+        spec = [RENDER_VERSION, self.kind, self.options]
+        digest.update(json.dumps(spec, sort_keys=True, default=str).encode('utf-8'))
+        _update(digest, self.data)
+        return digest.hexdigest()
+
+
+def _setup():
+    import matplotlib
+    matplotlib.use('Agg')
+    import seaborn as sns
+    sns.set(style='white', palette='muted')
+
+
+_figures = {}
+
+def _figure(figsize):
+    """A cleared figure of the given size, reused across charts."""
+    import matplotlib.pyplot as plt
+    figsize = tuple(figsize)
+    if figsize not in _figures:
+        _figures[figsize] = plt.figure(figsize=figsize)
+    fig = _figures[figsize]
+    fig.clf()
+    return fig
+
+
+def close_figures():
+    import matplotlib.pyplot as plt
+    for fig in _figures.values():
+        plt.close(fig)
+    _figures.clear()
+
+
+def _despine(axes):
+    axes.spines['top'].set_visible(False)
+    axes.spines['left'].set_visible(False)
+    axes.spines['right'].set_visible(False)
+
+
+def draw_histogram(fig, data, small=False, title='', titlesize=22, bins=25,
+                   xlim=None, xlabel='', xsize=22, ylabel=''):
+    from matplotlib.ticker import MaxNLocator
+    axes = fig.add_subplot(111)
+    axes.tick_params(axis='x', labelsize=xsize)
+    axes.xaxis.set_major_locator(MaxNLocator(symmetric=True))
+    axes.locator_params(nbins=5 if small else 7)
+    axes.set_title(title, fontdict={'fontsize': titlesize})
+    axes.hist(data, bins=bins, color='#ff6000', alpha=.4)
+    axes.set_xlabel(xlabel)
+    axes.set_ylabel(ylabel)
+    axes.set_xlim(xlim)
+    axes.tick_params(axis='y', labelleft=False)
+    axes.axvline(x=0, ls=':', color='k', linewidth=1.5)
+    _despine(axes)
+
+
+def draw_boxplots(fig, data, title='', xlabel='', ylabel='', xlim=(-5, 5), order=None):
+    import seaborn as sns
+    axes = fig.add_subplot(111)
+    axes.set_title(title, fontdict={'fontsize': 13})
+    sns.boxplot(data=data, orient='h', linewidth=1, fliersize=0, order=order,
+                width=.3, ax=axes)
+    axes.set_xlabel(xlabel)
+    axes.set_ylabel(ylabel)
+    axes.set_xlim(xlim)
+    axes.axvline(x=0, ls=':', color='r', linewidth=.7)
+    _despine(axes)
+
+
+def draw_grid(fig, data, positions=('QB', 'RB', 'WR', 'TE', 'K'), xlim=(-5., 5.)):
+    """One row of histograms per source, one column per position."""
+    from matplotlib.ticker import MaxNLocator
+    import matplotlib.pyplot as plt
+    axes = fig.subplots(len(data), len(positions), sharex='row', squeeze=False)
+    fig.tight_layout(pad=3.0, h_pad=5.0)
+    cmap = plt.get_cmap('Paired') # colormap to use
+    for x, source in enumerate(data):
+        for y, position in enumerate(positions):
+            ax = axes[x][y]
+            ax.tick_params(axis='x', labelsize=20)
+            ax.hist(data[source][position], color=cmap(1. * y / len(positions)))
+            ax.set_title('{}\n{}'.format(source, position), fontdict={'fontsize': 20})
+            ax.tick_params(axis='y', labelleft=False)
+            # always center x-axis at 0
+            ax.set_xlim(*xlim)
+            ax.xaxis.set_major_locator(MaxNLocator(symmetric=True))
+            ax.locator_params(nbins=5)
+            ax.axvline(x=0, ls=':', color='k', linewidth=2.5)
+            _despine(ax)
+
+
+DRAW = {
+    'histogram': draw_histogram,
+    'boxplots': draw_boxplots,
+    'grid': draw_grid,
+}
+
+
+def render(chart):
+    """Draw and save one chart. Returns its filename."""
+    options = dict(chart.options)
+    fig = _figure(options.pop('figsize', FIGSIZES[chart.kind]))
+    DRAW[chart.kind](fig, chart.data, **options)
+    directory = os.path.dirname(chart.filename)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    fig.savefig(chart.filename, bbox_inches='tight')
+    fig.clf()
+    return chart.filename
+
+
+def _read_manifest(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_manifest(manifest, path):
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+def render_all(charts, processes=None, manifest_path=MANIFEST_PATH, force=False):
+    """
+    Render a batch of charts, skipping the ones that are up to date.
+
+    Parameters
+    ----------
+    charts: list of Chart
+    processes: int, worker processes; None for one per CPU, 1 to draw in
+        this process
+    manifest_path: string, JSON file of chart filename -> data hash
+    force: bool, redraw every chart even if it hasn't changed
+
+    Returns
+    -------
+    list of the filenames that were drawn
+    """
+    manifest = _read_manifest(manifest_path)
+    digests = dict((chart.filename, chart.digest()) for chart in charts)
+    todo = [chart for chart in charts
+            if force or manifest.get(chart.filename) != digests[chart.filename]
+            or not os.path.exists(chart.filename)]
+    print('Rendering {} of {} charts'.format(len(todo), len(charts)))
+
+    drawn = []
+    if not todo:
+        return drawn
+    try:
+        if processes == 1 or len(todo) == 1:
+            _setup()
+            try:
+                for chart in todo:
+                    drawn.append(render(chart))
+                    manifest[chart.filename] = digests[chart.filename]
+            finally:
+                close_figures()
+        else:
+            with ProcessPoolExecutor(processes, initializer=_setup) as pool:
+                futures = [pool.submit(render, chart) for chart in todo]
+                for future in as_completed(futures):
+                    filename = future.result()
+                    drawn.append(filename)
+                    manifest[filename] = digests[filename]
+    finally:
+        # keep track of whatever did get drawn, even if a chart failed
+        _write_manifest(manifest, manifest_path)
+    return drawn
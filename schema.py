@@ -0,0 +1,152 @@
+"""
+Column types shared by every source.
+
+Names, teams, positions and experts are categoricals, and a column that
+appears in more than one frame (ESPN's position and FantasyPros'
+POSITION, say) gets the same categories in all of them, so its integer
+codes mean the same thing everywhere. Stat columns are float32, weeks,
+ranks and counts the smallest integer that holds them. Frames are
+joined on a single int64 surrogate key packed from the join columns,
+looked up with a hash index instead of merging on several columns.
+
+    projections, scoring = conform([projections, scoring])
+    joined = join(projections, scoring, ['player_id', 'WEEK'], ['player_id', 'week'])
+"""
+import numpy as np
+import pandas as pd
+
+CATEGORICAL = ['name', 'team', 'position', 'opponent', 'game_result',
+               'Player', 'PLAYER_NAME', 'TEAM', 'POSITION', 'EXPERT', 'source']
+# the same thing under each source's name; these share categories. (Names
+# and teams aren't: FantasyPros' are normalized, ESPN's aren't.)
+SHARED = [['POSITION', 'position']]
+# ids and partition columns keep a fixed integer type
+INTEGER = {'player_id': np.int32, 'season': np.int64}
+
+
+def downcast(df):
+    """float32 floats and the smallest integers that fit, in place."""
+    for col in df.columns:
+        kind = df[col].dtype.kind
+        if col in INTEGER and isinstance(df[col].dtype, np.dtype) and kind in 'iu':
+            df[col] = df[col].astype(INTEGER[col])
+        elif kind in 'iu':
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+        elif kind == 'f':
+            df[col] = df[col].astype(np.float32)
+    return df
+
+
+def typed(df):
+    """A copy of df with categorical strings and downcast numbers."""
+    df = df.copy(deep=False)
+    for col in df.columns:
+        if col in CATEGORICAL or not pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = df[col].astype('category')
+    return downcast(df)
+
+
+def conform(frames):
+    """
+    Type several frames consistently; see typed. Columns in SHARED get the
+    union of their values across all the frames as categories.
+
+    Returns
+    -------
+    list of typed copies, in the same order as frames
+    """
+    frames = [typed(df) for df in frames]
+    for names in SHARED:
+        columns = [(df, col) for df in frames for col in names if col in df]
+        if len(columns) < 2:
+            continue
+        values = set()
+        for df, col in columns:
+            values.update(df[col].cat.categories)
+        dtype = pd.CategoricalDtype(sorted(values))
+        for df, col in columns:
+            df[col] = df[col].astype(dtype)
+    return frames
+
+
+def surrogate(frames, columns):
+    """
+    One int64 key per row packing the values of its columns, with the same
+    packing for every frame. Categoricals contribute their codes, so they
+    need shared categories (see conform); integers their offset from the
+    smallest value in any frame. Rows with a missing value get -1.
+
+    Parameters
+    ----------
+    frames: list of pandas.DataFrame
+    columns: list of key columns for each frame, lined up position by position
+
+    Returns
+    -------
+    list of numpy int64 arrays, one per frame
+    """
+    parts = [[] for _ in frames]
+    shape = []
+    for key in zip(*columns):
+        series = [df[col] for df, col in zip(frames, key)]
+        if all(hasattr(s, 'cat') for s in series):
+            if any(not s.cat.categories.equals(series[0].cat.categories)
+                   for s in series[1:]):
+                raise ValueError('{} have different categories; conform them first'
+                                 .format(', '.join(key)))
+            values = [s.cat.codes.values.astype(np.int64) for s in series]
+            size = len(series[0].cat.categories)
+        else:
+            present = [s.notnull().values for s in series]
+            values = [np.asarray(s.astype('Int64').fillna(0), dtype=np.int64)
+                      for s in series]
+            found = [v[p] for v, p in zip(values, present) if p.any()]
+            low = min(v.min() for v in found) if found else 0
+            size = max(v.max() for v in found) - low + 1 if found else 1
+            values = [np.where(p, v - low, -1) for v, p in zip(values, present)]
+        shape.append(int(size))
+        for part, v in zip(parts, values):
+            part.append(v)
+    if np.prod(np.asarray(shape, dtype=float)) >= 2 ** 62:
+        raise ValueError('keys on {} are too wide to pack'.format(columns))
+    keys = []
+    for part in parts:
+        missing = np.any([v < 0 for v in part], axis=0)
+        packed = np.ravel_multi_index([np.maximum(v, 0) for v in part], shape) \
+            if len(part[0]) else np.zeros(0, dtype=np.int64)
+        keys.append(np.where(missing, -1, packed).astype(np.int64))
+    return keys
+
+
+def join(left, right, left_on, right_on, columns=None):
+    """
+    Left join of right's columns onto left, many rows to one. Each row of
+    left looks up its surrogate key in a hash index of right's keys.
+
+    Parameters
+    ----------
+    left, right: pandas.DataFrame
+    left_on, right_on: lists of key columns; right's keys must be unique
+    columns: right's columns to bring over, default all but the keys
+
+    Returns
+    -------
+    pandas.DataFrame with left's columns and index, then right's columns;
+        NaN where a row of left had no match
+    """
+    left_keys, right_keys = surrogate([left, right], [left_on, right_on])
+    index = pd.Index(right_keys)
+    if not index.is_unique:
+        raise ValueError('{} do not identify rows of the right frame'
+                         .format(', '.join(right_on)))
+    if columns is None:
+        columns = [col for col in right.columns if col not in right_on]
+    found = index.get_indexer(left_keys)
+    found[left_keys < 0] = -1
+    matched = right[columns].take(np.maximum(found, 0))
+    matched.index = left.index
+    missing = found < 0
+    if missing.any():
+        for col in columns:
+            matched[col] = matched[col].where(~missing)
+    return pd.concat([left, matched], axis=1)
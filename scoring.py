@@ -0,0 +1,154 @@
+"""
+Vectorized fantasy point scoring.
+
+A rule table like mappings.ESPN_SCORING maps a stat column to the points
+it is worth. We turn it into a weight vector and score every stat line in
+a frame with a single matrix product instead of looping over rows.
+
+Several leagues' rule sets (mappings.SCORING_SYSTEMS, plus any custom
+ones registered here) stack into a stats x K weight matrix, so one
+product scores every stat line under all K systems at once. A Scorer
+pulls the stat columns out of a frame once; scoring it under a new
+league after that is just another product.
+"""
+from mappings import SCORING_SYSTEMS, ESPN_SCORING
+import numpy as np
+import pandas as pd
+
+# positions we can't score from the stat line; ESPN's total is used instead
+PASSTHROUGH_POSITIONS = ('K',)
+
+
+def scoring_weights(rules, columns=None):
+    """
+    Build a weight vector from a rule table.
+
+    Parameters
+    ----------
+    rules: dict, stat column -> points per unit, ex. mappings.ESPN_SCORING
+    columns: list, optional column order; stats without a rule weigh 0
+
+    Returns
+    -------
+    (columns, weights): list of column names, numpy array of floats
+    """
+    if columns is None:
+        columns = sorted(rules.keys())
+    weights = np.array([rules.get(col, 0.) for col in columns], dtype=float)
+    return list(columns), weights
+
+
+def register(name, rules, base='standard'):
+    """
+    Add a league's rules to SCORING_SYSTEMS, ex.
+    register('six-pt-pass-td', {'pass_TD': 6.}). Stats the rules leave out
+    are taken from the base system; pass base=None to start from nothing.
+    """
+    unknown = set(rules) - set(ESPN_SCORING)
+    if unknown:
+        raise KeyError('no such stats: {}'.format(', '.join(sorted(unknown))))
+    SCORING_SYSTEMS[name] = dict(SCORING_SYSTEMS[base] if base else {}, **rules)
+    return SCORING_SYSTEMS[name]
+
+
+def _systems(systems):
+    """None -> every registered system; list of names -> those; dicts pass through."""
+    if systems is None:
+        systems = SCORING_SYSTEMS
+    if not isinstance(systems, dict):
+        systems = dict((name, SCORING_SYSTEMS[name]) for name in systems)
+    return systems
+
+
+def weight_matrix(systems=None, stats=None):
+    """
+    Stack rule sets into one matrix.
+
+    Parameters
+    ----------
+    systems: dict of name -> rules, or a list of registered names;
+        None for all of SCORING_SYSTEMS
+    stats: list, optional row order; defaults to every stat any system uses
+
+    Returns
+    -------
+    (stats, names, weights): weights is a len(stats) x len(names) array
+    """
+    systems = _systems(systems)
+    names = list(systems)
+    if stats is None:
+        stats = sorted(set().union(*[set(rules) for rules in systems.values()]))
+    weights = np.column_stack([scoring_weights(systems[name], stats)[1]
+                               for name in names]) if names else np.zeros((len(stats), 0))
+    return list(stats), names, weights
+
+
+class Scorer(object):
+    """
+    The stat lines of a frame, ready to be scored under any rule sets.
+
+    Parameters
+    ----------
+    df: pandas.DataFrame of stat lines, ex. data/scoring-espn.csv or a
+        FantasyPros projections file
+    aliases: dict, df column -> stat name used in the rules, ex.
+        mappings.FANTASYPROS_STATS; columns not listed keep their names
+    position_col: string, column holding the player's position
+    total_col: string, column holding the site's total points
+    passthrough: positions that take total_col as their score
+
+    Stats a rule set uses that df doesn't have count as zero.
+    """
+    def __init__(self, df, aliases=None, position_col='position',
+                 total_col='total_pts', passthrough=PASSTHROUGH_POSITIONS):
+        aliases = aliases or {}
+        known = set().union(*[set(rules) for rules in SCORING_SYSTEMS.values()])
+        self.columns = [col for col in df.columns if aliases.get(col, col) in known]
+        self.stats = [aliases.get(col, col) for col in self.columns]
+        self.values = df[self.columns].values.astype(float)
+        self.index = df.index
+        self.passthrough = np.zeros(len(df))
+        if passthrough:
+            mask = df[position_col].isin(passthrough).values
+            self.passthrough = np.where(mask, df[total_col].values, 0.)
+
+    def score(self, systems=None, prefix=''):
+        """
+        Points for every stat line under every system.
+
+        Returns
+        -------
+        pandas.DataFrame, one column per system (named prefix + system name)
+        """
+        stats, names, weights = weight_matrix(systems, self.stats)
+        points = self.values.dot(weights) + self.passthrough[:, np.newaxis]
+        return pd.DataFrame(points, index=self.index,
+                            columns=[prefix + name for name in names])
+
+
+def score(df, rules, position_col='position', total_col='total_pts',
+          passthrough=PASSTHROUGH_POSITIONS):
+    """
+    Calculate fantasy points for every row of a stat frame.
+
+    Players at a passthrough position (kickers) get the site's own total
+    added as a masked column rather than through a per-row branch.
+
+    Parameters
+    ----------
+    df: pandas.DataFrame of stat lines, ex. data/scoring-espn.csv
+    rules: dict, stat column -> points per unit
+    position_col: string, column holding the player's position
+    total_col: string, column holding the site's total points
+    passthrough: positions that take total_col as their score
+
+    Returns
+    -------
+    pandas.Series of points, aligned with df.index
+    """
+    columns, weights = scoring_weights(rules)
+    points = df[columns].values.astype(float).dot(weights)
+    if passthrough:
+        mask = df[position_col].isin(passthrough).values
+        points += np.where(mask, df[total_col].values, 0)
+    return pd.Series(points, index=df.index)
@@ -1,16 +1,23 @@
 """
 Quicky script to scrape projections from fantasypros.com
+
+Every expert x position x week page is its own request: filters=X:X
+isolates one expert, and asking for several experts at once gets their
+consensus, not one table each. So the whole grid is fetched concurrently
+instead, and each page's table is read with parsers.parse_fantasypros.
 """
-import sys
-import requests
-from bs4 import BeautifulSoup
+from fetcher import Fetcher
+from http_cache import HTTPCache, week_ttl
 from mappings import COLUMN_MAPPINGS
+from parsers import parse_fantasypros
+from partitions import existing_partitions, append_partitions, parse_partition
 import pandas as pd
+import argparse
+import profiler
+import storage
 
 # set up some parameters for scrape
 base_url = 'http://www.fantasypros.com/nfl/projections'
-current_week = int(sys.argv[1])
-week_list = range(1, current_week + 1)
 position_list = ['qb', 'rb', 'wr', 'te', 'k']
 experts = {
     44: 'Dave Richard, CBS Sports',
@@ -22,34 +29,93 @@ experts = {
     469: 'Pro Football Focus',
 }
 
-for expert_code, expert_name in sorted(experts.iteritems()):
-    frames = []
-    for position in position_list:
-        for week in week_list:
-            # make the request, use trick of expert:expert to get the
-            # results from just one source
-            url = '%s/%s.php' % (base_url, position)
-            params = {
-                'week': week,
-                'filters': '%i:%i' % (expert_code, expert_code),
-            }
-            response = requests.get(url, params=params)
-
-            msg = 'getting projections for {}, week {}, postition {}'
-            print(msg.format(expert_name, week, position))
-            
-            # use expert:expert in request to get only one expert at a time
-            # use pandas to parse the HTML table for us
-            df = pd.io.html.read_html(
-                    response.text,
-                    attrs={'id': 'data'}
-                )[0]
-            df['WEEK'] = week
-            df['POSITION'] = position.upper()
-            df.rename(columns=COLUMN_MAPPINGS[position.upper()], inplace=True)
-            frames.append(df)
-
-    expert_df = pd.concat(frames)
-    expert_df['EXPERT'] = expert_name
-    filename = 'data/fantasypros-projections-{}.csv'.format(expert_code)
-    expert_df.to_csv(filename, index=False)
+def forced(force, week, expert_code, position):
+    """Does a --force spec like 3, 3:73 or 3:73:wr cover this partition?"""
+    partition = (str(week), str(expert_code), position)
+    return any(spec == partition[:len(spec)] for spec in force)
+
+def parse_projections(html, week, position):
+    """The projections table on a FantasyPros page, with our column names."""
+    df = parse_fantasypros(html)
+    df['WEEK'] = week
+    df['POSITION'] = position.upper()
+    return df.rename(columns=COLUMN_MAPPINGS[position.upper()])
+
+def plan(current_week, incremental=False, force=()):
+    """
+    With incremental=True, only partitions missing from the expert files,
+    forced ones and current_week, which can still change, are fetched.
+
+    Returns
+    -------
+    list of (expert_code, position, week) pages to fetch
+    """
+    week_list = range(1, current_week + 1)
+    pages = []
+    for expert_code in sorted(experts):
+        filename = 'data/fantasypros-projections-{}.csv'.format(expert_code)
+        grid = [(position, week) for position in position_list for week in week_list]
+        if incremental:
+            existing = existing_partitions(filename, ['WEEK', 'POSITION'])
+            grid = [(position, week) for position, week in grid
+                    if (str(week), position.upper()) not in existing or
+                    week == current_week or forced(force, week, expert_code, position)]
+            if not grid:
+                print('{} is up to date'.format(filename))
+        pages.extend((expert_code, position, week) for position, week in grid)
+    return pages
+
+def main(current_week, offline=False, incremental=False, force=()):
+    fetcher = Fetcher(cache=HTTPCache(offline=offline))
+    pages = plan(current_week, incremental, force)
+    # use trick of expert:expert to get the results from just one source
+    urls = ['%s/%s.php' % (base_url, position) for _, position, _ in pages]
+    params = [{'week': week, 'filters': '%i:%i' % (expert_code, expert_code)}
+              for expert_code, _, week in pages]
+    ttls = [week_ttl(week, current_week) for _, _, week in pages]
+    print('Fetching {} pages'.format(len(pages)))
+
+    frames = dict((expert_code, []) for expert_code in experts)
+    with profiler.stage('fetch', rows=len(pages)):
+        responses = list(fetcher.get_all(urls, params=params, ttls=ttls))
+    for (expert_code, position, week), response in zip(pages, responses):
+        msg = 'getting projections for {}, week {}, postition {}'
+        print(msg.format(experts[expert_code], week, position))
+        with profiler.stage('parse') as record:
+            frames[expert_code].append(parse_projections(response.text, week, position))
+            record.rows = len(frames[expert_code][-1])
+
+    for expert_code, expert_frames in sorted(frames.items()):
+        if not expert_frames:
+            continue
+        filename = 'data/fantasypros-projections-{}.csv'.format(expert_code)
+        expert_df = pd.concat(expert_frames)
+        expert_df['EXPERT'] = experts[expert_code]
+        if incremental:
+            rows = expert_df.astype(object).where(expert_df.notnull(), None)
+            append_partitions(filename, rows.to_dict('records'), ['WEEK', 'POSITION'])
+        else:
+            expert_df.to_csv(filename, index=False)
+    # keep the store, if there is one, in step with the CSVs
+    for filename in storage.refresh('fantasypros'):
+        print('stored {} as fantasypros'.format(filename))
+    fetcher.metrics.report()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('current_week', type=int)
+    parser.add_argument('--offline', action='store_true',
+                        help='replay pages from the cache; no network access')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only fetch partitions missing from the existing CSVs, '
+                             'and the current week')
+    parser.add_argument('--force', type=parse_partition, action='append',
+                        default=[], metavar='WEEK[:EXPERT[:POSITION]]',
+                        help='with --incremental, refetch this partition anyway, '
+                             'ex. 3 or 3:73 or 3:73:wr')
+    profiler.add_arguments(parser)
+    args = parser.parse_args()
+    profiler.configure(args)
+    main(args.current_week, offline=args.offline,
+         incremental=args.incremental, force=args.force)
+    profiler.finish(args)
@@ -0,0 +1,307 @@
+"""
+Typed, columnar storage for the scraped data.
+
+Each dataset is written as one file per partition, hive style, ex.
+
+    data/store/espn-scoring/season=2014/source=espn/part.parquet
+
+Readers pick partitions by their directory names before opening any file
+and only load the columns they ask for. Weeks are a filterable column
+rather than a directory level: a week of one source is only a few dozen
+rows, so per-file overhead would cost more than skipping it saves.
+Columns are typed by schema.typed: names, teams, positions and experts
+as categoricals, stats as float32. Parquet is used when pyarrow is
+installed; otherwise each partition is a NumPy .npz of column arrays,
+with categoricals kept as integer codes plus their categories.
+
+    python storage.py    # load the CSVs in data/ into data/store/
+
+The store remembers the modification time of each CSV it was built from.
+Loading a dataset whose CSVs have changed since (a scrape ran, say)
+stores those CSVs again first, so the store never hides newer data.
+"""
+from schema import typed
+from glob import glob
+import numpy as np
+import shutil
+import json
+import pandas as pd
+import os
+
+try:
+    import pyarrow # noqa
+    BACKEND = 'parquet'
+except ImportError:
+    BACKEND = 'npz'
+
+STORE_ROOT = 'data/store'
+PARTITION_COLS = ['season', 'source']
+
+# dataset name -> (csv glob, partition columns, constant columns)
+CSV_SOURCES = {
+    'espn-projections': ('data/projections-espn.csv', PARTITION_COLS, {'source': 'espn'}),
+    'espn-scoring': ('data/scoring-espn.csv', PARTITION_COLS, {'source': 'espn'}),
+    'fantasypros': ('data/fantasypros-projections-*.csv', PARTITION_COLS,
+                    {'season': 2014}),
+}
+
+
+def _write_npz(df, path):
+    arrays = {}
+    for col in df.columns:
+        if hasattr(df[col], 'cat'):
+            arrays['codes:' + col] = df[col].cat.codes.values
+            arrays['categories:' + col] = np.asarray(df[col].cat.categories, dtype=str)
+        else:
+            arrays['values:' + col] = df[col].values
+    np.savez(path, **arrays)
+
+
+def _read_npz(path, columns=None):
+    """Returns {column: array} and {column: categories} for one partition."""
+    values, categories = {}, {}
+    with np.load(path) as arrays:
+        for key in arrays.files:
+            kind, col = key.split(':', 1)
+            if columns is not None and col not in columns:
+                continue
+            if kind == 'categories':
+                categories[col] = arrays[key]
+            else:
+                values[col] = arrays[key]
+    return values, categories
+
+
+def _concat_npz(parts):
+    """
+    Stitch partitions together column by column, remapping each
+    partition's categorical codes onto the union of their categories.
+    """
+    columns = []
+    for values, _ in parts:
+        columns += [col for col in values if col not in columns]
+    data = {}
+    for col in columns:
+        present = [(values[col], cats.get(col)) for values, cats in parts if col in values]
+        if present[0][1] is None:
+            data[col] = np.concatenate([arr for arr, _ in present])
+            continue
+        union = np.unique(np.concatenate([cats for _, cats in present]))
+        codes = []
+        for arr, cats in present:
+            remap = np.searchsorted(union, cats) if len(cats) else np.array([], int)
+            codes.append(np.where(arr >= 0, remap[np.maximum(arr, 0)] if len(cats) else -1, -1))
+        data[col] = pd.Categorical.from_codes(np.concatenate(codes), union)
+    return pd.DataFrame(data, columns=columns)
+
+
+def write(df, dataset, partition_cols=PARTITION_COLS, root=STORE_ROOT,
+          backend=BACKEND):
+    """Write df as one typed file per partition of dataset."""
+    df = typed(df)
+    for values, part in df.groupby(partition_cols, observed=True):
+        directory = os.path.join(root, dataset, *[
+            '{}={}'.format(col, value) for col, value in zip(partition_cols, values)])
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        part = part.drop(partition_cols, axis=1).reset_index(drop=True)
+        if backend == 'parquet':
+            part.to_parquet(os.path.join(directory, 'part.parquet'), index=False)
+        else:
+            _write_npz(part, os.path.join(directory, 'part.npz'))
+
+
+def _partition_values(path, root):
+    """'season=2014/source=espn' -> [('season', 2014), ('source', 'espn')]"""
+    parts = os.path.relpath(os.path.dirname(path), root).split(os.sep)
+    values = []
+    for part in parts:
+        col, value = part.split('=', 1)
+        values.append((col, int(value) if value.lstrip('-').isdigit() else value))
+    return values
+
+
+def _wanted(filters):
+    """Normalize filters to {column: set of values}."""
+    wanted = {}
+    for col, value in (filters or {}).items():
+        if not isinstance(value, (list, tuple, set)):
+            value = [value]
+        wanted[col] = set(value)
+    return wanted
+
+
+def exists(dataset, root=STORE_ROOT):
+    return os.path.isdir(os.path.join(root, dataset))
+
+
+def patterns(dataset, root=STORE_ROOT):
+    """File globs a dataset can be loaded from, for noticing when it changes."""
+    return [os.path.join(root, dataset, '**', 'part.*'), CSV_SOURCES[dataset][0]]
+
+
+def _read_parquet(root, columns, filters):
+    import pyarrow.dataset as ds
+    dataset = ds.dataset(root, format='parquet', partitioning='hive')
+    expression = None
+    for col, values in filters.items():
+        condition = ds.field(col).isin(sorted(values))
+        expression = condition if expression is None else expression & condition
+    if columns is not None:
+        partition_cols = dataset.partitioning.schema.names
+        columns = list(columns) + [col for col in partition_cols if col not in columns]
+    df = dataset.to_table(columns=columns, filter=expression).to_pandas()
+    for col in df.columns:
+        if df[col].dtype.kind == 'i' and col in dataset.partitioning.schema.names:
+            df[col] = df[col].astype(np.int64)
+    for col in df.columns:
+        if not pd.api.types.is_numeric_dtype(df[col]) and not hasattr(df[col], 'cat'):
+            df[col] = df[col].astype('category')
+    return df
+
+
+def read(dataset, columns=None, filters=None, root=STORE_ROOT):
+    """
+    Read a dataset, ex. read('espn-scoring', ['name', 'total_pts'], {'week': [1, 2]})
+
+    Parameters
+    ----------
+    dataset: string, name of the dataset under root
+    columns: list of columns to load; partition columns are always added
+    filters: dict of column -> value or list of values. Filters on
+        partition columns skip whole files; others filter rows.
+
+    Returns
+    -------
+    pandas.DataFrame with categoricals unified across partitions
+    """
+    root = os.path.join(root, dataset)
+    filters = _wanted(filters)
+    if glob(os.path.join(root, '**', 'part.parquet'), recursive=True):
+        return _read_parquet(root, columns, filters)
+
+    parts = []
+    row_filters = {}
+    for path in sorted(glob(os.path.join(root, '**', 'part.npz'), recursive=True)):
+        partition = _partition_values(path, root)
+        if any(value not in filters[col] for col, value in partition if col in filters):
+            continue
+        row_filters = dict((col, values) for col, values in filters.items()
+                           if col not in dict(partition))
+        load = None if columns is None else list(columns) + list(row_filters)
+        values, categories = _read_npz(path, load)
+        n = len(next(iter(values.values()))) if values else 0
+        for col, value in partition:
+            if isinstance(value, int):
+                values[col] = np.repeat(value, n)
+            else:
+                values[col] = np.zeros(n, dtype=np.int8)
+                categories[col] = np.array([value])
+        parts.append((values, categories))
+    if not parts:
+        return pd.DataFrame(columns=columns)
+    df = _concat_npz(parts)
+    for col, values in row_filters.items():
+        df = df[df[col].isin(values)]
+    if columns is not None:
+        df = df[[col for col in columns if col in df] +
+                [col for col, _ in partition]]
+    return df.reset_index(drop=True)
+
+
+def _manifest_path(dataset, root=STORE_ROOT):
+    # pyarrow skips files starting with _ when it reads the dataset
+    return os.path.join(root, dataset, '_sources.json')
+
+
+def _manifest(dataset, root=STORE_ROOT):
+    """{csv filename: mtime_ns it had when it was stored}"""
+    path = _manifest_path(dataset, root)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _sources(dataset):
+    return dict((filename, os.stat(filename).st_mtime_ns)
+                for filename in sorted(glob(CSV_SOURCES[dataset][0])))
+
+
+def stale(dataset, root=STORE_ROOT):
+    """CSVs of a built dataset that are new or changed since they were stored."""
+    stored = _manifest(dataset, root)
+    return [filename for filename, mtime in _sources(dataset).items()
+            if stored.get(filename) != mtime]
+
+
+def refresh(dataset, root=STORE_ROOT, backend=BACKEND):
+    """
+    Bring a built dataset up to date with its CSVs: changed or new CSVs
+    are stored again, and if a CSV has gone away the dataset is rebuilt.
+    Does nothing if the dataset hasn't been built.
+
+    Returns
+    -------
+    list of the CSVs stored
+    """
+    if not exists(dataset, root):
+        return []
+    stored, sources = _manifest(dataset, root), _sources(dataset)
+    if set(stored) - set(sources) or not stored:
+        shutil.rmtree(os.path.join(root, dataset))
+        changed = list(sources)
+    else:
+        changed = stale(dataset, root)
+    for filename in changed:
+        import_csv(filename, dataset, root, backend)
+    return changed
+
+
+def load(dataset, columns=None, filters=None):
+    """
+    Read a dataset from the store if it's been built, else from its CSVs.
+    CSVs that changed since the store was built are stored again first.
+    """
+    if exists(dataset):
+        for filename in refresh(dataset):
+            print('stored {} again as {}; it changed since the store was built'
+                  .format(filename, dataset))
+        return read(dataset, columns, filters)
+    pattern = CSV_SOURCES[dataset][0]
+    df = pd.concat([pd.read_csv(filename) for filename in sorted(glob(pattern))],
+                   ignore_index=True)
+    for col, values in _wanted(filters).items():
+        df = df[df[col].isin(values)]
+    return df if columns is None else df[columns]
+
+
+def import_csv(filename, dataset, root=STORE_ROOT, backend=BACKEND):
+    """Store one CSV's partitions, replacing what the store had for them."""
+    pattern, partition_cols, constants = CSV_SOURCES[dataset]
+    mtime = os.stat(filename).st_mtime_ns
+    df = pd.read_csv(filename)
+    for col, value in constants.items():
+        df[col] = value
+    if dataset == 'fantasypros':
+        # one source per expert file, ex. fantasypros-73
+        df['source'] = os.path.splitext(os.path.basename(filename))[0].replace(
+            'fantasypros-projections-', 'fantasypros-')
+    write(df, dataset, partition_cols, root, backend)
+    manifest = _manifest(dataset, root)
+    manifest[filename] = mtime
+    with open(_manifest_path(dataset, root), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+def import_csvs(root=STORE_ROOT, backend=BACKEND):
+    """Load every CSV in data/ into the store."""
+    for dataset in CSV_SOURCES:
+        if exists(dataset, root):
+            shutil.rmtree(os.path.join(root, dataset))
+        for filename in sorted(glob(CSV_SOURCES[dataset][0])):
+            import_csv(filename, dataset, root, backend)
+            print('stored {} as {}'.format(filename, dataset))
+
+if __name__ == '__main__':
+    import_csvs()
@@ -0,0 +1,99 @@
+"""
+Retry and circuit breaker paths of fetcher.Fetcher, against a local
+fixture server that answers each path with a scripted list of statuses.
+
+    python -m unittest discover tests
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from fetcher import Fetcher, RetryPolicy, CircuitOpen, RETRY_STATUSES
+import threading
+import unittest
+import requests
+import time
+
+
+class ScriptedHandler(BaseHTTPRequestHandler):
+    # path -> statuses to answer with, in order; the last one repeats
+    script = {}
+
+    def do_GET(self):
+        statuses = self.script.get(self.path, [200])
+        status = statuses.pop(0) if len(statuses) > 1 else statuses[0]
+        self.send_response(status)
+        self.end_headers()
+        self.wfile.write(b'ok' if status == 200 else b'')
+
+    def log_message(self, *args):
+        pass
+
+
+class FetcherTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('localhost', 0), ScriptedHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base = 'http://localhost:{}'.format(cls.server.server_address[1])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        ScriptedHandler.script = {}
+
+    def fetcher(self, statuses=RETRY_STATUSES, **kwargs):
+        retry = RetryPolicy(max_attempts=3, backoff=0, statuses=statuses)
+        return Fetcher(rate=None, retry=retry, **kwargs)
+
+    def counts(self, fetcher):
+        return fetcher.metrics.summary()[self.base[len('http://'):]]
+
+    def test_stray_404_is_retried_when_asked(self):
+        ScriptedHandler.script = {'/page': [404, 200]}
+        fetcher = self.fetcher(RETRY_STATUSES + (404,))
+        self.assertEqual(fetcher.get(self.base + '/page').status_code, 200)
+        self.assertEqual(self.counts(fetcher)['retries'], 1)
+
+    def test_404_is_not_retried_by_default(self):
+        ScriptedHandler.script = {'/page': [404, 200]}
+        fetcher = self.fetcher()
+        with self.assertRaises(requests.HTTPError):
+            fetcher.get(self.base + '/page')
+        self.assertNotIn('retries', self.counts(fetcher))
+
+    def test_missing_pages_dont_open_the_breaker(self):
+        fetcher = self.fetcher(RETRY_STATUSES + (404,), breaker_threshold=2)
+        for player in range(5):
+            ScriptedHandler.script['/missing/{}'.format(player)] = [404]
+            with self.assertRaises(requests.HTTPError):
+                fetcher.get(self.base + '/missing/{}'.format(player))
+        self.assertEqual(fetcher.breaker(self.base[len('http://'):]).state, 'closed')
+        self.assertEqual(fetcher.get(self.base + '/page').status_code, 200)
+
+    def test_breaker_counts_requests_not_attempts(self):
+        ScriptedHandler.script = {'/down': [503]}
+        fetcher = self.fetcher(breaker_threshold=2)
+        with self.assertRaises(requests.HTTPError):
+            fetcher.get(self.base + '/down')
+        # three failed attempts, but one failed request
+        self.assertEqual(fetcher.breaker(self.base[len('http://'):]).state, 'closed')
+
+    def test_breaker_opens_then_recovers(self):
+        ScriptedHandler.script = {'/down': [503]}
+        fetcher = self.fetcher(breaker_threshold=2, breaker_reset=0.2)
+        for _ in range(2):
+            with self.assertRaises(requests.HTTPError):
+                fetcher.get(self.base + '/down')
+        with self.assertRaises(CircuitOpen):
+            fetcher.get(self.base + '/page')
+        self.assertEqual(self.counts(fetcher)['short circuited'], 1)
+        time.sleep(0.25)
+        # the half open trial succeeds and closes the breaker again
+        self.assertEqual(fetcher.get(self.base + '/page').status_code, 200)
+        self.assertEqual(fetcher.breaker(self.base[len('http://'):]).state, 'closed')
+
+
+if __name__ == '__main__':
+    unittest.main()